@@ -36,6 +36,7 @@ sqldroptables = False" > $l.config
 
 python ~/WikiPride/wikipride.py -c $l.config preprocessing
 python ~/WikiPride/wikipride.py -c $l.config data
+python ~/WikiPride/wikipride.py -c $l.config warehouse
 python ~/WikiPride/wikipride.py -c $l.config report
 
 done
\ No newline at end of file
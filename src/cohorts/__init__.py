@@ -13,4 +13,14 @@
 
 .. automodule:: cohorts.simple
     :members:
+
+
+.. automodule:: cohorts.community
+    :members:
+
+.. automodule:: cohorts.triangular
+    :members:
+
+.. automodule:: cohorts.store
+    :members:
 """
\ No newline at end of file
@@ -13,9 +13,11 @@ except:
 
 import settings
 import utils
+import timeaxis
 
 
-from cohorts.base import Cohort
+from cohorts.base import Cohort,getNetColumn
+from cohorts.triangular import TriangularMatrix, BandedMatrix
 from data import tables
 
 
@@ -72,13 +74,16 @@ class AbsoluteAgePerMonth(Age):
         self.cohorts = [int(i) for i in range(0,len(settings.time_stamps))]
         '''Cohort definition
         '''                
-        self.cohort_labels = ['%s-%s'%(settings.time_stamps[i][:4],settings.time_stamps[i][4:]) for i in self.cohorts]
+        self.cohort_labels = [settings.time_stamps.getISOLabel(i) for i in self.cohorts]
         '''Cohort labels
         '''         
         
         self.old_user_id = None
         '''The user_id of the previously encountered editor as we iterate through the table
         '''
+        self.checkpointAttributes = ['old_user_id']
+        '''The per-editor state saved in checkpoints
+        '''
                        
         Age.__init__(self)
 
@@ -92,19 +97,13 @@ class AbsoluteAgePerMonth(Age):
             if utils.isBot(editor_id):
                 return
 
-            year = row['rev_year']
-            month = row['rev_month']
             ns = str(row['namespace'])
 
-            ym = '%d%02d'%(year,month)
-
-            time_index = self.time_stamps_index.get(ym,None)
+            time_index = self.getTimeIndex(row['rev_month_idx'])
             if time_index is None:
                 return
 
-            firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-            fe_index = self.time_stamps_index.get(firstedit,None)
+            fe_index = self.getTimeIndex(row['first_edit_month_idx'])
             if fe_index is None:
                 return
 
@@ -139,6 +138,12 @@ class AbsoluteAgePerMonth(Age):
         '''
         return fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the time indexes of the first edit in `cols['fe_index']`
+        '''
+        return cols['fe_index']
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
@@ -172,6 +177,9 @@ class RelativeAgePerMonth(Age):
         self.old_user_id = None
         '''The user_id of the previously encountered editor as we iterate through the table
         '''
+        self.checkpointAttributes = ['old_user_id']
+        '''The per-editor state saved in checkpoints
+        '''
 
              
         Age.__init__(self)
@@ -183,19 +191,13 @@ class RelativeAgePerMonth(Age):
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
         ns = str(row['namespace'])
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(row['rev_month_idx'])
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.getTimeIndex(row['first_edit_month_idx'])
         if fe_index is None:
             return
 
@@ -228,6 +230,12 @@ class RelativeAgePerMonth(Age):
         '''
         return ti-fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the relative ages computed from the time indexes of the edits (`cols['time_index']`) and of the first edits (`cols['fe_index']`)
+        '''
+        return cols['time_index']-cols['fe_index']
+
 
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
@@ -246,73 +254,123 @@ class RelativeAgePerMonth(Age):
         return ticks,labels
 
 
-class RelativeAgePerDay(Age):
-    '''A cohort is the group of people that have the same age at the time of an edit.
+class AgePerDay(Cohort):
+    '''An abstract class for the day resolution age cohorts. Only the edits of the first `maxage` days of editing are aggregated, so that the data matrices can be stored in a packed representation (see :mod:`cohorts.triangular`) instead of a days x days matrix. The data is aggregated from :data:`data.tables.EDITOR_YEAR_MONTH_DAY_NAMESPACE`, the rows of the namespaces are summed up on the SQL server. The table is only created by the preprocessing if `settings.daytable` is True.
+
+    :arg maxage: int, number of days of editing that are aggregated
+    :arg minedits: int, minimum number of edits by editor in a given day to be included
+    :arg namespaces: list of int, the namespaces that are aggregated. If None, all namespaces are aggregated.
     '''
-    def __init__(self):
+    def __init__(self,maxage=365,minedits=1,namespaces=None):
 
-        ts_month,ts_month_index = utils.create_time_stamps_month()
+        self.maxage = maxage
+        '''Number of days of editing that are aggregated'''
 
-        self.cohorts = [int(i) for i in range(0,len(ts_month))]        
-        '''Cohort definition
+        self.minedits = minedits
+        '''Minimum number of edits by editor in a given day to be included'''
+
+        self.namespaces = namespaces
+        '''The namespaces that are aggregated, None for all namespaces'''
+
+        conditions = ['first_edit_day_idx BETWEEN %s AND %s'%(self.time_stamps.first,self.time_stamps.first+len(self.time_stamps)-1), \
+                      'rev_day_idx BETWEEN first_edit_day_idx AND first_edit_day_idx+%s'%(self.maxage-1)]
+        if self.namespaces is not None:
+            conditions.append('namespace IN (%s)'%','.join(str(ns) for ns in self.namespaces))
+
+        self.sqlQuery = 'SELECT user_id, rev_day_idx, first_edit_day_idx, SUM(IFNULL(add_edits,0)) AS add_edits, SUM(IFNULL(remove_edits,0)) AS remove_edits, SUM(IFNULL(noop_edits,0)) AS noop_edits, SUM(IFNULL(len_added,0)) AS len_added, SUM(IFNULL(len_removed,0)) AS len_removed FROM %s WHERE %s GROUP BY user_id, rev_day_idx, first_edit_day_idx;'%(tables.EDITOR_YEAR_MONTH_DAY_NAMESPACE,' AND '.join(conditions))
+        '''The SQL query returns edit information for each editor for each day of her first `maxage` days of editing.'''
+
+        self.sqlColumns = ['user_id','rev_day_idx','first_edit_day_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
+        Cohort.__init__(self)
+
+
+    def initData(self):
+
+        for varName in ['added','removed','net','edits','editors']:
+            self.data[varName] = self.createMatrix()
+
+        self.initDataDescription()
+
+    def createMatrix(self):
+        '''Returns an empty data matrix
         '''
-        self.cohort_labels = ['%s days old'% i for i in self.cohorts]
-        '''Cohort labels
-        '''                        
-        Age.__init__(self)
+        raise Exception("AgePerDay subclass should implement this method!")
+
+    def initDataDescription(self):
+        '''Initialize the self.data_description dictionary with additional information
+        '''
+        desc = "first %s days, %s<edits, %s, namespaces:%s"%(self.maxage, self.minedits, 'no bots' if self.nobots else 'including bots', 'all' if self.namespaces is None else ','.join(str(ns) for ns in self.namespaces))
+
+        self.data_description['added'] = {  'title' : 'Megabytes added per day ( %s)'%desc, \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+        self.data_description['removed'] = {  'title' : 'Megabytes removed per day ( %s)'%desc, \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+        self.data_description['net'] = {  'title' : 'Megabytes Added-Removed per day ( %s)'%desc, \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+        self.data_description['edits'] = {  'title' : 'Number of edits per day ( %s)'%desc, \
+                                            'ylabel': 'Edits' }
+
+        self.data_description['editors'] = {  'title' : 'Number of active editors per day ( %s)'%desc, \
+                                             'ylabel': 'Number of Editors' }
 
     def processSQLrow(self,row):
 
-        editor_id = row['user_id']
+        (editor_id,rev_day_idx,first_edit_day_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
-        day = row['rev_day']
-        ns = str(row['namespace'])
-
-        ymd = '%d%02d%02d'%(year,month,day)
-
-        time_index = self.time_stamps_index.get(ymd,None)
+        time_index = self.getTimeIndex(rev_day_idx)
         if time_index is None:
             return
 
-        fe = str(row['first_edit_year'])
-        firstedit = fe[:8]
-        # time.strptime(fe,"%Y%m%d%H%M%S")
-        # firstedit = '%d%02d%02d'%(fe[0:4],fe[4:6],fe[6:8])
-        
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.getTimeIndex(first_edit_day_idx)
         if fe_index is None:
             return
 
+        if time_index-fe_index < 0 or time_index-fe_index >= self.maxage:
+            return
+
+        edits = int(add_edits) + int(remove_edits) + int(noop_edits)
+        if edits < self.minedits:
+            return
+
         cohorts_index = self.getIndex(time_index, fe_index)
 
-        if ns in self.NS:
+        self.data['editors'][cohorts_index,time_index] += 1
+        self.data['added'][cohorts_index,time_index] += int(len_added)
+        self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
+        self.data['edits'][cohorts_index,time_index] += edits
 
-            self.data['addedPerDay'][cohorts_index,time_index] += int(row['len_added'])
-            self.data['removedPerDay'][cohorts_index,time_index] += -int(row['len_removed'])
-            self.data['netPerDay'][cohorts_index,time_index] += int(row['len_added']) + int(row['len_removed'])
-            self.data['editsPerDay'][cohorts_index,time_index] += int(row['add_edits'])+int(row['remove_edits'])
+    def processSQLbatch(self,cols):
 
-   
+        time_index = self.getTimeIndexArray(cols['rev_day_idx'])
+        fe_index = self.getTimeIndexArray(cols['first_edit_day_idx'])
+        age = time_index - fe_index
 
+        edits = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
 
-    def getIndex(self,ti,fe):
-        '''
-        Returns the index of the cohort (i.e. the relative age of the editor) from the time index of the edit and time index of the first edit
-        '''
-        i = (ti-fe)%30
+        valid = (time_index >= 0) & (fe_index >= 0) & (age >= 0) & (age < self.maxage) & (edits >= self.minedits) & ~utils.isBotArray(cols['user_id'])
 
-        if i > len(self.cohorts)-1:
-            return len(self.cohorts)-1
-        
-        return i
+        cols['time_index'] = time_index
+        cols['fe_index'] = fe_index
 
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
 
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,edits[valid])
 
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
@@ -324,15 +382,117 @@ class RelativeAgePerDay(Age):
         if nlabels > 15:
             nlabels = 15
 
-        ticks = N.linspace(0, 1., nlabels) #  +1./(nlabels-1)*1/2
-        skip = [ int(i) for i in N.linspace(0,len(self.cohorts)-1,nlabels) ]                
+        ticks = N.linspace(0, 1., nlabels)
+        skip = [ int(i) for i in N.linspace(0,len(self.cohorts)-1,nlabels) ]
         labels = [self.cohort_labels[i] for i in skip]
-            
+
         return ticks,labels
 
 
+class AbsoluteAgePerDay(AgePerDay):
+    '''A cohort is the group of people that have started editing on the same day. The data matrices are stored as :class:`.BandedMatrix`, the cells of the editors older than `maxage` days are structurally zero.
+    '''
+    def __init__(self,maxage=365,minedits=1,namespaces=None):
+
+        self.time_stamps = timeaxis.TimeAxis(settings.time_stamps[0],settings.time_stamps[-1],timeaxis.DAY)
+        '''The days of the analyzed months
+        '''
+
+        self.cohortAxis = self.time_stamps
+        '''The days of the first edits of the cohorts, see :meth:`.resampleCohorts`
+        '''
+
+        self.cohorts = [int(i) for i in range(0,len(self.time_stamps))]
+        '''Cohort definition
+        '''
+        self.cohort_labels = [self.time_stamps.getISOLabel(i) for i in self.cohorts]
+        '''Cohort labels
+        '''
+
+        self.ncolors = len(self.cohorts)/182
+        '''
+        Number of visible colors in the wikipride plots. E.g. one color for every six month for wikipride plots
+        '''
+
+        AgePerDay.__init__(self,maxage,minedits,namespaces)
+
+    def createMatrix(self):
+        return BandedMatrix(len(self.cohorts), len(self.time_stamps), self.maxage)
+
+    def getIndex(self,ti,fe):
+        '''
+        Returns the index of the cohort, which is identical to the time index of the first edit
+        '''
+        return fe
+
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the time indexes of the first edit
+        '''
+        return cols['fe_index']
+
+    def resampleCohorts(self,granularity):
+        '''Merges the cohorts of the editors that started on the same day into the cohorts of the editors that started in the same week, month, quarter or year, see :meth:`.Cohort.mergeCohorts`.
+
+        :arg granularity: str, a coarser granularity, see :data:`timeaxis.RESAMPLING`
+        '''
+        if len(self.cohort_labels) != len(self.cohortAxis):
+            raise ValueError('The cohorts of %s have already been merged'%self)
+
+        (axis,index) = self.cohortAxis.resample(granularity)
+
+        self.mergeCohorts(index,[axis.getISOLabel(i) for i in range(len(axis))])
+
+    def __repr__(self):
+        '''String representation of cohort.
+        '''
+        return "Absolute Age Cohort per day (first %s days, %s<edits)"%(self.maxage,self.minedits)
+
+
+class RelativeAgePerDay(AgePerDay):
+    '''A cohort is the group of people that have the same age (in days) at the time of an edit. The relative age never exceeds the time index, the data matrices are stored as :class:`.TriangularMatrix` of `maxage` rows.
+    '''
+    def __init__(self,maxage=365,minedits=1,namespaces=None):
+
+        self.time_stamps = timeaxis.TimeAxis(settings.time_stamps[0],settings.time_stamps[-1],timeaxis.DAY)
+        '''The days of the analyzed months
+        '''
+
+        self.cohorts = [int(i) for i in range(0,maxage)]
+        '''Cohort definition
+        '''
+        self.cohort_labels = ['%s days old'% i for i in self.cohorts]
+        '''Cohort labels
+        '''
+
+        self.ncolors = len(self.cohorts)/30
+        '''
+        Number of visible colors in the wikipride plots. E.g. one color for every month of age
+        '''
+
+        AgePerDay.__init__(self,maxage,minedits,namespaces)
+
+    def createMatrix(self):
+        return TriangularMatrix(len(self.cohorts), len(self.time_stamps))
+
+    def getIndex(self,ti,fe):
+        '''
+        Returns the index of the cohort (i.e. the relative age of the editor in days) from the time index of the edit and time index of the first edit
+        '''
+        return ti-fe
+
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the relative ages computed from the time indexes of the edits and of the first edits
+        '''
+        return cols['time_index']-cols['fe_index']
+
+    def __repr__(self):
+        '''String representation of cohort.
+        '''
+        return "Relative Age Cohort per day (first %s days, %s<edits)"%(self.maxage,self.minedits)
+
 
-                                 
 class AbsoluteAgeAllNamespaces(Cohort):
     '''A cohort is the group of people that have started editing in the same month. 
     '''
@@ -341,20 +501,26 @@ class AbsoluteAgeAllNamespaces(Cohort):
         self.cohorts = [int(i) for i in range(0,len(settings.time_stamps))]
         '''Cohort definition
         '''                
-        self.cohort_labels = ['%s-%s'%(settings.time_stamps[i][:4],settings.time_stamps[i][4:]) for i in self.cohorts]
+        self.cohort_labels = [settings.time_stamps.getISOLabel(i) for i in self.cohorts]
         '''Cohort labels
         '''     
         
-        self.sqlQuery = 'SELECT * FROM %s;'%tables.EDITOR_YEAR_MONTH
+        self.sqlTable = tables.EDITOR_YEAR_MONTH
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
         '''The SQL query returns edit information for each editor for each ym she has edited.'''
 
+        self.sqlColumns = ['user_id','rev_month_idx','first_edit_month_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
         self.minedits = minedits
         '''Minimum number of edits by editor in a given month to be included'''
 
         self.maxedits = maxedits
         '''Maximum number of edits by editor in a given month to be included'''
 
-        self.ncolors = utils.numberOfMonths(settings.time_stamps[0],settings.time_stamps[-1])/6
+        self.ncolors = len(settings.time_stamps)/6
         '''
         Number of visible colors in the wikipride plots. E.g. one color for every six month for wikipride plots
         '''
@@ -363,12 +529,10 @@ class AbsoluteAgeAllNamespaces(Cohort):
 
 
     def initData(self):
-
-        self.data['added'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['removed'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['net'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['edits'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['editors'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        '''The cohort index never exceeds the time index, the data matrices are stored as :class:`.TriangularMatrix`
+        '''
+        for varName in ['added','removed','net','edits','editors']:
+            self.data[varName] = TriangularMatrix(len(self.cohorts), len(self.time_stamps))
 
         self.initDataDescription()
 
@@ -398,59 +562,107 @@ class AbsoluteAgeAllNamespaces(Cohort):
 
     def processSQLrow(self,row):
         # try:
-        editor_id = row['user_id']
+        (editor_id,rev_month_idx,first_edit_month_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
-
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(rev_month_idx)
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.getTimeIndex(first_edit_month_idx)
         if fe_index is None:
             return
 
         cohorts_index = self.getIndex(fe_index)
 
         edits = 0
-        if row['add_edits'] is not None:
-            edits += int(row['add_edits'])
-        if row['remove_edits'] is not None:
-            edits += int(row['remove_edits'])
-        if row['noop_edits'] is not None:
-            edits += int(row['noop_edits'])
+        if add_edits is not None:
+            edits += int(add_edits)
+        if remove_edits is not None:
+            edits += int(remove_edits)
+        if noop_edits is not None:
+            edits += int(noop_edits)
 
         if edits < self.minedits or (edits > self.maxedits and self.maxedits is not None):                        
             return
 
         self.data['editors'][cohorts_index,time_index] += 1
 
-        if row['len_added'] is not None:
-            self.data['added'][cohorts_index,time_index] += int(row['len_added'])
-        if row['len_removed'] is not None:    
-            self.data['removed'][cohorts_index,time_index] += -int(row['len_removed'])
-        if row['len_added'] is not None and row['len_removed'] is not None:
-            self.data['net'][cohorts_index,time_index] += int(row['len_added']) + int(row['len_removed'])
+        if len_added is not None:
+            self.data['added'][cohorts_index,time_index] += int(len_added)
+        if len_removed is not None:    
+            self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
         
         self.data['edits'][cohorts_index,time_index] += edits
 
         # except:
         #     raise Exception('row:\n%s'%row)
    
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+        fe_index = self.getTimeIndexArray(cols['first_edit_month_idx'])
+
+        edits = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
+
+        valid = (time_index >= 0) & (fe_index >= 0) & (edits >= self.minedits) & ~utils.isBotArray(cols['user_id'])
+        if self.maxedits is not None:
+            valid &= edits <= self.maxedits
+
+        cols['time_index'] = time_index
+        cols['fe_index'] = fe_index
+
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,edits[valid])
+
+    def getPushdownQuery(self,conditions=None):
+        '''The cohort index is the time index of the first edit. Only editors with `minedits` (and at most `maxedits`) edits in a month are aggregated.
+        '''
+        conditions = list(conditions or [])
+        conditions.append('%s >= %s'%(tables.EDITS,self.minedits))
+        if self.maxedits is not None:
+            conditions.append('%s <= %s'%(tables.EDITS,self.maxedits))
+
+        return self.buildPushdownQuery(cohortExpr=self.getMonthIndexSQL('first_edit_month_idx'),values=tables.EDITOR_AGGREGATES,conditions=conditions)
+
+    def getPushdownBuckets(self):
+        '''The cohort depends on the `minedits` and `maxedits` thresholds
+        '''
+        return [self.minedits-1] + ([self.maxedits] if self.maxedits is not None else [])
+
+    def getPushdownIndexArray(self, cols):
+        '''The cohort index is the time index of the first edit, rows without `minedits` (or with more than `maxedits`) edits are dropped
+        '''
+        fe_index = self.getTimeIndexArray(cols['first_edit_month_idx'])
+
+        valid = (fe_index >= 0) & (cols['bucket_edits'] >= self.minedits)
+        if self.maxedits is not None:
+            valid &= cols['bucket_edits'] <= self.maxedits
+
+        return N.where(valid,fe_index,-1)
+   
     def getIndex(self, fe):
         '''
         Returns the index of the cohort, which is identical to the time index of the first edit 
         '''
         return fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the time indexes of the first edit 
+        '''
+        return cols['fe_index']
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
@@ -482,16 +694,22 @@ class RelativeAgeAllNamespaces(Cohort):
         '''Cohort labels
         '''                   
         
-        self.sqlQuery = 'SELECT * FROM %s;'%tables.EDITOR_YEAR_MONTH
+        self.sqlTable = tables.EDITOR_YEAR_MONTH
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
         '''The SQL query returns edit information for each editor for each ym she has edited.'''
 
+        self.sqlColumns = ['user_id','rev_month_idx','first_edit_month_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
         self.minedits = minedits
         '''Minimum number of edits by editor in a given month to be included'''
 
         self.maxedits = maxedits
         '''Maximum number of edits by editor in a given month to be included'''
 
-        self.ncolors = utils.numberOfMonths(settings.time_stamps[0],settings.time_stamps[-1])/6
+        self.ncolors = len(settings.time_stamps)/6
         '''
         Number of visible colors in the wikipride plots. E.g. one color for every six month for wikipride plots
         '''
@@ -500,12 +718,10 @@ class RelativeAgeAllNamespaces(Cohort):
 
 
     def initData(self):
-
-        self.data['added'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['removed'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['net'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['edits'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['editors'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        '''The cohort index never exceeds the time index, the data matrices are stored as :class:`.TriangularMatrix`
+        '''
+        for varName in ['added','removed','net','edits','editors']:
+            self.data[varName] = TriangularMatrix(len(self.cohorts), len(self.time_stamps))
 
         self.initDataDescription()
 
@@ -535,23 +751,16 @@ class RelativeAgeAllNamespaces(Cohort):
 
     def processSQLrow(self,row):
         # try:
-        editor_id = row['user_id']
+        (editor_id,rev_month_idx,first_edit_month_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
-
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(rev_month_idx)
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.getTimeIndex(first_edit_month_idx)
         if fe_index is None:
             return
 
@@ -559,36 +768,94 @@ class RelativeAgeAllNamespaces(Cohort):
 
 
         edits = 0
-        if row['add_edits'] is not None:
-            edits += int(row['add_edits'])
-        if row['remove_edits'] is not None:
-            edits += int(row['remove_edits'])
-        if row['noop_edits'] is not None:
-            edits += int(row['noop_edits'])
+        if add_edits is not None:
+            edits += int(add_edits)
+        if remove_edits is not None:
+            edits += int(remove_edits)
+        if noop_edits is not None:
+            edits += int(noop_edits)
 
         if edits < self.minedits or (edits > self.maxedits and self.maxedits is not None):                        
             return
 
         self.data['editors'][cohorts_index,time_index] += 1
 
-        if row['len_added'] is not None:
-            self.data['added'][cohorts_index,time_index] += int(row['len_added'])
-        if row['len_removed'] is not None:    
-            self.data['removed'][cohorts_index,time_index] += -int(row['len_removed'])
-        if row['len_added'] is not None and row['len_removed'] is not None:
-            self.data['net'][cohorts_index,time_index] += int(row['len_added']) + int(row['len_removed'])
+        if len_added is not None:
+            self.data['added'][cohorts_index,time_index] += int(len_added)
+        if len_removed is not None:    
+            self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
         
         self.data['edits'][cohorts_index,time_index] += edits
 
         # except:
         #     raise Exception('row:\n%s'%row)
    
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+        fe_index = self.getTimeIndexArray(cols['first_edit_month_idx'])
+
+        edits = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
+
+        valid = (time_index >= 0) & (fe_index >= 0) & (edits >= self.minedits) & ~utils.isBotArray(cols['user_id'])
+        if self.maxedits is not None:
+            valid &= edits <= self.maxedits
+
+        cols['time_index'] = time_index
+        cols['fe_index'] = fe_index
+
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,edits[valid])
+
+    def getPushdownQuery(self,conditions=None):
+        '''The cohort index is the relative age of the editor in months. Only editors with `minedits` (and at most `maxedits`) edits in a month are aggregated.
+        '''
+        fe_index = self.getMonthIndexSQL('first_edit_month_idx')
+
+        conditions = list(conditions or [])
+        conditions.extend([self.time_stamps.getRangeSQL('first_edit_month_idx'), '%s >= %s'%(tables.EDITS,self.minedits)])
+        if self.maxedits is not None:
+            conditions.append('%s <= %s'%(tables.EDITS,self.maxedits))
+
+        return self.buildPushdownQuery(cohortExpr='(%s-%s)'%(self.getMonthIndexSQL('rev_month_idx'),fe_index),values=tables.EDITOR_AGGREGATES,conditions=conditions)
+
+    def getPushdownBuckets(self):
+        '''The cohort depends on the `minedits` and `maxedits` thresholds
+        '''
+        return [self.minedits-1] + ([self.maxedits] if self.maxedits is not None else [])
+
+    def getPushdownIndexArray(self, cols):
+        '''The cohort index is the relative age of the editor, rows without `minedits` (or with more than `maxedits`) edits are dropped
+        '''
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+        fe_index = self.getTimeIndexArray(cols['first_edit_month_idx'])
+
+        valid = (time_index >= 0) & (fe_index >= 0) & (cols['bucket_edits'] >= self.minedits)
+        if self.maxedits is not None:
+            valid &= cols['bucket_edits'] <= self.maxedits
+
+        return N.where(valid,time_index-fe_index,-1)
+   
     def getIndex(self,ti,fe):
         '''
         Returns the index of the cohort (i.e. the relative age of the editor) from the time index of the edit and time index of the first edit
         '''
         return ti-fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the relative ages computed from the time indexes of the edits and of the first edits
+        '''
+        return cols['time_index']-cols['fe_index']
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
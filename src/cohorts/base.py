@@ -27,10 +27,629 @@ except:
 
 
 import settings
+import utils
+import timeaxis
 
+from cohorts.triangular import PackedMatrix, saveMatrix
+from cohorts import store
 
 
-# (time_stamps,time_stamps_index) = create_time_stamps(fromym='200101',toym='201101')
+def resampleColumns(data,starts,counts,how='sum'):
+    '''Combines groups of contiguous columns of a matrix
+
+    :arg data: 2d numpy.array
+    :arg starts: numpy.array, index of the first column of each group
+    :arg counts: numpy.array, number of columns of each group
+    :arg how: str, 'sum', 'mean', 'max' or 'last'
+    :returns: 2d numpy.array with one column per group
+    '''
+    if data.shape[1] == 0:
+        return N.zeros((data.shape[0],len(starts)))
+    if how == 'sum':
+        return N.add.reduceat(data,starts,axis=1)
+    if how == 'mean':
+        return N.add.reduceat(data,starts,axis=1)/counts
+    if how == 'max':
+        return N.maximum.reduceat(data,starts,axis=1)
+    if how == 'last':
+        return data[:,starts+counts-1]
+    raise ValueError('Unknown resampling %s'%how)
+
+def mergeRows(data,index,nrows,how='sum'):
+    '''Combines the rows of a matrix
+
+    :arg data: 2d numpy.array
+    :arg index: numpy.array, the new row of each row. Rows with a negative index are dropped.
+    :arg nrows: int, number of new rows
+    :arg how: str, 'sum', 'mean' or 'max'
+    :returns: 2d numpy.array with `nrows` rows
+    '''
+    keep = index >= 0
+    (data,index) = (data[keep],index[keep])
+
+    if how in ('sum','mean'):
+        merged = N.zeros((nrows,data.shape[1]))
+        N.add.at(merged,index,data)
+        if how == 'mean':
+            merged /= N.maximum(N.bincount(index,minlength=nrows),1)[:,None]
+        return merged
+    if how == 'max':
+        merged = N.zeros((nrows,data.shape[1]))
+        merged.fill(-N.inf)
+        N.maximum.at(merged,index,data)
+        merged[N.isinf(merged)] = 0
+        return merged
+    raise ValueError('Unknown merge %s'%how)
+
+
+def formatCSV(labels,columns,data):
+    '''Formats a data matrix as CSV, transposed: one row per time unit, one column per cohort. The values are formatted row by row by a single format string, integral values are written without decimals.
+
+    :arg labels: list of str, the labels of the time units (the columns of `data`)
+    :arg columns: list of str, the labels of the cohorts (the rows of `data`)
+    :arg data: 2d numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+    :returns: str, the CSV content including the header line
+    '''
+    import io
+
+    table = N.empty((len(labels),len(columns)+1),dtype=object)
+    table[:,0] = labels
+    table[:,1:] = N.asarray(data,dtype=N.float64).T
+
+    f = io.BytesIO()
+    N.savetxt(f,table,fmt=['%s']+['%.15g']*len(columns),delimiter=',',header='Date,%s'%','.join('%s'%c for c in columns),comments='')
+    return f.getvalue()
+
+
+BATCHSIZE = 10000
+'''Default number of SQL rows that are fetched and processed at once by the batch mode of :meth:`.Cohort.aggregateDataFromSQL`
+'''
+
+SNAPSHOT_BATCHSIZE = 1000000
+'''Default number of rows of a snapshot that are processed at once by :meth:`.Cohort.aggregateDataFromSnapshot`
+'''
+
+CHECKPOINT_INTERVAL = 600
+'''Default number of seconds between two checkpoints of a long-running aggregation, see :func:`aggregateCohortsWithCheckpoints`
+'''
+
+NULLABLE_COLUMNS = ['len_added','len_removed']
+'''Columns whose NULL values are recorded by :func:`rowsToColumns` in a boolean column `<name>_null`, see :func:`getNetColumn`
+'''
+
+def rowsToColumns(rows,columns,positional=False):
+    '''Converts a chunk of SQL rows into numpy columns. NULL values are converted to 0, the NULL values of the :data:`NULLABLE_COLUMNS` are marked in an additional boolean column `<name>_null`.
+
+    :arg rows: list of rows, either dictionaries (dictionary cursor) or tuples (positional cursor)
+    :arg columns: list of str, the column names to extract. For positional rows, the columns of the rows in the order of the projection
+    :arg positional: bool, True if the rows are tuples
+    :returns: dict, {column name : numpy.array of int64}
+    '''
+    cols = {}
+    for i,c in enumerate(columns):
+        key = i if positional else c
+        cols[c] = N.fromiter((row[key] or 0 for row in rows), dtype=N.int64, count=len(rows))
+        if c in NULLABLE_COLUMNS:
+            cols['%s_null'%c] = N.fromiter((row[key] is None for row in rows), dtype=bool, count=len(rows))
+
+    return cols
+
+def getNetColumn(cols):
+    '''Returns the net size change `len_added + len_removed` of a batch of rows. As in the row mode, the rows where one of the two values is NULL are not counted, their net size change is 0.
+
+    :arg cols: dict, the columns of the batch, see :func:`rowsToColumns`
+    :returns: numpy.array of int64
+    '''
+    net = cols['len_added'] + cols['len_removed']
+    if 'len_added_null' in cols and 'len_removed_null' in cols:
+        net[cols['len_added_null'] | cols['len_removed_null']] = 0
+    return net
+
+def aggregatePushdownCohorts(cohorts,verbose=False,conditions=None):
+    '''Aggregates the cohorts that can push their aggregation down to the SQL server (see :meth:`.getPushdownQuery`). Several cohorts on the same :attr:`sqlTable` are aggregated by one combined query if they all support it (see :func:`aggregateCombinedPushdown`), so that the table is scanned only once on the server. Otherwise, they are not pushed down and share the scan of the streamed cohorts.
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg verbose: bool, log the queries
+    :arg conditions: list of str, SQL conditions restricting the aggregated rows
+    :returns: list of the cohorts that can't be pushed down and need to be streamed
+    '''
+    if utils.filterBots and utils.botTable is None:
+        # the bots can only be filtered in python, the rows have to be streamed
+        logger.info("Bots are filtered without bot table, SQL aggregation pushdown is disabled")
+        return cohorts
+
+    pushed = {}
+    for c in cohorts:
+        if c.getPushdownQuery(conditions) is not None:
+            pushed.setdefault(c.sqlTable,[]).append(c)
+
+    aggregated = []
+    for sqlTable,group in pushed.items():
+        if len(group) == 1:
+            group[0].aggregateDataFromPushdown(group[0].getPushdownQuery(conditions),verbose=verbose)
+        elif all(c.getPushdownBuckets() is not None for c in group):
+            aggregateCombinedPushdown(group,verbose=verbose,conditions=conditions)
+        else:
+            continue
+        aggregated.extend(group)
+
+    return [c for c in cohorts if c not in aggregated]
+
+PUSHDOWN_COLUMNS = ['first_edit_month_idx','rev_month_idx']
+'''The columns a combined pushdown query groups by, besides the bucket of the number of edits, see :func:`buildCombinedPushdownQuery`
+'''
+
+def getPushdownBreakpoints(cohorts):
+    '''Returns the union of the edit thresholds of the cohorts (see :meth:`.Cohort.getPushdownBuckets`), and the number of edits standing for each bucket. Bucket `i` holds the rows with more edits than the threshold `i-1` and at most the threshold `i`, the last bucket the rows with more edits than the last threshold.
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :returns: tuple, (sorted list of int, numpy.array of int64)
+    '''
+    breakpoints = sorted(set(int(b) for c in cohorts for b in c.getPushdownBuckets()))
+    if not breakpoints:
+        return ([],N.zeros(1,dtype=N.int64))
+    return (breakpoints,N.array(breakpoints+[breakpoints[-1]+1],dtype=N.int64))
+
+def buildCombinedPushdownQuery(cohorts,conditions=None):
+    '''Builds the ``GROUP BY`` query aggregating several cohorts on the same :attr:`sqlTable` in one scan. The rows are grouped by the :data:`PUSHDOWN_COLUMNS` and by the bucket of their number of edits (see :func:`getPushdownBreakpoints`), as the cohorts only differ in the thresholds on the number of edits. Only the months of the time axes of the cohorts are aggregated.
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg conditions: list of str, additional SQL conditions
+    :returns: str, SQL query
+    '''
+    from data import tables
+
+    (breakpoints,reps) = getPushdownBreakpoints(cohorts)
+    if breakpoints:
+        bucketExpr = '(CASE %s ELSE %s END)'%(' '.join('WHEN %s <= %s THEN %s'%(tables.EDITS,b,i) for i,b in enumerate(breakpoints)),len(breakpoints))
+    else:
+        bucketExpr = '0'
+
+    first = min(c.time_stamps.first for c in cohorts)
+    last = max(c.time_stamps.first+len(c.time_stamps)-1 for c in cohorts)
+
+    select = PUSHDOWN_COLUMNS + ['%s AS edits_bucket'%bucketExpr]
+    select.extend('%s AS %s'%(expr,name) for name,expr in tables.EDITOR_AGGREGATES)
+
+    where = ['rev_month_idx BETWEEN %s AND %s'%(first,last)]
+    where.extend(cohorts[0].getBotConditions(conditions))
+
+    return 'SELECT %s FROM %s WHERE %s GROUP BY %s, edits_bucket;'%(', '.join(select),cohorts[0].sqlTable,' AND '.join(where),', '.join(PUSHDOWN_COLUMNS))
+
+def aggregateCombinedPushdown(cohorts,verbose=False,conditions=None):
+    '''Aggregates several cohorts on the same :attr:`sqlTable` with one combined pushdown query (see :func:`buildCombinedPushdownQuery`). Each aggregated row is added to the cohorts by :meth:`.Cohort.processPushdownBatch`.
+
+    :arg cohorts: list of :class:`.Cohort` instances supporting :meth:`.Cohort.getPushdownBuckets`
+    :arg verbose: bool, log the query
+    :arg conditions: list of str, SQL conditions restricting the aggregated rows
+    '''
+    from db import sql
+    from data import tables
+
+    logger.info('Aggregating data on the SQL server for %s'%', '.join(str(c) for c in cohorts))
+
+    query = buildCombinedPushdownQuery(cohorts,conditions)
+    if verbose:
+        logger.info("SQL pushdown query (shared by %s cohorts): %s"%(len(cohorts),query))
+
+    for c in cohorts:
+        c.initData()
+
+    cur = sql.getSSDictCursor()
+    cur.execute(query)
+    rows = list(cur)
+    cur.close()
+
+    (breakpoints,reps) = getPushdownBreakpoints(cohorts)
+
+    columns = PUSHDOWN_COLUMNS + ['edits_bucket'] + [name for name,expr in tables.EDITOR_AGGREGATES]
+    cols = rowsToColumns(rows,columns)
+    cols['bucket_edits'] = reps[cols['edits_bucket']]
+
+    for c in cohorts:
+        c.processPushdownBatch(dict(cols))
+
+def startProgress(cohorts,verbose,total=None,unit='rows',conditions=None):
+    '''Returns a :class:`progress.Progress` instance that reports the throughput and ETA of the aggregation of the cohorts, or None if `verbose` is False. 
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg verbose: bool
+    :arg total: int, expected number of rows. If None, the row estimate of the :attr:`sqlTable` of the cohorts is used, unless the rows are restricted by `conditions`.
+    :arg unit: str, unit of the processed items
+    :arg conditions: list of str, SQL conditions restricting the scanned rows
+    '''
+    import progress
+
+    if not verbose:
+        return None
+
+    if total is None and not conditions and cohorts[0].sqlTable is not None:
+        total = progress.estimateRows(cohorts[0].sqlTable)
+
+    return progress.Progress(', '.join(str(c) for c in cohorts),total=total,unit=unit)
+
+def processRows(rows,batchCohorts,rowCohorts,columns,positional):
+    '''Passes a chunk of SQL rows to the cohorts, either as numpy columns to :meth:`.processSQLbatch` or row by row to :meth:`.processSQLrow`.
+
+    :arg rows: list of rows
+    :arg batchCohorts: list of :class:`.Cohort` instances using the batch mode
+    :arg rowCohorts: list of :class:`.Cohort` instances processing the rows one by one
+    :arg columns: list of str, the columns converted for the batch mode (in the order of the projection for positional rows)
+    :arg positional: bool, True if the rows are tuples
+    '''
+    if batchCohorts:
+        cols = rowsToColumns(rows,columns,positional)
+        for c in batchCohorts:
+            # each cohort gets its own dict, as derived columns are added by processSQLbatch()
+            c.processSQLbatch(dict(cols))
+
+    for row in rows:
+        for c in rowCohorts:
+            c.processSQLrow(row)
+
+def aggregateCohortsFromSQL(cohorts,verbose=False,batchsize=BATCHSIZE,pushdown=True,conditions=None,checkpoint=None,checkpointInterval=CHECKPOINT_INTERVAL):
+    '''Aggregates the data of several cohorts from a single scan of the SQL result set. All cohorts must use the same :attr:`sqlQuery`. Each chunk of rows is passed to every cohort, either as numpy columns to :meth:`.processSQLbatch` (cohorts that define :attr:`sqlColumns`) or row by row to :meth:`.processSQLrow`.
+
+    Cohorts that can push their aggregation down to the SQL server (see :meth:`.getPushdownQuery`) are aggregated with a ``GROUP BY`` query instead and don't take part in the scan, see :func:`aggregatePushdownCohorts`.
+
+    If a `checkpoint` file is passed, the table is scanned in pages ordered by `user_id` (keyset pagination) and the state of the aggregation is saved to the checkpoint file at editor boundaries, see :func:`aggregateCohortsWithCheckpoints`.
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg verbose: bool, report the progress (see :mod:`progress`)
+    :arg batchsize: int, number of rows per chunk. If None, the batch mode is disabled and all cohorts process the rows one by one.
+    :arg pushdown: bool, if False the pushdown queries are not used
+    :arg conditions: list of str, SQL conditions restricting the scanned rows (see :meth:`.getSQLQuery`)
+    :arg checkpoint: str, path of the checkpoint file. If None, no checkpoints are saved.
+    :arg checkpointInterval: int, minimal number of seconds between two checkpoints
+    '''
+    from db import sql
+
+    if pushdown:
+        cohorts = aggregatePushdownCohorts(cohorts,verbose=verbose,conditions=conditions)
+        if not cohorts:
+            return
+
+    sqlQuery = cohorts[0].sqlQuery
+
+    if sqlQuery is None:
+        logger.error("No valid SQL query has been supplied.")
+        raise Exception("SQL query needed!")
+
+    if any(c.sqlQuery != sqlQuery for c in cohorts):
+        raise Exception("Cohorts sharing a scan must use the same SQL query!")
+
+    batchCohorts = [c for c in cohorts if c.sqlColumns is not None and batchsize]
+    rowCohorts = [c for c in cohorts if c not in batchCohorts]
+
+    # If all cohorts declare their columns, only these columns are selected and the rows are 
+    # fetched as tuples. Otherwise, the rows are fetched as dictionaries containing all columns.
+    positional = cohorts[0].sqlTable is not None and all(c.sqlColumns is not None for c in cohorts)
+
+    # union of the columns used by the cohorts
+    columns = []
+    for c in (cohorts if positional else batchCohorts):
+        columns.extend(col for col in c.sqlColumns if col not in columns)
+
+    for c in cohorts:
+        c.initData()
+        if c.sqlColumns is not None:
+            c.setColumnPositions(columns if positional else None)
+
+    if checkpoint is not None:
+        aggregateCohortsWithCheckpoints(cohorts,batchCohorts,rowCohorts,columns,positional,checkpoint,verbose=verbose,pagesize=batchsize or BATCHSIZE,conditions=conditions,checkpointInterval=checkpointInterval)
+        return
+
+    if positional:
+        sqlQuery = cohorts[0].getSQLQuery(conditions,columns=columns)
+        cur = sql.getSSCursor()
+    else:
+        sqlQuery = cohorts[0].getSQLQuery(conditions)
+        cur = sql.getSSDictCursor()
+
+    if verbose:
+        logger.info("SQL query (shared by %s cohorts): %s"%(len(cohorts),sqlQuery))
+
+    progress = startProgress(cohorts,verbose,conditions=conditions)
+
+    cur.execute(sqlQuery)
+
+    while True:
+        rows = cur.fetchmany(batchsize or BATCHSIZE)
+        if not rows:
+            break
+
+        processRows(rows,batchCohorts,rowCohorts,columns,positional)
+
+        if progress:
+            progress.update(len(rows))
+
+    cur.close()
+
+    if progress:
+        progress.finish()
+
+def getCheckpointIdentity(cohorts,conditions=None):
+    '''Returns the identity of an aggregation, which must not change between a checkpoint and the run resuming it: the classes, parameters (see :meth:`.Cohort.getCacheParameters`), SQL queries and time axes of the cohorts, the SQL conditions and the bot filter (see :func:`data.cache.getBotFilter`).
+
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg conditions: list of str, SQL conditions restricting the scanned rows
+    :returns: str, JSON serialized identity
+    '''
+    import json
+    from data import cache
+
+    identity = {    'cohorts' : [ { 'cohort' : '%s.%s'%(c.__class__.__module__,c.__class__.__name__),
+                                    'parameters' : c.getCacheParameters(),
+                                    'sqlQuery' : c.getSQLQuery(),
+                                    'time_stamps' : c.time_stamps.toDict() } for c in cohorts ],
+                    'conditions' : list(conditions or []),
+                    'bots' : cache.getBotFilter() }
+
+    return json.dumps(identity,sort_keys=True)
+
+def saveCheckpoint(checkpoint,cohorts,key,conditions=None):
+    '''Saves the data matrices and the per-editor state (see :meth:`.Cohort.getCheckpointState`) of the cohorts, together with the `user_id` of the last processed editor and the identity of the aggregation (see :func:`getCheckpointIdentity`). The file is replaced atomically, a crash while saving leaves the previous checkpoint intact.
+
+    :arg checkpoint: str, path of the checkpoint file
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg key: `user_id` of the last editor whose rows have all been processed
+    :arg conditions: list of str, SQL conditions restricting the scanned rows
+    '''
+    import os
+    import pickle
+
+    state = {   'cohorts' : [str(c) for c in cohorts],
+                'identity' : getCheckpointIdentity(cohorts,conditions),
+                'key' : key,
+                'data' : [c.data for c in cohorts],
+                'state' : [c.getCheckpointState() for c in cohorts] }
+
+    directory = os.path.dirname(checkpoint)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    tmp = '%s.tmp'%checkpoint
+    with open(tmp,'wb') as f:
+        pickle.dump(state,f,pickle.HIGHEST_PROTOCOL)
+    os.rename(tmp,checkpoint)
+
+def loadCheckpoint(checkpoint,cohorts,conditions=None):
+    '''Restores the data matrices and the per-editor state of the cohorts from a checkpoint saved by :func:`saveCheckpoint`. A checkpoint of a different aggregation (e.g. other cohort parameters, time axis, conditions or bot filter) is removed.
+
+    :arg checkpoint: str, path of the checkpoint file
+    :arg cohorts: list of :class:`.Cohort` instances
+    :arg conditions: list of str, SQL conditions restricting the scanned rows
+    :returns: the `user_id` of the last processed editor, or None if there is no checkpoint for these cohorts
+    '''
+    import os
+    import pickle
+
+    if not os.path.isfile(checkpoint):
+        return None
+
+    with open(checkpoint,'rb') as f:
+        state = pickle.load(f)
+
+    if state.get('identity') != getCheckpointIdentity(cohorts,conditions):
+        logger.warning("The checkpoint %s belongs to a different aggregation, it is removed"%checkpoint)
+        os.remove(checkpoint)
+        return None
+
+    for c,data,cstate in zip(cohorts,state['data'],state['state']):
+        c.data = data
+        c.setCheckpointState(cstate)
+
+    return state['key']
+
+def aggregateCohortsWithCheckpoints(cohorts,batchCohorts,rowCohorts,columns,positional,checkpoint,verbose=False,pagesize=BATCHSIZE,conditions=None,checkpointInterval=CHECKPOINT_INTERVAL):
+    '''Scans the :attr:`sqlTable` of the cohorts in pages ordered by `user_id` and `rev_month_idx`. Each page is requested with a keyset condition (``user_id > last user_id``) instead of an offset, and ends at an editor boundary: the rows of the last editor of a page are fetched again with the next page. Every `checkpointInterval` seconds, the state of the aggregation is saved to the `checkpoint` file (see :func:`saveCheckpoint`). If the checkpoint file exists, the aggregation resumes after the last checkpointed editor. The checkpoint is removed once the scan is complete.
+
+    Called by :func:`aggregateCohortsFromSQL`, the data of the cohorts must have been initialized.
+
+    :arg cohorts: list of :class:`.Cohort` instances sharing the same :attr:`sqlTable`
+    :arg batchCohorts: list of the cohorts using the batch mode
+    :arg rowCohorts: list of the cohorts processing the rows one by one
+    :arg columns: list of str, the projection (positional rows) or the columns used by the batch mode
+    :arg positional: bool, True if the rows are fetched as tuples
+    :arg checkpoint: str, path of the checkpoint file
+    :arg verbose: bool, report the progress (see :mod:`progress`)
+    :arg pagesize: int, number of rows per page
+    :arg conditions: list of str, SQL conditions restricting the scanned rows
+    :arg checkpointInterval: int, minimal number of seconds between two checkpoints
+    '''
+    import os
+    import time
+    from db import sql
+
+    if cohorts[0].sqlTable is None:
+        raise Exception("Checkpoints require cohorts that define sqlTable!")
+
+    key = loadCheckpoint(checkpoint,cohorts,conditions)
+    if key is not None:
+        logger.info("Resuming the aggregation of %s after user_id %s"%(', '.join(str(c) for c in cohorts),key))
+
+    progress = startProgress(cohorts,verbose,conditions=conditions)
+
+    if positional:
+        userColumn = columns.index('user_id')
+    else:
+        userColumn = 'user_id'
+
+    lastCheckpoint = time.time()
+    while True:
+        pageConditions = list(conditions or [])
+        if key is not None:
+            pageConditions.append('user_id > %s'%key)
+
+        sqlQuery = cohorts[0].getSQLQuery(pageConditions,columns=columns if positional else None)
+        sqlQuery = '%s ORDER BY user_id, rev_month_idx LIMIT %s;'%(sqlQuery.rstrip(';'),pagesize)
+
+        cur = sql.getCursor() if positional else sql.getSSDictCursor()
+        cur.execute(sqlQuery)
+        rows = list(cur.fetchall())
+        cur.close()
+
+        if not rows:
+            break
+
+        if len(rows) == pagesize:
+            # the rows of the last editor might continue on the next page
+            last = rows[-1][userColumn]
+            rows = [row for row in rows if row[userColumn] != last]
+            if not rows:
+                # a single editor has more rows than fit on a page
+                pagesize *= 2
+                continue
+
+        processRows(rows,batchCohorts,rowCohorts,columns,positional)
+        key = rows[-1][userColumn]
+
+        if time.time()-lastCheckpoint >= checkpointInterval:
+            saveCheckpoint(checkpoint,cohorts,key,conditions)
+            lastCheckpoint = time.time()
+
+        if progress:
+            progress.update(len(rows))
+
+    if os.path.isfile(checkpoint):
+        os.remove(checkpoint)
+
+    if progress:
+        progress.finish()
+
+def aggregateCohortsFromSnapshot(cohorts,verbose=False,batchsize=SNAPSHOT_BATCHSIZE):
+    '''Aggregates the data of several cohorts from the local snapshot of their :attr:`sqlTable` (see :mod:`data.snapshot`), without querying the SQL server. The memory-mapped columns are read in chunks of `batchsize` rows, which are passed to :meth:`.processSQLbatch` of every cohort.
+
+    :arg cohorts: list of :class:`.Cohort` instances sharing the same :attr:`sqlTable`. All cohorts must define :attr:`sqlColumns`.
+    :arg verbose: bool, report the progress (see :mod:`progress`)
+    :arg batchsize: int, number of rows per chunk
+    '''
+    from data import snapshot
+
+    sqlTable = cohorts[0].sqlTable
+    if sqlTable is None or any(c.sqlTable != sqlTable for c in cohorts):
+        raise Exception("Snapshot aggregation requires cohorts with the same sqlTable!")
+
+    if any(c.sqlColumns is None for c in cohorts):
+        raise Exception("Snapshot aggregation requires cohorts that define sqlColumns!")
+
+    # union of the columns used by the cohorts
+    columns = []
+    for c in cohorts:
+        columns.extend(col for col in c.sqlColumns if col not in columns)
+
+    (nrows,snapshotColumns) = snapshot.loadSnapshot(sqlTable,columns)
+
+    if verbose:
+        logger.info("Snapshot of %s (shared by %s cohorts): %s rows"%(sqlTable,len(cohorts),nrows))
+
+    for c in cohorts:
+        c.initData()
+
+    progress = startProgress(cohorts,verbose,total=nrows)
+
+    for start in range(0,nrows,batchsize):
+        # copy the chunk into memory, the memory-mapped files are read-only
+        cols = dict((name,N.array(col[start:start+batchsize])) for name,col in snapshotColumns.items())
+
+        for c in cohorts:
+            c.processSQLbatch(dict(cols))
+
+        if progress:
+            progress.update(min(batchsize,nrows-start))
+
+    if progress:
+        progress.finish()
+
+_parallelCohorts = None
+"""The cohorts aggregated by the worker processes of :func:`aggregateCohortsParallel`. Set before the pool is created, the workers inherit it when they are forked.
+"""
+
+def _initParallelWorker():
+    """Initializes a worker process of :func:`aggregateCohortsParallel`, each worker opens its own SQL connection.
+    """
+    from db import sql
+    sql.db = None
+
+def _aggregatePartition(args):
+    """Aggregates the data of :data:`_parallelCohorts` for the editors in the `user_id` range and returns the data matrices.
+
+    :arg args: tuple (user_id range, additional SQL conditions)
+    """
+    (userRange,conditions) = args
+    conditions = ['user_id BETWEEN %s AND %s'%userRange] + list(conditions or [])
+
+    aggregateCohortsFromSQL(_parallelCohorts,pushdown=False,conditions=conditions)
+
+    return [c.data for c in _parallelCohorts]
+
+def aggregateCohortsParallel(cohorts,processes,partitions=None,verbose=False,pushdown=True,conditions=None):
+    '''Aggregates the data of several cohorts in parallel. The table of the cohorts (:attr:`sqlTable`) is split into `user_id` ranges, each range is aggregated in a worker process with its own SQL connection and the data matrices of the workers are summed up. The cell updates of the cohorts are additive, so the result is identical to :func:`aggregateCohortsFromSQL`. All rows of an editor are in the same range, thus cohorts that depend on the order of the rows of an editor (e.g. counting the `editors`) are aggregated correctly as well.
+
+    :arg cohorts: list of :class:`.Cohort` instances sharing the same :attr:`sqlQuery` and :attr:`sqlTable`
+    :arg processes: int, number of worker processes
+    :arg partitions: int, number of `user_id` ranges. If None, four ranges per process are used.
+    :arg verbose: bool, report the progress (see :mod:`progress`)
+    :arg pushdown: bool, if True cohorts that can push down their aggregation are aggregated on the SQL server instead (see :func:`aggregatePushdownCohorts`)
+    :arg conditions: list of str, SQL conditions restricting the aggregated rows
+    '''
+    global _parallelCohorts
+
+    import multiprocessing
+    from db import sql
+
+    if pushdown:
+        cohorts = aggregatePushdownCohorts(cohorts,verbose=verbose,conditions=conditions)
+        if not cohorts:
+            return
+
+    sqlTable = cohorts[0].sqlTable
+    if sqlTable is None or any(c.sqlTable != sqlTable for c in cohorts):
+        raise Exception("Parallel aggregation requires cohorts with the same sqlTable!")
+
+    if partitions is None:
+        partitions = processes*4
+
+    cur = sql.getCursor()
+    cur.execute('SELECT MIN(user_id), MAX(user_id) FROM %s;'%sqlTable)
+    (minid,maxid) = cur.fetchone()
+    cur.close()
+
+    for c in cohorts:
+        c.initData()
+
+    if minid is None:
+        logger.warning("%s is empty, nothing to aggregate"%sqlTable)
+        return
+
+    bounds = N.linspace(int(minid), int(maxid)+1, partitions+1).astype(N.int64)
+    ranges = [(int(bounds[i]),int(bounds[i+1])-1) for i in range(partitions) if bounds[i+1] > bounds[i]]
+
+    logger.info("Aggregating %s in %s user_id ranges with %s processes"%(', '.join(str(c) for c in cohorts),len(ranges),processes))
+
+    # the workers must not share the connection of the parent process
+    sql.close()
+
+    progress = startProgress(cohorts,verbose,total=len(ranges),unit='partitions')
+
+    _parallelCohorts = cohorts
+    pool = multiprocessing.Pool(processes,initializer=_initParallelWorker)
+    try:
+        for data in pool.imap_unordered(_aggregatePartition,[(r,conditions) for r in ranges]):
+            for c,d in zip(cohorts,data):
+                for name in c.data:
+                    c.data[name] += d[name]
+
+            if progress:
+                progress.update(1)
+    finally:
+        pool.terminate()
+        pool.join()
+        _parallelCohorts = None
+
+    if progress:
+        progress.finish()
+
 
 class Cohort:
     '''
@@ -68,19 +687,32 @@ class Cohort:
         if 'time_stamps' not in self.__dict__:
             self.time_stamps = settings.time_stamps
         '''
-        List of timestamps
-        '''
-        if 'time_stamps_index' not in self.__dict__:
-            self.time_stamps_index = settings.time_stamps_index
-        '''
-        Hash from time_stamp to index in self.time_stamps
+        The :class:`timeaxis.TimeAxis` of the data matrices. The time index of a row is its `rev_month_idx` minus the month index of the first time stamp.
         '''
         
         if 'ncolors' not in self.__dict__:
             self.ncolors = len(self.cohorts)                                                
             '''The number of colors used for the wikipride graphs. If required, it should be defined in the child class definition.
             '''
-        
+
+        if 'sqlTable' not in self.__dict__:
+            self.sqlTable = None
+        '''The SQL table the cohort is aggregated from. Required by :meth:`.buildPushdownQuery`
+        '''
+
+        if 'sqlColumns' not in self.__dict__:
+            self.sqlColumns = None
+        '''List of the columns of the SQL result set that are used by :meth:`.processSQLbatch` and :meth:`.processSQLrow`. If None, the cohort doesn't implement the batch mode and the data is aggregated row by row using :meth:`.processSQLrow`, which is passed dictionary rows containing all columns.
+        '''
+
+        if self.sqlColumns is not None:
+            self.setColumnPositions()
+
+        if 'checkpointAttributes' not in self.__dict__:
+            self.checkpointAttributes = []
+        '''Names of the attributes that hold per-editor state while iterating through the rows (e.g. `old_user_id`). They are saved along with the data in checkpoints, see :meth:`.getCheckpointState`.
+        '''
+
         self.mongoQueryVars = 'settings' # {'user_id':1,'edit_count':1}
         '''The Mongo query variables used to aggregate the data. If None, all fields will be returned by mongo. If 'settings', the mongoQueryVars from the settings will be used
         '''
@@ -121,81 +753,132 @@ class Cohort:
 
         return fn
 
-    def saveDataToCSV(self,destination=settings.datadirectory):
+    def saveDataToCSV(self,destination=settings.datadirectory,compress=False):
         '''Saves the aggregated numpy.arrays to file. There is one file for each collected variable, the names is uniquely constructed from the properties of the variable and cohort. The format of the CSV doesn't follow the numpy representation as it transposes the matrix. Thus the temporal axis is vertical instead of horizontal, each row is a measurement for a different time unit. This format is used by the visualization library `dygraphs <http://dygraphs.com/>`_ . 
 
+        The transposed matrix is formatted in one block (see :func:`formatCSV`). The descriptions of the variables are saved to one manifest per cohort, `<cohort class>.yaml` (see :meth:`.getCSVDescription`).
+
         .. warning:
             Atm, this is a hack for a frontend mockup
                 
         :arg destination: str, destination directory. If None, the data directory from the settings will be used 
+        :arg compress: bool, if True, a gzip compressed copy `.csv.gz` of each file is saved as well, which can be served by the web server without compressing it on the fly
         '''
+        import os
+        import gzip
+        import yaml
 
-        for name,data in self.data.items():
-            fn = '%s.csv'%self.getFileName(varName=name,destination=destination)         
-            
-            with open(fn,'wb') as f:
-                #write header line which will be used as label names                            
-                headers = 'Date,%s\n'%(','.join(self.cohort_labels))
+        labels = self.time_stamps.getISOLabels()
 
+        manifest = { 'cohort' : self.__class__.__name__, 'datasets' : [] }
 
-                f.write(headers)
+        for name in sorted(self.data.keys()):
+            data = self.data[name]
+            fn = '%s.csv'%self.getFileName(varName=name,destination=destination)
 
+            content = formatCSV(labels[:data.shape[1]],self.cohort_labels,data)
 
+            with open(fn,'wb') as f:
+                f.write(content)
 
-                for i in range(data.shape[1]):
-                    # iterate through columns and save each as one row
-                    ts = '%s-%s'%(self.time_stamps[i][:4],self.time_stamps[i][4:])
-                    val = [str(d) for d in data[:,i]]
-                    values = '%s,%s\n'%(ts,','.join(val))
-                    f.write(values)
-            
-            fnyaml = '%s.yaml'%self.getFileName(varName=name,destination=destination)         
-            # try:
-            import yaml
+            if compress:
+                with gzip.open('%s.gz'%fn,'wb') as f:
+                    f.write(content)
+
+            manifest['datasets'].append(self.getCSVDescription(name,labels[0],labels[data.shape[1]-1],compress))
 
-            d = {}
-            d['id'] = '_'.join([name, self.__class__.__name__])
-            d['name'] = self.data_description[name]['title']
+        with open(os.path.join(destination,'%s.yaml'%self.__class__.__name__),'w') as f:
+            yaml.dump(manifest,f)
 
-            d['url'] = 'data/%s.csv'%d['id']
-            d['format'] = 'csv'
-            # d['url'] = fn
+    def getCSVDescription(self,varName,start,end,compress=False):
+        '''Returns the description of the CSV file of a variable in the manifest written by :meth:`.saveDataToCSV`
 
-            d['timespan'] = {}
-            d['timespan']['start'] = '%s-%s'%(self.time_stamps[0][:4],self.time_stamps[0][4:])
-            d['timespan']['end'] = '%s-%s'%(self.time_stamps[data.shape[1]-1][:4],self.time_stamps[data.shape[1]-1][4:])
-            d['timespan']['step'] = '1mo'
+        :arg varName: variable name
+        :arg start: str, label of the first time unit
+        :arg end: str, label of the last time unit
+        :arg compress: bool, True if a gzip compressed copy has been saved
+        :returns: dict
+        '''
+        d = {}
+        d['id'] = '_'.join([varName, self.__class__.__name__])
+        d['name'] = self.data_description[varName]['title']
 
-            d['columns'] = {}
-            d['columns']['labels'] = ['Month'] + self.cohort_labels
-            d['columns']['types'] = ['date']+['int']*len(self.cohort_labels)
+        d['url'] = 'data/%s.csv'%d['id']
+        d['format'] = 'csv'
+        d['compressed'] = compress
 
-            d['chart'] = {}
-            d['chart']['libary'] = 'dygraphs'
-            d['chart']['options'] = {'title':self.data_description[name]['title'],'ylabel':self.data_description[name]['ylabel'],'stackedGraph':True}
+        d['timespan'] = {}
+        d['timespan']['start'] = start
+        d['timespan']['end'] = end
+        d['timespan']['step'] = timeaxis.STEPS[self.time_stamps.granularity]
 
-            yaml.dump(d, open(fnyaml,'w'))
+        d['columns'] = {}
+        d['columns']['labels'] = ['Month'] + list(self.cohort_labels)
+        d['columns']['types'] = ['date']+['int']*len(self.cohort_labels)
 
-            # except:
-            #     logger.warning('saving yaml file %s failed\npyyaml not installed.'%fnyaml)
-            
-                       
-        
-    def saveDataToDisk(self,destination=settings.datadirectory):
+        d['chart'] = {}
+        d['chart']['libary'] = 'dygraphs'
+        d['chart']['options'] = {'title':self.data_description[varName]['title'],'ylabel':self.data_description[varName]['ylabel'],'stackedGraph':True}
+
+        return d
+
+    def saveDataToDisk(self,destination=settings.datadirectory,binary=True):
         '''Saves the aggregated numpy.arrays to file. There is one file for each collected variable, the names 
         is uniquely constructed from the properties of the variable and cohort.
+
+        :arg destination: str, destination directory
+        :arg binary: bool, if True, the matrices are saved to `.npy` files with a JSON sidecar (see :mod:`cohorts.store`), otherwise to `.txt` files
         '''
         for name,data in self.data.items():
-            fn = '%s.txt'%self.getFileName(varName=name,destination=destination)            
-            N.savetxt(fn,data)
+            fn = self.getFileName(varName=name,destination=destination)
+            if binary:
+                store.saveData(fn,data,self.getStoreMetadata(name))
+            else:
+                # the binary files take precedence when loading
+                store.removeData(fn)
+                saveMatrix('%s.txt'%fn,data)
+
+    def getStoreMetadata(self,varName):
+        '''Returns the description of a variable saved to the sidecar of its data file, see :func:`cohorts.store.saveData`
 
+        :arg varName: variable name
+        :returns: dict
+        '''
+        return {    'cohort' : self.__class__.__name__,
+                    'variable' : varName,
+                    'time_stamps' : self.time_stamps.toDict(),
+                    'cohort_labels' : ['%s'%l for l in self.cohort_labels],
+                    'description' : store.jsonValues(self.data_description.get(varName,{})) }
 
-    def loadDataFromDisk(self,varName,destination=None):
+    def setStoreMetadata(self,sidecar):
+        '''Restores the time axis and the cohort labels saved to the sidecar of a data file, which differ from the ones of a new instance if the data has been resampled (see :meth:`.resampleTime` and :meth:`.mergeCohorts`).
+
+        :arg sidecar: dict, as returned by :func:`cohorts.store.loadData`
+        '''
+        self.time_stamps = timeaxis.TimeAxis.fromDict(sidecar['time_stamps'])
+
+        labels = sidecar['cohort_labels']
+        if len(labels) != len(self.cohorts):
+            self.cohorts = list(range(len(labels)))
+            self.ncolors = min(self.ncolors,len(labels))
+        self.cohort_labels = labels
+
+    def getCacheParameters(self):
+        '''Returns the parameters that determine the aggregated data, used in the key of the result cache (see :func:`data.cache.getKey`). These are the attributes that can be serialized to JSON (e.g. `minedits`, `bins`, `sqlQuery`), except for the data, the per-editor state and the presentation attributes. Subclasses whose data depends on other state should extend the parameters.
+
+        :returns: dict, {attribute name : value}
+        '''
+        exclude = set(['data','data_description','time_stamps','cohort_labels','ncolors','mongoQueryVars','checkpointAttributes'] + self.checkpointAttributes)
+
+        return store.jsonValues(dict((k,v) for k,v in self.__dict__.items() if k not in exclude))
+
+    def loadDataFromDisk(self,varName,destination=None,mmap=True):
         '''Loads the data from disk. It will populate self.data with {names[i] : numpy.array}.
-        An error is raised if there is no corresponding datafile stored
+        An error is raised if there is no corresponding datafile stored. The binary files are memory-mapped, the `.txt` files of the previous versions are loaded if there is no binary file.
 
         :args varName: variable name
         :arg destination: str, destination directory. If None, settings will be used
+        :arg mmap: bool, if True, the binary files are memory-mapped (see :func:`cohorts.store.loadData`)
 
         '''
         fn = None
@@ -204,67 +887,383 @@ class Cohort:
         else:
             fn = self.getFileName(varName,destination=destination)
 
-        self.data[varName] = N.atleast_2d(N.loadtxt('%s.txt'%fn))
+        (self.data[varName],sidecar) = store.loadData(fn,mmap)
+        if sidecar is not None:
+            self.setStoreMetadata(sidecar)
 
         self.initDataDescription()        
 
+    def loadSavedData(self,destination=None):
+        '''Loads the previously saved data matrices of all variables of the cohort, without modifying self.data. Used to refresh the data incrementally, see :meth:`.getRefreshStart`.
+
+        :arg destination: str, destination directory. If None, settings will be used
+        :returns: dict, {variable name : numpy.array}, or None if the data of a variable has not been saved, or has been saved with a different time axis
+        '''
+        self.initData()
+        varNames = list(self.data.keys())
+        self.data = {}
+
+        saved = {}
+        for varName in varNames:
+            if destination is None:
+                fn = self.getFileName(varName,ftype='data')
+            else:
+                fn = self.getFileName(varName,destination=destination)
+
+            if not store.hasData(fn):
+                return None
+
+            (saved[varName],sidecar) = store.loadData(fn)
+
+            if sidecar is not None:
+                axis = timeaxis.TimeAxis.fromDict(sidecar['time_stamps'])
+                if axis.granularity != self.time_stamps.granularity or axis.first != self.time_stamps.first:
+                    return None
+
+        return saved
+
+    def getRefreshStart(self,saved):
+        '''Returns the time index from which the data needs to be aggregated again when refreshing the `saved` data matrices. The last saved month may have been aggregated before it was complete, it is therefore aggregated again along with all subsequent months. The cohorts are extended as well (e.g. age cohorts gain a new cohort every month).
+
+        Only cohorts aggregated from :attr:`sqlTable`, whose cells only depend on the rows of the same month, can be refreshed.
+
+        :arg saved: dict, {variable name : numpy.array} as returned by :meth:`.loadSavedData`
+        :returns: int, time index, or None if the data has to be aggregated from scratch
+        '''
+        if self.sqlTable is None or not saved:
+            return None
+
+        nmonths = set(m.shape[1] for m in saved.values())
+        if len(nmonths) != 1:
+            return None
+        nmonths = nmonths.pop()
+
+        if nmonths < 1 or nmonths > len(self.time_stamps):
+            return None
+
+        self.initData()
+        shapes = dict((varName,m.shape) for varName,m in self.data.items())
+        self.data = {}
+
+        for varName,m in saved.items():
+            if varName not in shapes or m.shape[0] > shapes[varName][0]:
+                return None
+
+        return nmonths-1
+
+    def getCheckpointState(self):
+        '''Returns the per-editor state of the cohort (the attributes in :attr:`checkpointAttributes`), which is saved in checkpoints along with the data. Checkpoints are only saved at editor boundaries.
+
+        :returns: dict, {attribute name : value}
+        '''
+        return dict((name,getattr(self,name)) for name in self.checkpointAttributes)
+
+    def setCheckpointState(self,state):
+        '''Restores the per-editor state returned by :meth:`.getCheckpointState`.
+
+        :arg state: dict, {attribute name : value}
+        '''
+        for name,value in state.items():
+            setattr(self,name,value)
+
+    def getRefreshConditions(self,start):
+        '''Returns the SQL conditions that select the rows from time index `start` onwards, see :meth:`.getRefreshStart`.
+
+        :arg start: int, time index
+        :returns: list of str, SQL conditions
+        '''
+        return ['rev_month_idx >= %s'%(self.time_stamps.first+start)]
+
+    def mergeData(self,saved,start):
+        '''Copies the time units before `start` of the `saved` data matrices into self.data, which contains the data aggregated from time index `start` onwards.
+
+        :arg saved: dict, {variable name : numpy.array} as returned by :meth:`.loadSavedData`
+        :arg start: int, time index
+        '''
+        for varName,m in saved.items():
+            self.data[varName][:m.shape[0],:start] = m[:,:start]
+
+    def resampleTime(self,granularity,how='sum'):
+        '''Resamples the data matrices to a coarser time axis (e.g. quarters or years instead of months), without aggregating the data again. The columns of the time units that fall into the same coarser unit are combined, :attr:`time_stamps` is replaced by the coarser axis (see :meth:`timeaxis.TimeAxis.resample`). The resampled matrices are dense numpy.arrays.
+
+        :arg granularity: str, the coarser granularity, e.g. :data:`timeaxis.QUARTER`
+        :arg how: str, 'sum', 'mean' (of the time units in the coarser unit), 'max' or 'last' (the value of the last time unit, e.g. for counts of editors)
+        '''
+        (axis,index) = self.time_stamps.resample(granularity)
+
+        # the time units of a coarser unit are contiguous
+        starts = N.flatnonzero(N.diff(N.concatenate(([-1],index))))
+        counts = N.diff(N.concatenate((starts,[len(index)])))
+
+        for varName,data in self.data.items():
+            self.data[varName] = resampleColumns(N.asarray(data,dtype=N.float64),starts,counts,how)
+
+        self.time_stamps = axis
+
+    def mergeCohorts(self,index,labels,how='sum'):
+        '''Merges the cohorts (the rows of the data matrices) into coarser cohorts, without aggregating the data again. E.g. the monthly age cohorts can be merged into yearly cohorts. :attr:`cohorts` and :attr:`cohort_labels` are replaced by the new cohorts, the merged matrices are dense numpy.arrays.
+
+        :arg index: list or numpy.array of int, the new cohort of each cohort. Cohorts with a negative index are dropped.
+        :arg labels: list of str, the labels of the new cohorts
+        :arg how: str, 'sum', 'mean' or 'max' of the merged rows
+        '''
+        index = N.asarray(index)
+
+        for varName,data in self.data.items():
+            if data.shape[0] != index.shape[0]:
+                raise ValueError('%s has %s cohorts in %s, got %s new cohort indexes'%(self,data.shape[0],varName,index.shape[0]))
+
+            self.data[varName] = mergeRows(N.asarray(data,dtype=N.float64),index,len(labels),how)
 
-    def aggregateDataFromSQL(self,verbose=False,callback=None):
-        '''Iterates over the SQL data and calls self.processSQLrow() which needs to be implemented by the parent cohort class
+        self.cohorts = list(range(len(labels)))
+        self.cohort_labels = list(labels)
+        self.ncolors = min(self.ncolors,len(labels))
 
-        :arg verbose: bool, display progress on stdout
+    def groupCohorts(self,size,how='sum'):
+        '''Merges groups of `size` consecutive cohorts, see :meth:`.mergeCohorts`. E.g. the cohorts of the relative age in months are merged into the relative age in years with a size of 12. A group is labeled with the labels of its first and last cohort.
+
+        :arg size: int, number of cohorts per group
+        :arg how: str, 'sum', 'mean' or 'max' of the merged rows
+        '''
+        n = len(self.cohorts)
+        labels = []
+        for first in range(0,n,size):
+            last = min(first+size,n)-1
+            labels.append(self.cohort_labels[first] if first == last else '%s - %s'%(self.cohort_labels[first],self.cohort_labels[last]))
+
+        self.mergeCohorts(N.arange(n)//size,labels,how)
+
+
+    def aggregateDataFromSQL(self,verbose=False,callback=None,batchsize=BATCHSIZE,pushdown=True,checkpoint=None):
+        '''Iterates over the SQL data and calls self.processSQLrow() which needs to be implemented by the parent cohort class.
+
+        If the cohort defines :attr:`sqlColumns`, the rows are fetched in chunks of `batchsize` rows instead. Each chunk is converted into typed numpy columns and passed to :meth:`.processSQLbatch`, which updates the data matrices for all rows at once. If the cohort defines a :meth:`.getPushdownQuery`, the data is aggregated on the SQL server instead.
+
+        :arg verbose: bool, report the progress (see :mod:`progress`)
         :arg callback: function, a callback function that can be used for data transformations after the query has executed.
+        :arg batchsize: int, number of rows per chunk in the batch mode. If None, the rows are processed one by one using :meth:`.processSQLrow`.
+        :arg pushdown: bool, if False the rows are always streamed from the server
+        :arg checkpoint: str, path of a checkpoint file. If given, the aggregation is checkpointed periodically and resumed from the checkpoint after a failure (see :func:`aggregateCohortsWithCheckpoints`).
         '''
 
         logger.info('Aggregating data from SQL for %s'%self)
-        
 
-        from db import sql
+        aggregateCohortsFromSQL([self],verbose=verbose,batchsize=batchsize,pushdown=pushdown,checkpoint=checkpoint)
 
-        cur = sql.getSSDictCursor()
-        # try:
-        #     from db import sql
-        # except:
-        #     logger.error("Couldn't connect to SQL")
-        #     raise Exception("SQL connection needed!")
-        
+        self.finalizeData()
 
-        if self.sqlQuery is None:
-            logger.error("No valid SQL query has been supplied.")     
-            raise Exception("SQL query needed!")
-                   
-        self.initData()
+        if callback:
+            callback()
 
-        if verbose:
-            logger.info("SQL query: %s"%self.sqlQuery)
-            # logger.info("Progress (every `.` is 10000 rows)")     
 
-        cur.execute(self.sqlQuery)
 
-        for count,row in enumerate(cur):
-            self.processSQLrow(row)
-            
-            if verbose:            
-                if count%10000==0:
-                    sys.stdout.write('.')                    
-                    sys.stdout.flush() 
-                    # print '.',
-                    # logger.info('Processed %s million SQL rows'%(count/1000000))
-        
-        if verbose:
-            sys.stdout.write('\n')                    
-            sys.stdout.flush()  
+    def aggregateDataFromSnapshot(self,verbose=False,callback=None,batchsize=SNAPSHOT_BATCHSIZE):
+        '''Equivalent of :meth:`.aggregateDataFromSQL` that aggregates the data from the local snapshot of :attr:`sqlTable` created by the `snapshot` workstep (see :mod:`data.snapshot`). The memory-mapped columns are processed by :meth:`.processSQLbatch`, thus the cohort needs to define :attr:`sqlColumns`.
+
+        :arg verbose: bool, report the progress (see :mod:`progress`)
+        :arg callback: function, a callback function that can be used for data transformations after the data has been aggregated.
+        :arg batchsize: int, number of rows per chunk
+        '''
+
+        logger.info('Aggregating data from snapshot for %s'%self)
+
+        aggregateCohortsFromSnapshot([self],verbose=verbose,batchsize=batchsize)
+
+        self.finalizeData()
 
         if callback:
             callback()
 
+    def getSQLQuery(self,conditions=None,columns=None):
+        '''Returns the SQL query used to stream the data of the cohort. The `conditions` and `columns` can only be applied to cohorts that define :attr:`sqlTable`, whose :attr:`sqlQuery` selects all rows of that table. The rows of bots are excluded on the SQL server if possible, see :meth:`.getBotConditions`.
+
+        :arg conditions: list of str, SQL conditions restricting the rows returned
+        :arg columns: list of str, the projection. If None, all columns are selected.
+        :returns: str, SQL query
+        '''
+        conditions = self.getBotConditions(conditions)
+
+        if not conditions and not columns:
+            return self.sqlQuery
+
+        if self.sqlTable is None:
+            raise Exception("SQL conditions can only be applied to cohorts that define sqlTable!")
+
+        query = 'SELECT %s FROM %s'%(', '.join(columns) if columns else '*',self.sqlTable)
+        if conditions:
+            query += ' WHERE %s'%' AND '.join(conditions)
+
+        return query + ';'
+
+    def setColumnPositions(self,columns=None):
+        '''Compiles the accessor :meth:`.getColumns`, which returns the values of the :attr:`sqlColumns` of a SQL row as a tuple (in the order of :attr:`sqlColumns`). 
+
+        :arg columns: list of str, the columns of the positional (tuple) rows in the order of the projection. If None, the rows are dictionaries.
+        '''
+        import operator
+
+        if columns is None:
+            self.getColumns = operator.itemgetter(*self.sqlColumns)
+        else:
+            self.getColumns = operator.itemgetter(*[columns.index(c) for c in self.sqlColumns])
+
+    def aggregateDataFromPushdown(self,query,verbose=False):
+        '''Aggregates the data on the SQL server. The `query` returns at most one row per cohort/time cell, with the columns `cohort_index`, `time_index` and one column for each variable in self.data. See :meth:`.getPushdownQuery`. The values are added with :meth:`.accumulate`, the cells outside of a :class:`.PackedMatrix` are dropped.
+
+        :arg query: str, the pushdown query
+        :arg verbose: bool, log the query
+        '''
+        logger.info('Aggregating data on the SQL server for %s'%self)
+
+        from db import sql
+
+        self.initData()
+
+        if verbose:
+            logger.info("SQL pushdown query: %s"%query)
+
+        cur = sql.getSSDictCursor()
+        cur.execute(query)
+
+        rows = list(cur)
+        cur.close()
+
+        cohorts_index = N.array([row['cohort_index'] for row in rows],dtype=N.int64)
+        time_index = N.array([row['time_index'] for row in rows],dtype=N.int64)
+
+        # the cells outside of packed matrices are dropped with a warning by accumulate
+        for name in self.data.keys():
+            valid = N.array([row.get(name) is not None for row in rows],dtype=bool)
+            values = N.array([float(row[name]) for row in rows if row.get(name) is not None],dtype=N.float64)
+            self.accumulate(name,cohorts_index[valid],time_index[valid],values)
+
+    def getPushdownQuery(self,conditions=None):
+        '''Returns a ``GROUP BY`` query that aggregates the data of the cohort on the SQL server, see :meth:`.aggregateDataFromPushdown`. Cohorts which only add up values into cells keyed by cohort index and time index should overwrite this method, for example using :meth:`.buildPushdownQuery`. 
+
+        :arg conditions: list of str, additional SQL conditions restricting the aggregated rows
+        :returns: str, or None if the cohort can't push down the aggregation (the default)
+        '''
+        return None
+
+    def getPushdownBuckets(self):
+        '''Returns the thresholds on the number of edits of a row the cohort depends on, if the cohort can be aggregated together with other cohorts by a combined pushdown query (see :func:`aggregateCombinedPushdown`). A threshold `e` separates the rows with at most `e` edits from the rows with more edits. Cohorts overwriting this method also implement :meth:`.getPushdownIndexArray`.
+
+        :returns: list of int, or None if the cohort can't be aggregated by a combined query (the default)
+        '''
+        return None
+
+    def getPushdownIndexArray(self,cols):
+        '''Returns the cohort indexes of the rows of a combined pushdown query, see :meth:`.processPushdownBatch`. Rows that are not aggregated by the cohort are mapped to -1.
+
+        :arg cols: dict of numpy.arrays, the columns `first_edit_month_idx`, `rev_month_idx` and `bucket_edits`, a number of edits inside of the bucket of the row
+        :returns: numpy.array of int
+        '''
+        raise Exception("Cohort subclass should implement this method!")
+
+    def processPushdownBatch(self,cols):
+        '''Adds the rows of a combined pushdown query (see :func:`aggregateCombinedPushdown`) to the data matrices. The cohort index of a row is computed by :meth:`.getPushdownIndexArray`.
+
+        :arg cols: dict of numpy.arrays, the grouped columns and the aggregated variables of :data:`data.tables.EDITOR_AGGREGATES`
+        '''
+        from data import tables
 
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+        cohorts_index = self.getPushdownIndexArray(cols)
+
+        valid = (time_index >= 0) & (cohorts_index >= 0) & (cohorts_index < len(self.cohorts))
+
+        for name,expr in tables.EDITOR_AGGREGATES:
+            self.accumulate(name,cohorts_index[valid],time_index[valid],cols[name][valid])
+
+    def buildPushdownQuery(self,cohortExpr,values,conditions=None):
+        '''Builds a pushdown query (see :meth:`.getPushdownQuery`) on :attr:`sqlTable`. The time index is computed from the `rev_month_idx` column, rows outside of `self.time_stamps` are discarded.
+
+        :arg cohortExpr: str, SQL expression for the cohort index. Rows where the expression is not a valid cohort index are discarded.
+        :arg values: list of tuples (variable name, SQL aggregate expression)
+        :arg conditions: list of str, additional SQL conditions
+        :returns: str, SQL query
+        '''
+        timeExpr = self.getMonthIndexSQL('rev_month_idx')
+
+        select = ['%s AS cohort_index'%cohortExpr, '%s AS time_index'%timeExpr]
+        select.extend('%s AS %s'%(expr,name) for name,expr in values)
+
+        where = [self.time_stamps.getRangeSQL('rev_month_idx'), '%s BETWEEN 0 AND %s'%(cohortExpr,len(self.cohorts)-1)]
+        where.extend(self.getBotConditions(conditions))
+
+        return 'SELECT %s FROM %s WHERE %s GROUP BY cohort_index, time_index;'%(', '.join(select),self.sqlTable,' AND '.join(where))
+
+    def getBotConditions(self,conditions=None):
+        '''Returns the `conditions` extended by an anti-join on the bot table (see :func:`utils.getBotCondition`), if the bots are filtered and the cohort defines :attr:`sqlTable`. The rows of bots are then not transferred from the server. The bots are still filtered in python as well (e.g. for the snapshot aggregation), which is a no-op for these rows.
+
+        :arg conditions: list of str, SQL conditions
+        :returns: list of str, SQL conditions
+        '''
+        conditions = list(conditions or [])
+
+        if self.sqlTable is not None:
+            condition = utils.getBotCondition('%s.user_id'%self.sqlTable)
+            if condition is not None:
+                conditions.append(condition)
+
+        return conditions
+
+    def getMonthIndexSQL(self,column):
+        '''Returns the SQL expression that computes the time index (i.e. the index in `self.time_stamps`) from a month index column. This is the SQL counterpart of :meth:`.getTimeIndexArray`.
+
+        :arg column: str, name of the month index column (e.g. `rev_month_idx`)
+        :returns: str, SQL expression
+        '''
+        return self.time_stamps.getIndexSQL(column)
 
     def processSQLrow(self,row):
         '''Processes a row of the SQL result set
         '''
         raise Exception("Cohort subclass should implement this method!")
 
+    def processSQLbatch(self,cols):
+        '''Processes a chunk of the SQL result set. This is the vectorized counterpart of :meth:`.processSQLrow`, it is only called if the cohort defines :attr:`sqlColumns`.
+
+        :arg cols: dict, {column name : numpy.array} containing one int64 array for each column in :attr:`sqlColumns`
+        '''
+        raise Exception("Cohort subclass should implement this method!")
+
+    def getTimeIndex(self,month_idx):
+        '''Returns the time index (i.e. the index in `self.time_stamps`) of a month index, or None if the month is not in `self.time_stamps`, see :meth:`timeaxis.TimeAxis.getIndex`.
+
+        :arg month_idx: int, month index (see :func:`utils.monthIndex`)
+        :returns: int or None
+        '''
+        return self.time_stamps.getIndex(month_idx)
+
+    def getTimeIndexArray(self,month_idx):
+        '''Vectorized version of :meth:`.getTimeIndex`, months outside of `self.time_stamps` are mapped to -1.
+
+        :arg month_idx: numpy.array of month indexes
+        :returns: numpy.array of time indexes
+        '''
+        return self.time_stamps.getIndexArray(month_idx)
+
+    def accumulate(self,varName,cohorts_index,time_index,values):
+        '''Adds the `values` to the cells (cohorts_index,time_index) of the self.data[varName] matrix. The index arrays can contain the same cell multiple times, all values are added.
+
+        :arg varName: name of the self.data variable
+        :arg cohorts_index: numpy.array of cohort indexes
+        :arg time_index: numpy.array of time indexes
+        :arg values: numpy.array of values (or a scalar) to add
+        '''
+        data = self.data[varName]
+
+        if isinstance(data,PackedMatrix):
+            data.accumulate(cohorts_index,time_index,values)
+            return
+
+        cells = cohorts_index*data.shape[1] + time_index
+        if N.isscalar(values):
+            values = N.repeat(values,cells.shape[0])
+
+        data += N.bincount(cells, weights=values, minlength=data.size).reshape(data.shape)
+
     def aggregateDataFromMongo(self):
         logger.info('Aggregating data from Mongo DB')
         
@@ -309,9 +1308,9 @@ class Cohort:
     def finalizeData(self):
         '''This method should is called at the of an aggregateDataFromXXX() method. It allows to manipulate
         the time series data in self.data. E.g. and 'addedBytes' could be divided by 'edits' to create a new 
-        variable 'addedPerEdit'.
+        variable 'addedPerEdit'. It is called once, after the data of all partitions (see :func:`aggregateCohortsParallel`) has been summed up.
         '''
-        logger.info("No manipulations after the data aggregation is implemented for %s"%(self.__class__.__name__))     
+        logger.debug("No manipulations after the data aggregation is implemented for %s"%(self.__class__.__name__))     
 
     
 
@@ -324,6 +1323,14 @@ class Cohort:
         '''
         raise Exception("Cohort subclass should implement this method!")        
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`. Returns a numpy.array containing the index of the cohort for each row in `cols`. Implementations compute the indexes with arithmetic, `numpy.searchsorted` or lookup tables instead of iterating over the rows. They can use derived columns that :meth:`.processSQLbatch` adds to `cols` (e.g. `time_index` and `fe_index`, the time indexes of the edit and of the first edit).
+
+        :arg cols: dict, {column name : numpy.array} as passed to :meth:`.processSQLbatch`
+        '''
+        raise Exception("Cohort subclass should implement this method!")
+
 
     def __repr__(self):
         '''String representation of cohort, abstract :class:`.Cohort` returns the name of the class only.
@@ -431,8 +1438,7 @@ class Cohort:
                 sys.stdout.flush()  
 
         
-        xtskip = [ int(i) for i in N.linspace(0,xt.shape[0]-1,(xt.shape[0]-1)/5)]
-        xtlabels = ['%s / %s'%(self.time_stamps[i][4:],self.time_stamps[i][:4]) for i in xtskip]
+        (xtskip,xtlabels) = self.time_stamps.getTicks()
 
         if normal:
             # axN.set_title('Net contributions of cohorts (namespace 0, bots filtered)')
@@ -560,9 +1566,7 @@ class Cohort:
             ax.xlabel(xlabel)
         else:            
             # x ticks / labels
-            xt = N.arange(len(self.time_stamps))
-            xtskip = [ int(i) for i in N.linspace(0,xt.shape[0]-1,(xt.shape[0]-1)/5)]
-            xtlabels = ['%s / %s'%(self.time_stamps[i][4:],self.time_stamps[i][:4]) for i in xtskip]
+            (xtskip,xtlabels) = self.time_stamps.getTicks()
             
             ax.set_xticks(xtskip)
             ax.set_xticklabels(xtlabels,rotation=20,verticalalignment='top')#,size='small')
@@ -0,0 +1,190 @@
+'''This module implements cohorts based on the community roles (user groups) of the editors, e.g. administrators or rollbackers. The roles are looked up in the role index, see :mod:`data.roles`.
+'''
+
+import sys,logging
+logger = logging.getLogger('Community cohorts')
+
+try:
+    import numpy as N
+except:
+    logger.error('Numpy not installed')
+
+
+import settings
+import utils
+
+from cohorts.base import Cohort,getNetColumn
+from data import tables
+
+
+class CommunityRoles(Cohort):
+    '''A cohort is defined as the editors having a given role (user group). An editor with several roles is assigned to the first of its roles in `roles`, editors without any of the roles are in the last cohort.
+
+    :arg roles: list of str, the user groups in the order of precedence. The bots are filtered out by default (see :func:`utils.isBot`), a 'bot' cohort would be empty unless `settings.filterbots` is False.
+    :arg labels: list of str, the labels of the roles. If None, the names of the user groups are used.
+    :arg minedits: int, minimum number of edits by editor in a given month to be included
+    '''
+    def __init__(self,roles=['sysop','bureaucrat','rollbacker'],labels=['Administrators','Bureaucrats','Rollbackers'],minedits=1):
+
+        self.roles = list(roles)
+        '''The user groups, in the order of precedence
+        '''
+        self.cohorts = self.roles + ['other']
+        '''Cohort definition
+        '''
+        self.cohort_labels = list(labels or roles) + ['Other users']
+        '''Cohort labels
+        '''
+
+        self.minedits = minedits
+        '''Minimum number of edits by editor in a given month to be included'''
+
+        self.roleIndex = None
+        '''The :class:`data.roles.RoleIndex`, loaded by :meth:`.initData`'''
+
+        self.sqlTable = tables.EDITOR_YEAR_MONTH
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
+        '''The SQL query returns edit information for each editor for each ym she has edited.'''
+
+        self.sqlColumns = ['user_id','rev_month_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
+        Cohort.__init__(self)
+
+
+    def initData(self):
+
+        if self.roleIndex is None:
+            from data import roles
+            self.roleIndex = roles.loadRoleIndex()
+
+        self.data['added'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        self.data['removed'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        self.data['net'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        self.data['edits'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        self.data['editors'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+
+        self.initDataDescription()
+
+
+    def getCacheParameters(self):
+        '''The cached data depends on the role index as well, the modification time of its cache file is added to the parameters
+        '''
+        import os
+        from data import roles
+
+        parameters = Cohort.getCacheParameters(self)
+        fn = roles.getRoleIndexFile()
+        parameters['roleIndex'] = os.path.getmtime(fn) if os.path.isfile(fn) else None
+        return parameters
+
+    def initDataDescription(self):
+        '''Initialize the self.data_description dictionary with information used for plotting.
+        '''
+        self.data_description['added'] = {  'title' : 'Megabytes added by community role ( %s, namespaces:All)'%('no bots' if self.nobots else 'including bots'), \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+        self.data_description['removed'] = {  'title' : 'Megabytes removed by community role ( %s, namespaces:All)'%('no bots' if self.nobots else 'including bots'), \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+        self.data_description['net'] = {  'title' : 'Megabytes Added-Removed by community role ( %s, namespaces:All)'%('no bots' if self.nobots else 'including bots'), \
+                                            'ylabel': 'Megabytes',\
+                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+        self.data_description['edits'] = {  'title' : 'Number of edits by community role ( %s, namespaces:All)'%('no bots' if self.nobots else 'including bots'), \
+                                            'ylabel': 'Edits' }
+
+        self.data_description['editors'] = {  'title' : 'Active editors by community role ( %s, namespaces:All)'%('no bots' if self.nobots else 'including bots'), \
+                                             'ylabel': 'Number of Editors' }
+
+    def processSQLrow(self,row):
+
+        (editor_id,rev_month_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
+
+        if utils.isBot(editor_id):
+            return
+
+        time_index = self.getTimeIndex(rev_month_idx)
+        if time_index is None:
+            return
+
+        edits = 0
+        if add_edits is not None:
+            edits += int(add_edits)
+        if remove_edits is not None:
+            edits += int(remove_edits)
+        if noop_edits is not None:
+            edits += int(noop_edits)
+
+        if edits < self.minedits:
+            return
+
+        cohorts_index = self.getIndex(editor_id)
+
+        self.data['editors'][cohorts_index,time_index] += 1
+
+        if len_added is not None:
+            self.data['added'][cohorts_index,time_index] += int(len_added)
+        if len_removed is not None:
+            self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
+
+        self.data['edits'][cohorts_index,time_index] += edits
+
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+
+        edits = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
+
+        valid = (time_index >= 0) & (edits >= self.minedits) & ~utils.isBotArray(cols['user_id'])
+
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,edits[valid])
+
+    def getIndex(self, editor_id):
+        '''
+        Returns the index of the cohort, i.e. the first role of the editor
+        '''
+        return int(self.getIndexArray({'user_id':N.array([editor_id])})[0])
+
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, looks up the roles of the editors in `cols['user_id']` in the role index
+        '''
+        masks = self.roleIndex.getMasks(cols['user_id'])
+
+        index = N.empty(len(masks), dtype=N.int64)
+        index.fill(len(self.roles))
+        # the roles of higher precedence are assigned last
+        for i in reversed(range(len(self.roles))):
+            index[(masks & self.roleIndex.getBit(self.roles[i])) != 0] = i
+
+        return index
+
+    def colorbarTicksAndLabels(self,ncolors):
+        '''Returns ticks and labels for the colorbar of a WikiPride visualization
+        '''
+
+        nlabels = ncolors
+
+        ticks = N.linspace(0, (1.-1./nlabels), nlabels) +0.5/nlabels
+        skip = [ int(i) for i in N.linspace(0,len(self.cohorts)-1,nlabels) ]
+        labels = [self.cohort_labels[i] for i in skip]
+
+        return ticks,labels
+
+    def __repr__(self):
+        '''String representation of cohort.
+        '''
+        return "Community roles (%s)"%', '.join(self.roles)
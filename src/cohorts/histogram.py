@@ -15,7 +15,7 @@ except:
 import settings
 import utils
 
-from cohorts.base import Cohort
+from cohorts.base import Cohort,getNetColumn
 from data import tables
 
 
@@ -50,6 +50,12 @@ class EditsHistogram(Cohort):
 
         return len(self.cohorts)-1
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, bins the number of edits in `cols['edits']` 
+        '''
+        return N.searchsorted(N.array(self.cohorts[:-1]), cols['edits'])
+
 
     def processMongoDocument(self,editor):
 
@@ -64,10 +70,7 @@ class EditsHistogram(Cohort):
 
         for year,edity in editor['edit_count'].items():        
             for month,editm in edity.items():  
-                # extract year and month 20xxxx  
-                ym = '%s%02d'%(year,int(month))
-                
-                time_index = self.time_stamps_index.get(ym,None)
+                time_index = self.time_stamps.getIndexOfDate(int(year),int(month))
                 if time_index is None:
                     continue
 
@@ -122,12 +125,17 @@ class EditsHistogram(Cohort):
 
 class EditorActivity(Cohort):
     '''The cohorts are based on the number of edits they have done in a given month. It uses a table where the values are aggregated for all namespaces.
+
+    :arg bins: list of int, the upper bin edges (inclusive) of the number of edits. The last cohort contains the editors with more edits.
     '''
-    def __init__(self):
+    def __init__(self,bins=[1,5,50,100,500,1000]):
 
         # We don't take into consideration people who have 0 edits as the data is coded sparse and we don't have
         # this information        
-        self.cohorts = [1,5,50,100,500,1000,'>1000 edits']
+        self.bins = list(bins)
+        '''The upper bin edges'''
+
+        self.cohorts = self.bins + ['>%s edits'%self.bins[-1]]
         '''Cohort definition
         '''
         self.cohort_labels = self.cohorts[:]
@@ -138,9 +146,15 @@ class EditorActivity(Cohort):
         '''Cohort labels
         '''                        
 
-        self.sqlQuery = 'SELECT * FROM %s;'%tables.EDITOR_YEAR_MONTH
+        self.sqlTable = tables.EDITOR_YEAR_MONTH
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
         '''The SQL query returns edit information for each editor for each ym she has edited.'''
 
+        self.sqlColumns = ['user_id','rev_month_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
 
         Cohort.__init__(self)
     
@@ -154,6 +168,30 @@ class EditorActivity(Cohort):
 
         return len(self.cohorts)-1
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, bins the number of edits in `cols['edits']` 
+        '''
+        return N.searchsorted(N.array(self.cohorts[:-1]), cols['edits'])
+
+    def getPushdownQuery(self,conditions=None):
+        '''The cohort index is computed on the server by binning the edits with a CASE expression.
+        '''
+        bins = ' '.join('WHEN %s <= %s THEN %s'%(tables.EDITS,e,i) for i,e in enumerate(self.cohorts[:-1]))
+        cohortExpr = '(CASE %s ELSE %s END)'%(bins,len(self.cohorts)-1)
+
+        return self.buildPushdownQuery(cohortExpr=cohortExpr,values=tables.EDITOR_AGGREGATES,conditions=conditions)
+
+    def getPushdownBuckets(self):
+        '''The cohort depends on the upper bounds of the bins
+        '''
+        return list(self.cohorts[:-1])
+
+    def getPushdownIndexArray(self, cols):
+        '''The cohort index is the bin of the number of edits
+        '''
+        return self.getIndexArray({'edits' : cols['bucket_edits']})
+
    
     def initData(self):
 
@@ -189,45 +227,57 @@ class EditorActivity(Cohort):
 
     def processSQLrow(self,row):
         # try:
-        editor_id = row['user_id']
+        (editor_id,rev_month_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
-
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(rev_month_idx)
         if time_index is None:
             return
 
 
         edits = 0
-        if row['add_edits'] is not None:
-            edits += int(row['add_edits'])
-        if row['remove_edits'] is not None:
-            edits += int(row['remove_edits'])
-        if row['noop_edits'] is not None:
-            edits += int(row['noop_edits'])
+        if add_edits is not None:
+            edits += int(add_edits)
+        if remove_edits is not None:
+            edits += int(remove_edits)
+        if noop_edits is not None:
+            edits += int(noop_edits)
 
         cohorts_index = self.getIndex(edits)
 
         self.data['editors'][cohorts_index,time_index] += 1
 
-        if row['len_added'] is not None:
-            self.data['added'][cohorts_index,time_index] += int(row['len_added'])
-        if row['len_removed'] is not None:    
-            self.data['removed'][cohorts_index,time_index] += -int(row['len_removed'])
-        if row['len_added'] is not None and row['len_removed'] is not None:
-            self.data['net'][cohorts_index,time_index] += int(row['len_added']) + int(row['len_removed'])
+        if len_added is not None:
+            self.data['added'][cohorts_index,time_index] += int(len_added)
+        if len_removed is not None:    
+            self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
         
         self.data['edits'][cohorts_index,time_index] += edits
 
         # except:
         #     raise Exception('row:\n%s'%row)
 
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+
+        valid = (time_index >= 0) & ~utils.isBotArray(cols['user_id'])
+
+        cols['edits'] = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
+
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,cols['edits'][valid])
+
     def getColor(self, i):
         '''
         Returns a color based on the index of the cohort i
@@ -300,12 +350,62 @@ class EditorActivity(Cohort):
             data = added[(i):(i+l-1),:].sum(axis=0)/e
             fig = self.addLine(data=data,fig=fig,label='%s-%s months active'%(i,(i+l-1)))
 
-        
+
+class ActivityHistograms(EditorActivity):
+    '''Aggregates several :class:`.EditorActivity` histograms with different bin edges from a single scan. The editors are binned once into the union of all bin edges, and the histograms are summed up from these fine bins by :meth:`.finalizeData`. Adding a binning thus costs no additional table scan (also if the aggregation is pushed down to the SQL server).
+
+    :arg histograms: list of :class:`.EditorActivity` instances with the same time stamps. Their data is populated by :meth:`.finalizeData`.
+    '''
+    def __init__(self,histograms):
+
+        self.histograms = histograms
+        '''The histograms filled from the fine bins'''
+
+        EditorActivity.__init__(self,bins=sorted(set(e for h in histograms for e in h.bins)))
+
+        if any(h.time_stamps != self.time_stamps for h in histograms):
+            raise Exception("The histograms must use the same time stamps!")
+
+    def finalizeData(self):
+        '''Sums up the fine bins into the bins of each histogram. Every bin of a histogram is a union of fine bins, as its edges are a subset of the fine edges.
+        '''
+        # the upper edge of each fine bin, the last bin is open
+        upper = N.array(self.bins + [N.inf])
+
+        for h in self.histograms:
+            h.initData()
+            index = N.searchsorted(N.array(h.bins), upper)
+
+            for varName,fine in self.data.items():
+                for i,ci in enumerate(index):
+                    h.data[varName][ci,:] += fine[i,:]
+
+    def __repr__(self):
+        '''String representation of cohort.
+        '''
+        return "ActivityHistograms (%s)"%', '.join(str(h.bins) for h in self.histograms)
+
+
+def combineHistograms(cohorts):
+    '''Replaces the :class:`.EditorActivity` cohorts in the list by a single :class:`.ActivityHistograms`, which aggregates all of them from one scan. :meth:`.finalizeData` of the returned cohorts has to be called after the aggregation to populate the data of the replaced cohorts.
+
+    :arg cohorts: list of :class:`.Cohort` instances sharing a scan
+    :returns: list of :class:`.Cohort` instances
+    '''
+    histograms = [c for c in cohorts if type(c) is EditorActivity]
+    if len(histograms) < 2:
+        return cohorts
+
+    return [c for c in cohorts if c not in histograms] + [ActivityHistograms(histograms)]
 
 class NewEditorActivity(Cohort):
-    '''The cohorts are based on the number of edits they have done in a given month.
+    '''The cohorts are based on the number of edits new editors have done in the first months after their first edit. The editors are counted in the month of their first edit, if they have edited in the window. The histograms of several windows (e.g. the first 1, 3, 6 and 12 months) are aggregated in one pass, there is one set of data matrices for each window (e.g. `editors_3months`).
+
+    The query aggregates the rows of the first months of each editor on the SQL server, each row of the result set contains the per-editor totals of all windows. The rows of an editor thus don't need to be processed in order.
+
+    :arg periods: list of int, the length of the windows in months. A window of `p` months contains the month of the first edit and the `p-1` following months.
     '''
-    def __init__(self,period=3  ):
+    def __init__(self,periods=[1,3,6,12]):
 
         # We don't take into consideration people who have 0 edits as the data is coded sparse and we don't have
         # this information
@@ -321,26 +421,24 @@ class NewEditorActivity(Cohort):
         # self.cohort_labels = ['<%s edits'%(e) for e in self.cohorts]
         '''Cohort labels
         '''             
-        self.period = period
-        '''The number of month an editor is considered new
+        self.periods = sorted(periods)
+        '''The number of months an editor is considered new, one window for each period
         '''
-        self.old_user_id = None
-        '''The user_id of the previously encountered editor as we iterate through the table
-        '''
-        self.lastym = None
-        '''The ym at the end of the `period` months after the first edit of an editor 
-        '''
-        self.firstedit = None
-        self.fe_index = None
 
-        self.edits = 0
-        self.added = 0
-        self.removed = 0
-        self.net = 0
+        self.sqlColumns = ['user_id','first_edit_month_idx']
+        '''The columns used by :meth:`.processSQLbatch`, the totals of the variables for each window (e.g. `edits_3`)'''
 
-        
+        windows = []
+        for p in self.periods:
+            inWindow = 'rev_month_idx < first_edit_month_idx + %s'%p
+            for (varName,expr) in [('edits',tables.EDITS),('added','IFNULL(len_added,0)'),('removed','-IFNULL(len_removed,0)'),('net','IFNULL(len_added+len_removed,0)')]:
+                windows.append('SUM(IF(%s, %s, 0)) AS %s_%s'%(inWindow,expr,varName,p))
+                self.sqlColumns.append('%s_%s'%(varName,p))
 
         Cohort.__init__(self)
+
+        self.sqlQuery = 'SELECT user_id, first_edit_month_idx, %s FROM %s WHERE rev_month_idx < first_edit_month_idx + %s AND first_edit_month_idx BETWEEN %s AND %s GROUP BY user_id, first_edit_month_idx;'%(', '.join(windows),tables.EDITOR_YEAR_MONTH,self.periods[-1],self.time_stamps.first,self.time_stamps.first+len(self.time_stamps)-1)
+        '''The SQL query returns the totals of each window for each editor'''
     
     def getIndex(self, edits):
         '''
@@ -352,89 +450,39 @@ class NewEditorActivity(Cohort):
 
         return len(self.cohorts)-1
 
-    def processSQLrow(self,row):
-        # try:
-        editor_id = row['user_id']
-
-        if utils.isBot(editor_id):
-            return
-
-
-        if editor_id != self.old_user_id:
-            '''When encountering a new editor, we extract the firstedit and the last ym of interest
-            '''
-            if self.old_user_id is not None:
-                # we just finished aggregating information for an editor
-                
-                #getting bin of the number of edits the editor has done
-                cohorts_index = self.getIndex(self.edits)
-
-                self.data['editors'][cohorts_index,self.fe_index] += 1
-                self.data['added'][cohorts_index,self.fe_index] = self.added
-                self.data['removed'][cohorts_index,self.fe_index] = self.removed
-                self.data['net'][cohorts_index,self.fe_index] = self.net
-                self.data['edits'][cohorts_index,self.fe_index] = self.edits
-
-
-            # initializing info for current editor
-            self.old_user_id = editor_id
-
-            year = row['first_edit_year']
-            month = row['first_edit_month']
-
-            self.firstedit = '%d%02d'%(year,month)
-            self.fe_index = self.time_stamps_index.get(self.firstedit,None)
-
-            if self.fe_index is None:
-                return
-            
-
-            (m,y) = ((month+self.period)%12,year+(month+self.period)/12)
-            self.lastym = '%d%02d'%(y,m)
-
-            self.edits = 0
-            self.added = 0
-            self.removed = 0
-            self.net = 0
-
-
-        if self.fe_index is None:
-            return
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, bins the number of edits in `cols['edits']` 
+        '''
+        return N.searchsorted(N.array(self.cohorts[:-1]), cols['edits'])
 
-        year = row['rev_year']
-        month = row['rev_month']
+    def processSQLrow(self,row):
+        # each row contains the totals of an editor, the row is processed as a chunk of one row
+        self.processSQLbatch(dict(zip(self.sqlColumns,[N.array([v or 0],dtype=N.int64) for v in self.getColumns(row)])))
 
-        ym = '%d%02d'%(year,month)
+    def processSQLbatch(self,cols):
 
-        if ym > self.lastym:
-            return
+        fe_index = self.getTimeIndexArray(cols['first_edit_month_idx'])
 
+        valid = (fe_index >= 0) & ~utils.isBotArray(cols['user_id'])
 
-        
-        if row['add_edits'] is not None:
-            self.edits += int(row['add_edits'])
-        if row['remove_edits'] is not None:
-            self.edits += int(row['remove_edits'])
-        if row['noop_edits'] is not None:
-            self.edits += int(row['noop_edits'])
+        for p in self.periods:
+            # only editors with edits in the window are counted
+            active = valid & (cols['edits_%s'%p] > 0)
 
-        
+            cols['edits'] = cols['edits_%s'%p]
+            cohorts_index = self.getIndexArray(cols)[active]
+            time_index = fe_index[active]
 
-        if row['len_added'] is not None:
-            self.added += int(row['len_added'])
-        if row['len_removed'] is not None:    
-            self.removed += -int(row['len_removed'])
-        if row['len_added'] is not None and row['len_removed'] is not None:
-            self.net += int(row['len_added']) + int(row['len_removed'])
-        
+            self.accumulate('editors_%smonths'%p,cohorts_index,time_index,1)
+            for varName in ['edits','added','removed','net']:
+                self.accumulate('%s_%smonths'%(varName,p),cohorts_index,time_index,cols['%s_%s'%(varName,p)][active])
 
     def initData(self):
 
-        self.data['added'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['removed'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['net'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['edits'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
-        self.data['editors'] = N.zeros((len(self.cohorts), len(self.time_stamps)))
+        for p in self.periods:
+            for varName in ['added','removed','net','edits','editors']:
+                self.data['%s_%smonths'%(varName,p)] = N.zeros((len(self.cohorts), len(self.time_stamps)))
 
         self.initDataDescription()
 
@@ -442,22 +490,23 @@ class NewEditorActivity(Cohort):
     def initDataDescription(self):
         '''Initialize the self.data_description dictionary with information used for plotting. 
         '''
-        self.data_description['added'] = {  'title' : 'Megabytes added by new editor activity ( <%s months, %s, namespaces:All)'%(self.period, 'no bots' if self.nobots else 'including bots'), \
-                                            'ylabel': 'Megabytes',\
-                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
-        self.data_description['removed'] = {  'title' : 'Megabytes removed by new editor activity ( <%s months, %s, namespaces:All)'%(self.period, 'no bots' if self.nobots else 'including bots'), \
-                                            'ylabel': 'Megabytes',\
-                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
-
-        self.data_description['net'] = {  'title' : 'Megabytes Added-Removed by new editor activity ( <%s months, %s, namespaces:All)'%(self.period, 'no bots' if self.nobots else 'including bots'), \
-                                            'ylabel': 'Megabytes',\
-                                            'ytickslabel' : lambda x : '%d'%(x/1e6) }
-
-        self.data_description['edits'] = {  'title' : 'Number of edits by new editor activity ( <%s months, %s, namespaces:All)'%(self.period,'no bots' if self.nobots else 'including bots'), \
-                                            'ylabel': 'Edits' }
-
-        self.data_description['editors'] = {  'title' : 'Edits Histogram for the first %s month of an edit activity (%s, namespaces:All)'%(self.period, 'no bots' if self.nobots else 'including bots'), \
-                                             'ylabel': 'Number of Editors' }
+        for p in self.periods:
+            self.data_description['added_%smonths'%p] = {  'title' : 'Megabytes added by new editor activity ( <%s months, %s, namespaces:All)'%(p, 'no bots' if self.nobots else 'including bots'), \
+                                                'ylabel': 'Megabytes',\
+                                                'ytickslabel' : lambda x : '%d'%(x/1e6) }
+            self.data_description['removed_%smonths'%p] = {  'title' : 'Megabytes removed by new editor activity ( <%s months, %s, namespaces:All)'%(p, 'no bots' if self.nobots else 'including bots'), \
+                                                'ylabel': 'Megabytes',\
+                                                'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+            self.data_description['net_%smonths'%p] = {  'title' : 'Megabytes Added-Removed by new editor activity ( <%s months, %s, namespaces:All)'%(p, 'no bots' if self.nobots else 'including bots'), \
+                                                'ylabel': 'Megabytes',\
+                                                'ytickslabel' : lambda x : '%d'%(x/1e6) }
+
+            self.data_description['edits_%smonths'%p] = {  'title' : 'Number of edits by new editor activity ( <%s months, %s, namespaces:All)'%(p,'no bots' if self.nobots else 'including bots'), \
+                                                'ylabel': 'Edits' }
+
+            self.data_description['editors_%smonths'%p] = {  'title' : 'Edits Histogram for the first %s month of an edit activity (%s, namespaces:All)'%(p, 'no bots' if self.nobots else 'including bots'), \
+                                                 'ylabel': 'Number of Editors' }
    
 
 
@@ -3,6 +3,7 @@
 '''
 
 import sys,logging
+import bisect
 logger = logging.getLogger('Report Card Cohorts')
 
 try:
@@ -14,7 +15,7 @@ except:
 import settings
 import utils
 
-from cohorts.base import Cohort
+from cohorts.base import Cohort,getNetColumn
 from data import tables
 
 
@@ -23,19 +24,27 @@ class EditorTrends(Cohort):
 
     .. warning:
         The wikipride plots for this cohort definition is useless. It doesn't make sense to have a stacked bar chart as the 100+ editors are a subset of the 5+ editors (one editor can be assigned to multiple cohorts for one time unit). See the :meth:`.linePlots` method instead.
+
+    Each row is only added to its highest activity level (see :meth:`.getIndex`) while aggregating, :meth:`.finalizeData` then adds up the levels with a reverse cumulative sum. The cost per row thus doesn't depend on the number of activity levels.
     '''
     def __init__(self,activitylevels=[5,10,100]):
 
-        self.cohorts = activitylevels
+        self.cohorts = sorted(activitylevels)
         '''Cohort definition
         '''                
         self.cohort_labels = ['%s+ edits'%l for l in self.cohorts]
         '''Cohort labels
         '''     
         
-        self.sqlQuery = 'SELECT * FROM %s;'%tables.EDITOR_YEAR_MONTH_NS0_NOREDIRECT
+        self.sqlTable = tables.EDITOR_YEAR_MONTH_NS0_NOREDIRECT
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
         '''The SQL query returns edit information for each editor for each ym she has edited.'''
 
+        self.sqlColumns = ['user_id','rev_month_idx','add_edits','remove_edits','noop_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
         # self.ncolors = utils.numberOfMonths(settings.time_stamps[0],settings.time_stamps[-1])/6
         '''
         Number of visible colors in the wikipride plots. 
@@ -79,43 +88,81 @@ class EditorTrends(Cohort):
 
     def processSQLrow(self,row):
         # try:
-        editor_id = row['user_id']
+        (editor_id,rev_month_idx,add_edits,remove_edits,noop_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):
             return
 
-        year = row['rev_year']
-        month = row['rev_month']
-
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(rev_month_idx)
         if time_index is None:
             return
 
         totaledits = 0
-        if row['add_edits'] is not None:
-            totaledits += int(row['add_edits'])
-        if row['remove_edits'] is not None:
-            totaledits += int(row['remove_edits'])
-        if row['noop_edits'] is not None:
-            totaledits += int(row['noop_edits'])
-        
-        for i,al in enumerate(self.cohorts):
-            # for each activity level al
-
-            if totaledits >= al:
-                self.data['edits'][i,time_index] += totaledits
-                self.data['editors'][i,time_index] += 1
-                self.data['added'][i,time_index] += int(row['len_added'])
-                self.data['removed'][i,time_index] += -int(row['len_removed'])
-                self.data['net'][i,time_index] += int(row['len_added']) + int(row['len_removed'])
+        if add_edits is not None:
+            totaledits += int(add_edits)
+        if remove_edits is not None:
+            totaledits += int(remove_edits)
+        if noop_edits is not None:
+            totaledits += int(noop_edits)
+
+        # the highest activity level of the row, the lower levels are added up in finalizeData()
+        i = self.getIndex(totaledits)
+        if i < 0:
+            return
+
+        self.data['edits'][i,time_index] += totaledits
+        self.data['editors'][i,time_index] += 1
+        if len_added is not None:
+            self.data['added'][i,time_index] += int(len_added)
+        if len_removed is not None:
+            self.data['removed'][i,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][i,time_index] += int(len_added) + int(len_removed)
+
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+
+        cols['edits'] = cols['add_edits'] + cols['remove_edits'] + cols['noop_edits']
+
+        cohorts_index = self.getIndexArray(cols)
+
+        valid = (time_index >= 0) & (cohorts_index >= 0) & ~utils.isBotArray(cols['user_id'])
+
+        cohorts_index = cohorts_index[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('editors',cohorts_index,time_index,1)
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,cols['edits'][valid])
+
+    def getPushdownQuery(self,conditions=None):
+        '''The cohort index is the highest activity level of the row, computed on the server with a CASE expression.
+        '''
+        levels = ' '.join('WHEN %s >= %s THEN %s'%(tables.EDITS,l,i) for i,l in reversed(list(enumerate(self.cohorts))))
+        cohortExpr = '(CASE %s ELSE -1 END)'%levels
+
+        return self.buildPushdownQuery(cohortExpr=cohortExpr,values=tables.EDITOR_AGGREGATES,conditions=conditions)
+
+    def finalizeData(self):
+        '''An editor with at least as many edits as an activity level belongs to all lower levels as well. The levels are added up from the highest to the lowest level (reverse cumulative sum).
+        '''
+        for varName,data in self.data.items():
+            self.data[varName] = N.cumsum(data[::-1,:],axis=0)[::-1,:]
    
-    def getIndex(self, fe):
+    def getIndex(self, edits):
+        '''
+        Returns the index of the highest activity level reached by `edits`, or -1 if the lowest level is not reached. Note that the mapping between editor and cohort is not unique after :meth:`.finalizeData` (a +100 editor is also a +5 editor).
+        '''
+        return bisect.bisect_right(self.cohorts, edits)-1
+
+    def getIndexArray(self, cols):
         '''
-        Returns the index of the cohort, which is identical to the time index of the first edit 
+        Vectorized version of :meth:`.getIndex`, for the number of edits in `cols['edits']`
         '''
-        raise Exception("NO. EditorTrends is a hacky cohort - the mapping between editor and cohort must not be unique (a +100 editor is also a +5 editor)")
+        return N.searchsorted(N.array(self.cohorts), cols['edits'], side='right')-1
 
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
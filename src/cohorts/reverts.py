@@ -18,6 +18,7 @@ except:
 import settings
 import utils
 
+from data import tables
 from cohorts.base import Cohort
 
 class Revert(Cohort):
@@ -70,11 +71,11 @@ class AbsoluteAgeReverts(Revert):
         self.cohorts = [int(i) for i in range(0,len(settings.time_stamps))]
         '''Cohort definition
         '''                
-        self.cohort_labels = ['%s / %s'%(settings.time_stamps[i][4:],settings.time_stamps[i][:4]) for i in self.cohorts]
+        self.cohort_labels = [settings.time_stamps.getLabel(i) for i in self.cohorts]
         '''Cohort labels
         '''     
         
-        self.sqlQuery = 'SELECT * FROM u_declerambaul.ptwiki_%s_editor_year_month;'%reverttype
+        self.sqlQuery = 'SELECT * FROM %s;'%(tables.REVERT_YEAR_MONTH%reverttype)
 
         Revert.__init__(self,reverttype,activation)
 
@@ -88,15 +89,11 @@ class AbsoluteAgeReverts(Revert):
         year = row['%s_year'%self.reverttype]
         month = row['%s_month'%self.reverttype]
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.time_stamps.getIndexOfDate(year,month)
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['%s_first_edit_year'%self.reverttype],row['%s_first_edit_month'%self.reverttype])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.time_stamps.getIndexOfDate(row['%s_first_edit_year'%self.reverttype],row['%s_first_edit_month'%self.reverttype])
         if fe_index is None:
             return
 
@@ -120,6 +117,12 @@ class AbsoluteAgeReverts(Revert):
         '''
         return fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the time indexes of the first edit in `cols['fe_index']`
+        '''
+        return cols['fe_index']
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
@@ -152,7 +155,7 @@ class RelativeAgeReverts(Revert):
         '''Cohort labels
         '''                        
         
-        self.sqlQuery = 'SELECT * FROM u_declerambaul.ptwiki_%s_editor_year_month;'%reverttype
+        self.sqlQuery = 'SELECT * FROM %s;'%(tables.REVERT_YEAR_MONTH%reverttype)
 
 
         Revert.__init__(self,reverttype,activation)
@@ -168,15 +171,11 @@ class RelativeAgeReverts(Revert):
         year = row['%s_year'%self.reverttype]
         month = row['%s_month'%self.reverttype]
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.time_stamps.getIndexOfDate(year,month)
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['%s_first_edit_year'%self.reverttype],row['%s_first_edit_month'%self.reverttype])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.time_stamps.getIndexOfDate(row['%s_first_edit_year'%self.reverttype],row['%s_first_edit_month'%self.reverttype])
         if fe_index is None:
             return
 
@@ -200,6 +199,12 @@ class RelativeAgeReverts(Revert):
         '''
         return ti-fe
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, the cohort indexes are the relative ages computed from the time indexes of the edits (`cols['time_index']`) and of the first edits (`cols['fe_index']`)
+        '''
+        return cols['time_index']-cols['fe_index']
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
@@ -238,32 +243,27 @@ class RevertsByEditorType(Cohort):
         '''Cohort labels
         '''     
 
+        self.sqlQuery = 'SELECT * FROM %s;'%(tables.REVERT_YEAR_MONTH%'reverting')
+        '''The SQL query returns the reverts of each reverting editor for each ym'''
+
         #initialize helper structures
+        from db import sql
+        from data import roles
         try:
-            from db import sql
+            # administrators, bureaucrats, eliminators and bots are user groups
+            self.roleIndex = roles.loadRoleIndex()
+            self.administrators = self.roleIndex.getUsers('sysop')
+            self.bureaucrats = self.roleIndex.getUsers('bureaucrat')
+            self.eliminators = self.roleIndex.getUsers('eliminator')
+            self.bots = self.roleIndex.getUsers('bot')
 
             cur = sql.getSSCursor()
 
-            # administrators
-            cur.execute("select user_id from ptwiki_p.user u join ptwiki_p.user_groups ug on (u.user_id=ug.ug_user) where ug.ug_group='sysop';")
-            self.administrators = set(i[0] for i in cur)
-            # bureaucrat
-            cur.execute("select user_id from ptwiki_p.user u join ptwiki_p.user_groups ug on (u.user_id=ug.ug_user) where ug.ug_group='bureaucrat';")
-            self.bureaucrats = set(i[0] for i in cur)
-            # eliminators
-            cur.execute("select user_id from ptwiki_p.user u join ptwiki_p.user_groups ug on (u.user_id=ug.ug_user) where ug.ug_group='eliminator';")
-            self.eliminators = set(i[0] for i in cur)
             # hugglers
-            cur.execute("select user_id from u_declerambaul.ptwiki_huggle;")
+            cur.execute("SELECT user_id FROM %s;"%tables.HUGGLE)
             self.hugglers = set(i[0] for i in cur)
-            # bots
-            cur.execute("select user_id from u_declerambaul.ptwiki_bots;")
-            self.bots = set(i[0] for i in cur)
-            
-
-            self.sqlQuery = 'SELECT * FROM u_declerambaul.ptwiki_%s_editor_year_month;'%reverttype
 
-        except:
+        except sql.Error:
             logging.error("Could not establish SQL connection to initialize RevertsByEditorType.")
 
         Cohort.__init__(self)
@@ -294,9 +294,7 @@ class RevertsByEditorType(Cohort):
         year = row['reverting_year']
         month = row['reverting_month']
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.time_stamps.getIndexOfDate(year,month)
         if time_index is None:
             return
 
@@ -341,6 +339,25 @@ class RevertsByEditorType(Cohort):
 
         return c_id
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, looks up the user groups of the reverting editors in `cols['reverting_user_id']` in the role index (see :mod:`data.roles`)
+        '''
+        editor_ids = cols['reverting_user_id']
+
+        masks = self.roleIndex.getMasks(editor_ids)
+        administrators = (masks & self.roleIndex.getBit('sysop')) != 0
+        hugglers = N.in1d(editor_ids, N.array(sorted(self.hugglers), dtype=N.int64))
+
+        index = N.empty(len(editor_ids), dtype=N.int64)
+        index.fill(self.editor_types_dict['Other'])
+        index[administrators] = self.editor_types_dict['Administrator']
+        index[hugglers] = self.editor_types_dict['Huggler']
+        index[(masks & self.roleIndex.getBit('bot')) != 0] = self.editor_types_dict['Bot']
+        index[administrators & hugglers] = self.editor_types_dict['Admin & Huggle']
+
+        return index
+
         
 
     def colorbarTicksAndLabels(self,ncolors):
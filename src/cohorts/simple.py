@@ -14,8 +14,9 @@ except:
 
 import settings
 import utils
+import timeaxis
 
-from cohorts.base import Cohort
+from cohorts.base import Cohort,getNetColumn
 from data import tables
 
 
@@ -32,9 +33,7 @@ class OneYearCohort(Cohort):
         '''
         self.overall = overall
 
-        ts,ts_i = utils.create_time_stamps_month(fromym='%s01'%self.year,toym='201012')
-        self.time_stamps = ts 
-        self.time_stamps_index = ts_i
+        self.time_stamps = timeaxis.TimeAxis('%s01'%self.year,'201012')
         '''Only take time_stamps starting with self.year
         '''
 
@@ -92,15 +91,11 @@ class OneYearCohort(Cohort):
         month = row['rev_month']
         ns = str(row['namespace'])
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.time_stamps.getIndexOfDate(year,month)
         if time_index is None:
             return
 
-        firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.time_stamps.getIndexOfDate(row['first_edit_year'],row['first_edit_month'])
         if fe_index is None:
             return
 
@@ -119,6 +114,12 @@ class OneYearCohort(Cohort):
         '''
         return 0
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, there is only one cohort
+        '''
+        return N.zeros(len(cols['user_id']), dtype=N.int64)
+
 class ProjectSpaceCohorts(Cohort):
     '''A cohort that is comprised of active editors that started editing in a given year. Only the contributions to the Wikipedia namespaces 4&5 are considered.
     '''
@@ -129,9 +130,7 @@ class ProjectSpaceCohorts(Cohort):
 
         self.NS = ( '4', '5' )
 
-        ts,ts_i = utils.create_time_stamps_month(fromym='200401',toym='201012')
-        self.time_stamps = ts 
-        self.time_stamps_index = ts_i
+        self.time_stamps = timeaxis.TimeAxis('200401','201012')
         '''Only take time_stamps starting with self.year
         '''
 
@@ -187,9 +186,7 @@ class ProjectSpaceCohorts(Cohort):
         month = row['rev_month']
         ns = str(row['namespace'])
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.time_stamps.getIndexOfDate(year,month)
         if time_index is None:
             return
 
@@ -208,6 +205,16 @@ class ProjectSpaceCohorts(Cohort):
         '''
         return self.cohorts.index(y)
 
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, given the years of the first edit in `cols['first_edit_year']`. The index is -1 for years that are not a cohort.
+        '''
+        cohorts = N.array(self.cohorts)
+        years = cols['first_edit_year']
+
+        index = N.minimum(N.searchsorted(cohorts, years), len(cohorts)-1)
+        return N.where(cohorts[index] == years, index, -1)
+
     def colorbarTicksAndLabels(self,ncolors):
         '''Returns ticks and labels for the colorbar of a WikiPride visualization
         '''
@@ -240,9 +247,15 @@ class NameSpaces(Cohort):
 
         self.cohort_index = {'0':0, '1':1, '2':2, '3':3, '4':4, '5':5}
 
-        self.sqlQuery = 'SELECT * FROM %s;'%tables.EDITOR_YEAR_MONTH_NAMESPACE
+        self.sqlTable = tables.EDITOR_YEAR_MONTH_NAMESPACE
+        '''The table the cohort is aggregated from'''
+
+        self.sqlQuery = 'SELECT * FROM %s;'%self.sqlTable
         '''The SQL query returns edit information for each editor for each ym she has edited.'''
 
+        self.sqlColumns = ['user_id','namespace','rev_month_idx','add_edits','remove_edits','len_added','len_removed']
+        '''The columns used by :meth:`.processSQLbatch`'''
+
 
         Cohort.__init__(self)
 
@@ -276,38 +289,65 @@ class NameSpaces(Cohort):
 
     def processSQLrow(self,row):
 
-        editor_id = row['user_id']
+        (editor_id,namespace,rev_month_idx,add_edits,remove_edits,len_added,len_removed) = self.getColumns(row)
 
         if utils.isBot(editor_id):            
             return
         
-        year = row['rev_year']
-        month = row['rev_month']
-        ns = str(row['namespace'])
+        ns = str(namespace)
 
-        ym = '%d%02d'%(year,month)
-
-        time_index = self.time_stamps_index.get(ym,None)
+        time_index = self.getTimeIndex(rev_month_idx)
         if time_index is None:
             return
 
         cohorts_index = self.getIndex(ns)
 
-        if row['len_added'] is not None:
-            self.data['added'][cohorts_index,time_index] += int(row['len_added'])
-        if row['len_removed'] is not None:    
-            self.data['removed'][cohorts_index,time_index] += -int(row['len_removed'])
-        if row['len_removed'] is not None and row['len_removed'] is not None:
-            self.data['net'][cohorts_index,time_index] += int(row['len_added']) + int(row['len_removed'])
-        if row['len_removed'] is not None and row['remove_edits'] is not None:
-            self.data['edits'][cohorts_index,time_index] += int(row['add_edits'])+int(row['remove_edits'])
+        if len_added is not None:
+            self.data['added'][cohorts_index,time_index] += int(len_added)
+        if len_removed is not None:    
+            self.data['removed'][cohorts_index,time_index] += -int(len_removed)
+        if len_added is not None and len_removed is not None:
+            self.data['net'][cohorts_index,time_index] += int(len_added) + int(len_removed)
+        if add_edits is not None and remove_edits is not None:
+            self.data['edits'][cohorts_index,time_index] += int(add_edits)+int(remove_edits)
 
    
+    def processSQLbatch(self,cols):
+
+        time_index = self.getTimeIndexArray(cols['rev_month_idx'])
+
+        valid = (time_index >= 0) & ~utils.isBotArray(cols['user_id'])
+
+        cohorts_index = self.getIndexArray(cols)[valid]
+        time_index = time_index[valid]
+
+        self.accumulate('added',cohorts_index,time_index,cols['len_added'][valid])
+        self.accumulate('removed',cohorts_index,time_index,-cols['len_removed'][valid])
+        self.accumulate('net',cohorts_index,time_index,getNetColumn(cols)[valid])
+        self.accumulate('edits',cohorts_index,time_index,(cols['add_edits']+cols['remove_edits'])[valid])
+
     def getIndex(self, ns):
         '''
         Returns the index of the cohort, given the year of the first edit
         '''
         return self.cohort_index.get(ns,6)
+
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, namespaces 0-5 are their own cohort, all others are in the 'other' cohort
+        '''
+        ns = cols['namespace']
+        return N.where((ns >= 0) & (ns <= 5), ns, 6)
+
+    def getPushdownQuery(self,conditions=None):
+        '''The cohort index is the namespace, or the 'other' cohort.
+        '''
+        values = [  ('added','SUM(IFNULL(len_added,0))'),
+                    ('removed','-SUM(IFNULL(len_removed,0))'),
+                    ('net','SUM(IFNULL(len_added+len_removed,0))'),
+                    ('edits','SUM(IFNULL(add_edits,0)+IFNULL(remove_edits,0))') ]
+
+        return self.buildPushdownQuery(cohortExpr='(CASE WHEN namespace BETWEEN 0 AND 5 THEN namespace ELSE 6 END)',values=values,conditions=conditions)
         
 
     def colorbarTicksAndLabels(self,ncolors):
@@ -342,14 +382,12 @@ class NewEditors(Cohort):
                 
 
         self.sqlQuery = """SELECT  
-            first_edit_year, 
-            first_edit_month, 
+            first_edit_month_idx, 
             count(*) AS recruits
         FROM
             %s
         GROUP BY
-            first_edit_year,
-            first_edit_month;"""%tables.USER_COHORT
+            first_edit_month_idx;"""%tables.USER_COHORT
         '''The SQL query returns the new editor count for each ym.'''
 
         Cohort.__init__(self)
@@ -371,9 +409,7 @@ class NewEditors(Cohort):
 
     def processSQLrow(self,row):
 
-        firstedit = '%d%02d'%(row['first_edit_year'],row['first_edit_month'])
-
-        fe_index = self.time_stamps_index.get(firstedit,None)
+        fe_index = self.getTimeIndex(row['first_edit_month_idx'])
 
         if fe_index is None:
             return
@@ -390,6 +426,12 @@ class NewEditors(Cohort):
         Not needed in this cohort!
         '''
         raise Exception("NO!")
+
+    def getIndexArray(self, cols):
+        '''
+        Vectorized version of :meth:`.getIndex`, all rows (`cols['first_edit_month_idx']`) are in the only cohort
+        '''
+        return N.zeros(len(cols['first_edit_month_idx']), dtype=N.int64)
         
 
     def colorbarTicksAndLabels(self,ncolors):
@@ -0,0 +1,149 @@
+'''This module implements the binary store of the cohort data matrices. Every variable of a cohort is saved to a `.npy` file, which keeps the dtype and doesn't need to be parsed, along with a JSON sidecar describing the matrix, the time axis, the cohort labels and the data description. :class:`.TriangularMatrix` and :class:`.BandedMatrix` are saved packed, the sidecar holds their structure.
+
+The `.npy` files are memory-mapped when loaded: only the header is read, the cells are paged in when they are accessed. The maps are copy-on-write, modifying a loaded matrix never modifies the file.
+
+The `.txt` files written by :func:`cohorts.triangular.saveMatrix` are still loaded if there is no `.npy` file, so that existing data directories keep working.
+'''
+
+import os
+import json
+import logging
+logger = logging.getLogger('Store')
+
+import numpy as N
+
+from cohorts.triangular import PackedMatrix, TriangularMatrix, BandedMatrix, loadMatrix
+
+
+FORMAT_VERSION = 1
+'''Version of the sidecar format
+'''
+
+DATA_EXTENSION = '.npy'
+'''Extension of the binary data files
+'''
+SIDECAR_EXTENSION = '.json'
+'''Extension of the sidecar files
+'''
+TEXT_EXTENSION = '.txt'
+'''Extension of the text data files, see :func:`cohorts.triangular.saveMatrix`
+'''
+
+DENSE = 'dense'
+TRIANGULAR = 'triangular'
+BANDED = 'banded'
+'''The structures of the saved matrices (`structure` in the sidecar): numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+'''
+
+
+def replaceFile(fn,write,mode='wb'):
+    '''Writes a file atomically: `write` is called with a temporary file, which is renamed to `fn`. A matrix memory-mapped from the previous version of the file remains valid.
+
+    :arg fn: str, file name
+    :arg write: function, called with the open temporary file
+    :arg mode: str, mode of the temporary file
+    '''
+    tmp = '%s.%s.tmp'%(fn,os.getpid())
+    with open(tmp,mode) as f:
+        write(f)
+    os.rename(tmp,fn)
+
+def saveData(fn,data,metadata=None):
+    '''Saves a data matrix to `fn.npy`, and its description to the sidecar `fn.json`.
+
+    :arg fn: str, file name without extension
+    :arg data: numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+    :arg metadata: dict, JSON serializable information added to the sidecar, e.g. the time axis and cohort labels
+    '''
+    sidecar = dict(metadata or {})
+    sidecar['version'] = FORMAT_VERSION
+    sidecar['shape'] = [int(n) for n in data.shape]
+
+    if isinstance(data,TriangularMatrix):
+        sidecar['structure'] = TRIANGULAR
+        values = data.packed
+    elif isinstance(data,BandedMatrix):
+        sidecar['structure'] = BANDED
+        sidecar['bandwidth'] = data.bandwidth
+        values = data.packed
+    elif isinstance(data,PackedMatrix):
+        raise Exception('Unsupported matrix %s'%data)
+    else:
+        sidecar['structure'] = DENSE
+        values = N.ascontiguousarray(data)
+    sidecar['dtype'] = values.dtype.str
+
+    replaceFile(fn+DATA_EXTENSION,lambda f: N.save(f,values))
+    replaceFile(fn+SIDECAR_EXTENSION,lambda f: json.dump(sidecar,f,indent=2,sort_keys=True),'w')
+
+def loadSidecar(fn):
+    '''Returns the sidecar of the data saved to `fn`, or None if the data has been saved as text
+
+    :arg fn: str, file name without extension
+    :returns: dict
+    '''
+    if not os.path.isfile(fn+SIDECAR_EXTENSION):
+        return None
+
+    with open(fn+SIDECAR_EXTENSION) as f:
+        sidecar = json.load(f)
+
+    if sidecar.get('version',0) > FORMAT_VERSION:
+        raise Exception('%s has been saved in the format version %s, version %s is supported'%(fn+SIDECAR_EXTENSION,sidecar['version'],FORMAT_VERSION))
+    return sidecar
+
+def loadData(fn,mmap=True):
+    '''Loads a data matrix saved by :func:`saveData`. If there is no binary file, the text file `fn.txt` is loaded.
+
+    :arg fn: str, file name without extension
+    :arg mmap: bool, if True, the binary file is memory-mapped
+    :returns: tuple, (matrix, sidecar). The matrix is a 2d numpy.array, a :class:`.TriangularMatrix` or a :class:`.BandedMatrix`, the sidecar is a dict, or None for text files.
+    '''
+    sidecar = loadSidecar(fn)
+    if sidecar is None or not os.path.isfile(fn+DATA_EXTENSION):
+        if not os.path.isfile(fn+TEXT_EXTENSION):
+            raise IOError('No data saved to %s'%fn)
+        return (loadMatrix(fn+TEXT_EXTENSION),None)
+
+    (nrows,ncols) = sidecar['shape']
+    # empty files cannot be mapped
+    values = N.load(fn+DATA_EXTENSION,mmap_mode='c' if mmap and nrows*ncols > 0 else None)
+
+    if sidecar['structure'] == TRIANGULAR:
+        data = TriangularMatrix(nrows,ncols,values)
+    elif sidecar['structure'] == BANDED:
+        data = BandedMatrix(nrows,ncols,sidecar['bandwidth'],values)
+    else:
+        data = values.reshape((nrows,ncols))
+
+    return (data,sidecar)
+
+def removeData(fn):
+    '''Removes the binary data file and the sidecar saved to `fn`, if any
+
+    :arg fn: str, file name without extension
+    '''
+    for ext in (DATA_EXTENSION,SIDECAR_EXTENSION):
+        if os.path.isfile(fn+ext):
+            os.remove(fn+ext)
+
+def hasData(fn):
+    '''Returns True if data has been saved to `fn`, in the binary or in the text format
+
+    :arg fn: str, file name without extension
+    '''
+    return (os.path.isfile(fn+DATA_EXTENSION) and os.path.isfile(fn+SIDECAR_EXTENSION)) or os.path.isfile(fn+TEXT_EXTENSION)
+
+def jsonValues(d):
+    '''Returns the items of a dict that can be serialized to JSON, e.g. the titles of a data description but not the tick label functions
+
+    :arg d: dict
+    '''
+    values = {}
+    for k,v in d.items():
+        try:
+            json.dumps(v)
+        except (TypeError,ValueError):
+            continue
+        values[k] = v
+    return values
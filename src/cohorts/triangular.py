@@ -0,0 +1,352 @@
+'''This module implements a packed storage for cohort data matrices in which most of the cells are structurally zero.
+
+In the age cohorts, the cohort index can never exceed the time index: nobody can edit before their first edit (absolute age), and the relative age of an editor cannot exceed the elapsed time (relative age). Only the cells (cohort index, time index) with ``cohort index <= time index`` are therefore stored in a :class:`.TriangularMatrix`. The cells are packed column by column, column `t` holds the cells of the cohorts ``0..t``. Appending a time unit thus only appends cells at the end.
+
+The day resolution cohorts only follow the editors during their first days of editing. A :class:`.BandedMatrix` stores the cells (first edit, time index) for which the age of the editor ``time index - first edit`` is smaller than the bandwidth, i.e. ``nrows x bandwidth`` cells instead of ``nrows x ncols``.
+
+The matrices behave like read-only 2d numpy.arrays for the operations used by the visualizations (indexing, row slicing, ``sum``, ``N.flipud``, ...). Reading a slice returns a dense float64 numpy.array.
+'''
+
+import copy
+import logging
+logger = logging.getLogger('Triangular')
+
+import numpy as N
+
+
+TRIANGULAR_HEADER = 'triangular'
+'''First word of the header of the files written by :func:`saveMatrix` for a :class:`.TriangularMatrix`
+'''
+
+BANDED_HEADER = 'banded'
+'''First word of the header of the files written by :func:`saveMatrix` for a :class:`.BandedMatrix`
+'''
+
+
+class PackedMatrix():
+    '''Abstract class of the (nrows x ncols) matrices that only store the cells inside of a given structure in the int64 numpy.array :attr:`packed`. The other cells are zero. Subclasses define the structure by implementing :meth:`.isInside`, :meth:`.getPackedIndex` and :meth:`.getCells`.
+    '''
+    ndim = 2
+    dtype = N.dtype(N.float64)
+
+    @property
+    def size(self):
+        return self.shape[0]*self.shape[1]
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return '%s(%s,%s)'%(self.__class__.__name__,self.shape[0],self.shape[1])
+
+    def isInside(self,rows,cols):
+        '''Returns True for the cells (rows,cols) that are stored
+
+        :arg rows: int or numpy.array of row indexes
+        :arg cols: int or numpy.array of column indexes
+        '''
+        raise Exception("PackedMatrix subclass should implement this method!")
+
+    def getPackedIndex(self,rows,cols):
+        '''Returns the position of the cells (rows,cols) in :attr:`packed`. Only valid for the cells inside of the structure, see :meth:`.isInside`.
+
+        :arg rows: int or numpy.array of row indexes
+        :arg cols: int or numpy.array of column indexes
+        '''
+        raise Exception("PackedMatrix subclass should implement this method!")
+
+    def getCells(self):
+        '''Returns the stored cells
+
+        :returns: tuple of numpy.arrays, (rows, cols, positions in :attr:`packed`)
+        '''
+        raise Exception("PackedMatrix subclass should implement this method!")
+
+    def accumulate(self,rows,cols,values):
+        '''Adds the `values` to the cells (rows,cols). The index arrays can contain the same cell multiple times, all values are added. Cells outside of the structure are zero, their values are dropped.
+
+        :arg rows: numpy.array of row indexes
+        :arg cols: numpy.array of column indexes
+        :arg values: numpy.array of values (or a scalar) to add
+        '''
+        valid = self.isInside(rows,cols)
+        if not valid.all():
+            logger.warning('Dropping %s values outside of %s'%((~valid).sum(),self))
+            rows = rows[valid]
+            cols = cols[valid]
+            if not N.isscalar(values):
+                values = values[valid]
+
+        cells = self.getPackedIndex(rows,cols)
+        if N.isscalar(values):
+            values = N.repeat(values,cells.shape[0])
+
+        self.packed += N.rint(N.bincount(cells, weights=values, minlength=self.packed.shape[0])).astype(N.int64)
+
+    def normalizeKey(self,key):
+        '''Splits an index into the row and column indexes, as numpy.arrays. Integer indexes are returned as ints.
+        '''
+        if not isinstance(key,tuple):
+            key = (key,)
+        if len(key) == 1:
+            key = key + (slice(None),)
+        if len(key) != 2:
+            raise IndexError('Too many indices for a 2d matrix')
+
+        (rows,cols) = key
+        rows = rows if isinstance(rows,(int,N.integer)) else N.arange(self.shape[0])[rows]
+        cols = cols if isinstance(cols,(int,N.integer)) else N.arange(self.shape[1])[cols]
+
+        return (rows,cols)
+
+    def __getitem__(self,key):
+        (rows,cols) = self.normalizeKey(key)
+
+        if isinstance(rows,(int,N.integer)) and isinstance(cols,(int,N.integer)):
+            (rows,cols) = (rows % self.shape[0],cols % self.shape[1])
+            if not self.isInside(rows,cols):
+                return 0.
+            return float(self.packed[self.getPackedIndex(rows,cols)])
+
+        r = N.atleast_1d(rows) % self.shape[0]
+        c = N.atleast_1d(cols) % self.shape[1]
+
+        block = N.zeros((r.shape[0],c.shape[0]))
+        inside = self.isInside(r[:,None],c[None,:])
+        (ri,ci) = N.nonzero(inside)
+        block[inside] = self.packed[self.getPackedIndex(r[ri],c[ci])]
+
+        if isinstance(rows,(int,N.integer)):
+            return block[0,:]
+        if isinstance(cols,(int,N.integer)):
+            return block[:,0]
+        return block
+
+    def __setitem__(self,key,value):
+        (rows,cols) = self.normalizeKey(key)
+
+        if isinstance(rows,(int,N.integer)) and isinstance(cols,(int,N.integer)):
+            (rows,cols) = (rows % self.shape[0],cols % self.shape[1])
+            if not self.isInside(rows,cols):
+                if value != 0:
+                    raise IndexError('The cell (%s,%s) is outside of %s'%(rows,cols,self))
+                return
+            self.packed[self.getPackedIndex(rows,cols)] = N.rint(value)
+            return
+
+        dense = self.toarray()
+        dense[key] = value
+        self.packed[:] = self.pack(dense)
+
+    def __iadd__(self,other):
+        if isinstance(other,PackedMatrix):
+            if other.__class__ != self.__class__ or other.shape != self.shape or other.packed.shape != self.packed.shape:
+                raise ValueError('Cannot add %s to %s'%(other,self))
+            self.packed += other.packed
+        else:
+            self.packed += self.pack(other)
+        return self
+
+    def __array__(self,dtype=None,copy=None):
+        dense = self.toarray()
+        if dtype is not None:
+            dense = dense.astype(dtype)
+        return dense
+
+    def toarray(self):
+        '''Returns the dense matrix as a float64 numpy.array
+        '''
+        dense = N.zeros(self.shape)
+        (rows,cols,index) = self.getCells()
+        dense[rows,cols] = self.packed[index]
+        return dense
+
+    def pack(self,data):
+        '''Returns the packed cells of a dense matrix with the structure of this matrix. The cells outside of the structure must be zero.
+
+        :arg data: 2d numpy.array of the same shape
+        :returns: numpy.array of int64
+        '''
+        data = N.atleast_2d(N.asarray(data))
+        if data.shape != self.shape:
+            raise ValueError('Shape mismatch %s and %s'%(data.shape,self.shape))
+
+        (rows,cols,index) = self.getCells()
+
+        outside = N.ones(self.shape,dtype=bool)
+        outside[rows,cols] = False
+        if N.any(data[outside]):
+            raise ValueError('The matrix has non-zero cells outside of %s'%self)
+
+        packed = N.zeros(self.packed.shape[0],dtype=N.int64)
+        packed[index] = N.rint(data[rows,cols])
+        return packed
+
+    def copy(self):
+        m = copy.copy(self)
+        m.packed = self.packed.copy()
+        return m
+
+    def sum(self,axis=None):
+        '''Sums the cells, like numpy.array.sum(). Returns float64 values.
+
+        :arg axis: None, 0 (sum over the rows of each column) or 1 (sum over the columns of each row)
+        '''
+        if axis is None:
+            return float(self.packed.sum())
+
+        if axis not in (0,1):
+            raise ValueError('Invalid axis %s for a 2d matrix'%axis)
+
+        (rows,cols,index) = self.getCells()
+        return N.bincount(cols if axis == 0 else rows,weights=self.packed[index],minlength=self.shape[1-axis]).astype(N.float64)
+
+
+class TriangularMatrix(PackedMatrix):
+    '''A (nrows x ncols) matrix which only stores the cells (i,j) with ``i <= j`` in an int64 numpy.array. The other cells are zero.
+
+    :arg nrows: int, number of rows (cohorts)
+    :arg ncols: int, number of columns (time units)
+    :arg packed: numpy.array, the packed cells, see :meth:`.getPackedIndex`. If None, all cells are zero.
+    '''
+    def __init__(self,nrows,ncols,packed=None):
+
+        self.shape = (int(nrows),int(ncols))
+        '''Shape of the (dense) matrix'''
+
+        self.offsets = N.concatenate(([0],N.cumsum(N.minimum(N.arange(self.shape[1])+1,self.shape[0])))).astype(N.int64)
+        '''Position of the first cell of each column in :attr:`packed`'''
+
+        if packed is None:
+            packed = N.zeros(self.offsets[-1],dtype=N.int64)
+        elif len(packed) != self.offsets[-1]:
+            raise Exception('A %sx%s triangular matrix has %s cells, got %s'%(self.shape[0],self.shape[1],self.offsets[-1],len(packed)))
+
+        self.packed = N.asarray(packed,dtype=N.int64)
+        '''The stored cells, column by column'''
+
+    def isInside(self,rows,cols):
+        return N.asarray(rows) <= cols
+
+    def getPackedIndex(self,rows,cols):
+        return self.offsets[cols] + rows
+
+    def getCells(self):
+        lengths = N.diff(self.offsets)
+        cols = N.repeat(N.arange(self.shape[1]),lengths)
+        rows = N.arange(self.packed.shape[0]) - N.repeat(self.offsets[:-1],lengths)
+        return (rows,cols,N.arange(self.packed.shape[0]))
+
+    @staticmethod
+    def fromarray(data):
+        '''Packs a dense matrix. The cells below the diagonal must be zero.
+
+        :arg data: 2d numpy.array
+        '''
+        data = N.atleast_2d(N.asarray(data))
+
+        m = TriangularMatrix(data.shape[0],data.shape[1])
+        m.packed[:] = m.pack(data)
+        return m
+
+    def sum(self,axis=None):
+        if axis == 0:
+            if self.shape[0] == 0 or self.shape[1] == 0:
+                return N.zeros(self.shape[1])
+            # every column holds at least one cell
+            return N.add.reduceat(self.packed,self.offsets[:-1]).astype(N.float64)
+
+        return PackedMatrix.sum(self,axis)
+
+
+class BandedMatrix(PackedMatrix):
+    '''A (nrows x ncols) matrix which only stores the cells (i,j) with ``0 <= j-i < bandwidth`` in an int64 numpy.array. The other cells are zero. The cells are packed row by row, row `i` holds the cells of the columns ``i..i+bandwidth-1`` (the cells beyond the last column are always zero).
+
+    :arg nrows: int, number of rows (cohorts)
+    :arg ncols: int, number of columns (time units)
+    :arg bandwidth: int, number of stored cells per row
+    :arg packed: numpy.array, the packed cells, see :meth:`.getPackedIndex`. If None, all cells are zero.
+    '''
+    def __init__(self,nrows,ncols,bandwidth,packed=None):
+
+        self.shape = (int(nrows),int(ncols))
+        '''Shape of the (dense) matrix'''
+
+        self.bandwidth = int(bandwidth)
+        '''Number of stored cells per row'''
+
+        if packed is None:
+            packed = N.zeros(self.shape[0]*self.bandwidth,dtype=N.int64)
+        elif len(packed) != self.shape[0]*self.bandwidth:
+            raise Exception('A %sx%s banded matrix of bandwidth %s has %s cells, got %s'%(self.shape[0],self.shape[1],self.bandwidth,self.shape[0]*self.bandwidth,len(packed)))
+
+        self.packed = N.asarray(packed,dtype=N.int64)
+        '''The stored cells, row by row'''
+
+    def __repr__(self):
+        return 'BandedMatrix(%s,%s,%s)'%(self.shape[0],self.shape[1],self.bandwidth)
+
+    def isInside(self,rows,cols):
+        offset = cols - N.asarray(rows)
+        return (offset >= 0) & (offset < self.bandwidth)
+
+    def getPackedIndex(self,rows,cols):
+        return rows*self.bandwidth + (cols-rows)
+
+    def getCells(self):
+        rows = N.repeat(N.arange(self.shape[0]),self.bandwidth)
+        cols = rows + N.tile(N.arange(self.bandwidth),self.shape[0])
+        index = N.arange(self.packed.shape[0])
+        valid = cols < self.shape[1]
+        return (rows[valid],cols[valid],index[valid])
+
+    def getBand(self):
+        '''Returns the stored cells as a (nrows x bandwidth) view of :attr:`packed`: the cell ``[i,k]`` is the cell (i,i+k) of the matrix. For the day cohorts, column `k` contains the values of the editors at age `k`.
+        '''
+        return self.packed.reshape((self.shape[0],self.bandwidth))
+
+    @staticmethod
+    def fromarray(data,bandwidth):
+        '''Packs a dense matrix. The cells outside of the band must be zero.
+
+        :arg data: 2d numpy.array
+        :arg bandwidth: int, number of stored cells per row
+        '''
+        data = N.atleast_2d(N.asarray(data))
+
+        m = BandedMatrix(data.shape[0],data.shape[1],bandwidth)
+        m.packed[:] = m.pack(data)
+        return m
+
+
+def saveMatrix(fn,data):
+    '''Saves a data matrix to a txt file. :class:`.TriangularMatrix` and :class:`.BandedMatrix` are saved packed, with a header containing the shape.
+
+    :arg fn: str, file name
+    :arg data: numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+    '''
+    if isinstance(data,TriangularMatrix):
+        N.savetxt(fn,data.packed,fmt='%d',header='%s %s %s'%(TRIANGULAR_HEADER,data.shape[0],data.shape[1]))
+    elif isinstance(data,BandedMatrix):
+        N.savetxt(fn,data.packed,fmt='%d',header='%s %s %s %s'%(BANDED_HEADER,data.shape[0],data.shape[1],data.bandwidth))
+    else:
+        N.savetxt(fn,data)
+
+def loadMatrix(fn):
+    '''Loads a data matrix saved by :func:`saveMatrix`
+
+    :arg fn: str, file name
+    :returns: 2d numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+    '''
+    with open(fn) as f:
+        header = f.readline().split()
+
+    if header[1:2] == [TRIANGULAR_HEADER]:
+        packed = N.atleast_1d(N.loadtxt(fn,dtype=N.int64))
+        return TriangularMatrix(int(header[2]),int(header[3]),packed)
+
+    if header[1:2] == [BANDED_HEADER]:
+        packed = N.atleast_1d(N.loadtxt(fn,dtype=N.int64))
+        return BandedMatrix(int(header[2]),int(header[3]),int(header[4]),packed)
+
+    return N.atleast_2d(N.loadtxt(fn))
@@ -13,6 +13,41 @@ Tables
     :members:
 
 
+Roles
+--------------------
+
+.. automodule:: data.roles
+    :members:
+
+
+Snapshot
+--------------------
+
+.. automodule:: data.snapshot
+    :members:
+
+
+Result cache
+--------------------
+
+.. automodule:: data.cache
+    :members:
+
+
+Payload
+--------------------
+
+.. automodule:: data.payload
+    :members:
+
+
+Warehouse
+--------------------
+
+.. automodule:: data.warehouse
+    :members:
+
+
 Report
 --------------------
 
@@ -0,0 +1,260 @@
+'''
+The result cache of the aggregated cohort data. The data of a cohort is cached under a key derived from everything the aggregation depends on (see :func:`getKey`): the cohort class and its parameters, the SQL query, the time axis, the bot filter and a watermark of the source tables. The data aggregated from a local snapshot (see :mod:`data.snapshot`) is keyed by the manifest of the snapshot instead, the MySQL server is not queried in that case. If none of them has changed since the last run, the cached matrices are used instead of aggregating the data again.
+
+The cache directory (`settings.cachedirectory`) can be shared by the wikis of several languages. Each entry is a directory holding the data matrices in the binary format of :mod:`cohorts.store` and an entry file. When the cache grows larger than `settings.cachesize` megabytes, the least recently used entries are evicted.
+'''
+
+import os, errno, re
+import json
+import time
+import shutil
+import hashlib
+import logging
+logger = logging.getLogger('Cache')
+
+import settings
+import utils
+
+from cohorts import store
+
+
+CACHE_VERSION = 1
+'''Version of the cache entries, part of the key
+'''
+
+ENTRY_FILE = 'entry.json'
+'''The file of an entry holding its key parameters, variables and size. Its modification time is the time of the last use of the entry.
+'''
+
+_watermarks = {}
+'''The watermarks of the source tables, computed once per process. {table name : watermark}
+'''
+
+
+def getTables(sqlQuery):
+    '''Returns the tables a query reads from
+
+    :arg sqlQuery: str, SQL query
+    :returns: sorted list of str
+    '''
+    return sorted(set(re.findall(r'\b(?:FROM|JOIN)\s+([\w.]+)',sqlQuery,re.IGNORECASE)))
+
+def getWatermark(table):
+    '''Returns the watermark of a table, which changes when the table is created again or rows are added: the number of rows and the creation and update time from `information_schema`. The preprocessed tables have no revision ids, the rows are therefore counted.
+
+    :arg table: str, name of the table (including the database)
+    :returns: list, or None if the table could not be queried
+    '''
+    if table in _watermarks:
+        return _watermarks[table]
+
+    from db import sql
+
+    watermark = None
+    try:
+        cur = sql.getCursor()
+        cur.execute('SELECT COUNT(*) FROM %s;'%table)
+        watermark = [int(cur.fetchone()[0])]
+
+        if '.' in table:
+            (db,name) = table.split('.')
+            cur.execute("SELECT CREATE_TIME, UPDATE_TIME FROM information_schema.TABLES WHERE TABLE_SCHEMA='%s' AND TABLE_NAME='%s';"%(db,name))
+            row = cur.fetchone()
+            if row is not None:
+                watermark.extend(str(t) for t in row)
+        cur.close()
+    except:
+        logger.warning('Could not compute the watermark of %s'%table)
+        watermark = None
+
+    _watermarks[table] = watermark
+    return watermark
+
+def getBotFilter():
+    '''Returns a digest of the bots that are filtered, see :func:`utils.setFilterBots`
+    '''
+    if not utils.filterBots or utils.botsArray is None:
+        return None
+    return hashlib.sha1(utils.botsArray.tobytes()).hexdigest()
+
+def getSnapshotWatermark(table):
+    '''Returns the watermark of the snapshot of a table: its creation time and number of rows from the manifest, see :func:`data.snapshot.getManifest`
+
+    :arg table: str, name of the table (including the database)
+    :returns: list, or None if the manifest could not be read
+    '''
+    from data import snapshot
+
+    try:
+        manifest = snapshot.getManifest(table)
+        return [manifest['created'],int(manifest['rows'])]
+    except:
+        logger.warning('Could not read the snapshot manifest of %s'%table)
+        return None
+
+def getKey(cohort,source='sql'):
+    '''Returns the key of the cached data of a cohort, or None if the data can't be cached because the watermark of a source table is unknown
+
+    :arg cohort: :class:`cohorts.base.Cohort`
+    :arg source: str, 'sql' if the data is aggregated from the MySQL server, 'snapshot' if it is aggregated from the snapshot of :attr:`cohorts.base.Cohort.sqlTable`
+    :returns: tuple, (key, parameters). The key is the hex digest of the JSON serialized parameters.
+    '''
+    sqlQuery = cohort.getSQLQuery()
+
+    watermarks = {}
+    if source == 'snapshot':
+        tables = [cohort.sqlTable]
+        watermark = getSnapshotWatermark
+    else:
+        tables = getTables(sqlQuery)
+        watermark = getWatermark
+    for table in tables:
+        watermarks[table] = watermark(table)
+        if watermarks[table] is None:
+            return (None,None)
+
+    parameters = {  'version' : CACHE_VERSION,
+                    'source' : source,
+                    'language' : settings.language,
+                    'cohort' : '%s.%s'%(cohort.__class__.__module__,cohort.__class__.__name__),
+                    'parameters' : cohort.getCacheParameters(),
+                    'sqlQuery' : sqlQuery,
+                    'time_stamps' : cohort.time_stamps.toDict(),
+                    'bots' : getBotFilter(),
+                    'watermarks' : watermarks }
+
+    key = hashlib.sha1(json.dumps(parameters,sort_keys=True).encode('utf-8')).hexdigest()
+    return (key,parameters)
+
+
+class ResultCache():
+    '''The cache directory
+
+    :arg directory: str, the cache directory
+    :arg maxsize: int, maximal size in bytes
+    '''
+    def __init__(self,directory,maxsize):
+
+        self.directory = directory
+        '''The cache directory'''
+
+        self.maxsize = maxsize
+        '''Maximal size in bytes'''
+
+    def getEntryDirectory(self,key):
+        '''Returns the directory of an entry
+        '''
+        return os.path.join(self.directory,key)
+
+    def get(self,key,cohort):
+        '''Loads the cached data of a cohort into its :attr:`data`
+
+        :arg key: str, see :func:`getKey`
+        :arg cohort: :class:`cohorts.base.Cohort`
+        :returns: bool, True if the data was cached
+        '''
+        if key is None:
+            return False
+
+        fn = os.path.join(self.getEntryDirectory(key),ENTRY_FILE)
+        try:
+            with open(fn) as f:
+                entry = json.load(f)
+
+            data = {}
+            for varName in entry['variables']:
+                (data[varName],sidecar) = store.loadData(os.path.join(self.getEntryDirectory(key),varName))
+        except (IOError,OSError,ValueError,KeyError):
+            return False
+
+        cohort.data = data
+        cohort.initDataDescription()
+
+        # the entry is the most recently used
+        os.utime(fn,None)
+        logger.info('Using the cached data of %s'%cohort)
+        return True
+
+    def put(self,key,cohort,parameters=None):
+        '''Adds the data of a cohort to the cache and evicts the least recently used entries if the cache is too large
+
+        :arg key: str, see :func:`getKey`
+        :arg cohort: :class:`cohorts.base.Cohort`
+        :arg parameters: dict, the parameters of the key, saved to the entry file for inspection
+        '''
+        if key is None:
+            return
+
+        path = self.getEntryDirectory(key)
+        tmp = '%s.%s.tmp'%(path,os.getpid())
+        try:
+            os.makedirs(tmp)
+
+            for varName,data in cohort.data.items():
+                store.saveData(os.path.join(tmp,varName),data,cohort.getStoreMetadata(varName))
+
+            entry = {   'key' : key,
+                        'cohort' : str(cohort),
+                        'variables' : sorted(cohort.data.keys()),
+                        'size' : getSize(tmp),
+                        'created' : time.strftime('%Y-%m-%d %H:%M:%S'),
+                        'parameters' : parameters }
+            with open(os.path.join(tmp,ENTRY_FILE),'w') as f:
+                json.dump(entry,f,indent=2,sort_keys=True)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            os.rename(tmp,path)
+        except (IOError,OSError):
+            logger.warning('Could not cache the data of %s'%cohort)
+            shutil.rmtree(tmp,ignore_errors=True)
+            return
+
+        self.evict()
+
+    def getEntries(self):
+        '''Returns the entries of the cache, the least recently used first
+
+        :returns: list of tuples, (last use, size in bytes, key)
+        '''
+        entries = []
+        for key in os.listdir(self.directory):
+            fn = os.path.join(self.directory,key,ENTRY_FILE)
+            if key.endswith('.tmp') or not os.path.isfile(fn):
+                continue
+            entries.append((os.path.getmtime(fn),getSize(os.path.join(self.directory,key)),key))
+        return sorted(entries)
+
+    def evict(self):
+        '''Removes the least recently used entries until the size of the cache is at most :attr:`maxsize`
+        '''
+        entries = self.getEntries()
+        size = sum(s for (t,s,key) in entries)
+
+        for (t,s,key) in entries:
+            if size <= self.maxsize:
+                break
+            logger.info('Evicting %s from the cache (%.1f MB)'%(key,s/1e6))
+            shutil.rmtree(self.getEntryDirectory(key),ignore_errors=True)
+            size -= s
+
+
+def getSize(path):
+    '''Returns the size of the files in a directory in bytes
+    '''
+    return sum(os.path.getsize(os.path.join(path,fn)) for fn in os.listdir(path))
+
+def getCache():
+    '''Returns the result cache configured in the settings, or None if the cache is disabled
+    '''
+    if not settings.cachesize or not settings.cachedirectory:
+        return None
+
+    try:
+        os.makedirs(settings.cachedirectory)
+    except OSError as exc:
+        if exc.errno == errno.EEXIST:
+            pass
+        else: raise
+
+    return ResultCache(settings.cachedirectory,settings.cachesize*1024*1024)
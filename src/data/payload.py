@@ -0,0 +1,174 @@
+'''
+Exports the data of a report item as one compact payload, from which the report pages can render the WikiPride charts in the browser instead of downloading one CSV file per variable (see :meth:`cohorts.base.Cohort.saveDataToCSV`) and the images rendered by matplotlib.
+
+A payload file starts with the 4 bytes :data:`MAGIC`, followed by the length of the header (uint32, little-endian) and the UTF-8 encoded JSON header, padded to a multiple of 8 bytes. The header holds the time axis, the cohort labels and the description of every variable, including the byte offsets of its arrays in the body. The body contains the little-endian integer arrays, each aligned to 8 bytes so that they can be read as typed arrays.
+
+The matrices are encoded row by row (see :func:`encodeMatrix`): the leading and trailing zeros of every cohort are dropped, which drops the zero triangle of the age cohorts and the cells outside of the band of the day cohorts, and the remaining cells are delta-encoded along the time axis. The values are stored as int32, unless they don't fit.
+'''
+
+import json
+import struct
+import logging
+logger = logging.getLogger('Payload')
+
+import numpy as N
+
+import timeaxis
+
+
+MAGIC = b'WPRD'
+'''The first bytes of a payload file
+'''
+
+PAYLOAD_VERSION = 1
+'''Version of the payload format, saved in the header
+'''
+
+PAYLOAD_EXTENSION = '.wpr'
+'''Extension of the payload files
+'''
+
+ALIGNMENT = 8
+'''The arrays of the body start at multiples of this number of bytes
+'''
+
+
+def encodeMatrix(data):
+    '''Encodes a data matrix. For each row (cohort), the cells from the first to the last non-zero cell are kept, the first kept cell as is, the following ones as the difference to the previous cell of the row. The values are rounded to integers.
+
+    :arg data: 2d numpy.array, :class:`.TriangularMatrix` or :class:`.BandedMatrix`
+    :returns: tuple of numpy.arrays, (starts, lengths, values). The first kept column and the number of kept cells of each row (int32), and the delta-encoded cells of all rows (int32, or int64 if the values don't fit)
+    '''
+    dense = N.asarray(data,dtype=N.float64)
+    rounded = N.rint(dense)
+    if not N.array_equal(rounded,dense):
+        logger.warning('Rounding the non-integral values of a %sx%s matrix'%dense.shape)
+    dense = rounded.astype(N.int64)
+
+    (nrows,ncols) = dense.shape
+    nonzero = dense != 0
+    empty = ~nonzero.any(axis=1)
+
+    if ncols == 0:
+        return (N.zeros(nrows,dtype=N.int32),N.zeros(nrows,dtype=N.int32),N.zeros(0,dtype=N.int32))
+
+    starts = N.argmax(nonzero,axis=1)
+    ends = ncols - N.argmax(nonzero[:,::-1],axis=1)
+    starts[empty] = 0
+    ends[empty] = 0
+
+    cols = N.arange(ncols)
+    keep = (cols >= starts[:,None]) & (cols < ends[:,None])
+
+    # the cell before the first kept cell is zero, its delta is its value
+    deltas = N.diff(N.concatenate((N.zeros((nrows,1),dtype=N.int64),dense),axis=1),axis=1)[keep]
+
+    dtype = N.int32
+    if len(deltas) and (deltas.min() < N.iinfo(N.int32).min or deltas.max() > N.iinfo(N.int32).max):
+        dtype = N.int64
+
+    return (starts.astype(N.int32),(ends-starts).astype(N.int32),deltas.astype(dtype))
+
+def decodeMatrix(shape,starts,lengths,values):
+    '''Decodes a matrix encoded by :func:`encodeMatrix`. This is the reference implementation of the decoder of the report pages.
+
+    :arg shape: tuple, (number of rows, number of columns)
+    :arg starts: numpy.array, the first kept column of each row
+    :arg lengths: numpy.array, the number of kept cells of each row
+    :arg values: numpy.array, the delta-encoded cells
+    :returns: 2d numpy.array of int64
+    '''
+    (nrows,ncols) = shape
+    starts = N.asarray(starts,dtype=N.int64)
+    cols = N.arange(ncols)
+    keep = (cols >= starts[:,None]) & (cols < (starts+lengths)[:,None])
+
+    dense = N.zeros((nrows,ncols),dtype=N.int64)
+    dense[keep] = values
+    dense = N.cumsum(dense,axis=1)
+    dense[~keep] = 0
+    return dense
+
+def savePayload(fn,cohort,varNames=None,compress=False):
+    '''Saves the data of a cohort to a payload file
+
+    :arg fn: str, file name
+    :arg cohort: :class:`cohorts.base.Cohort`
+    :arg varNames: list of str, the variables to save. If None, all variables of the cohort are saved.
+    :arg compress: bool, if True, a gzip compressed copy `fn.gz` is saved as well
+    '''
+    import gzip
+
+    header = {  'version' : PAYLOAD_VERSION,
+                'cohort' : cohort.__class__.__name__,
+                'title' : str(cohort),
+                'time_stamps' : cohort.time_stamps.toDict(),
+                'step' : timeaxis.STEPS[cohort.time_stamps.granularity],
+                'cohort_labels' : ['%s'%l for l in cohort.cohort_labels],
+                'ncolors' : int(cohort.ncolors),
+                'variables' : [] }
+
+    arrays = []
+    offset = 0
+    for varName in sorted(varNames or cohort.data.keys()):
+        data = cohort.data[varName]
+        description = cohort.data_description.get(varName,{})
+
+        variable = {    'id' : '_'.join([varName,cohort.__class__.__name__]),
+                        'name' : varName,
+                        'title' : description.get('title',varName),
+                        'ylabel' : description.get('ylabel',''),
+                        'shape' : [int(n) for n in data.shape] }
+
+        for (name,a) in zip(('starts','lengths','values'),encodeMatrix(data)):
+            a = a.astype(a.dtype.newbyteorder('<'))
+            variable[name] = { 'offset' : offset, 'count' : len(a), 'dtype' : a.dtype.name }
+            arrays.append((offset,a))
+            offset += -(-a.nbytes//ALIGNMENT)*ALIGNMENT
+
+        header['variables'].append(variable)
+
+    encoded = json.dumps(header,sort_keys=True).encode('utf-8')
+    # the body starts at a multiple of the alignment
+    encoded += b' '*(-(len(MAGIC)+4+len(encoded))%ALIGNMENT)
+
+    body = bytearray(offset)
+    for (start,a) in arrays:
+        body[start:start+a.nbytes] = a.tobytes()
+
+    content = MAGIC + struct.pack('<I',len(encoded)) + encoded + bytes(body)
+
+    with open(fn,'wb') as f:
+        f.write(content)
+
+    if compress:
+        with gzip.open('%s.gz'%fn,'wb') as f:
+            f.write(content)
+
+def loadPayload(fn):
+    '''Loads a payload file saved by :func:`savePayload`
+
+    :arg fn: str, file name
+    :returns: tuple, (header dict, {variable name : 2d numpy.array of int64})
+    '''
+    with open(fn,'rb') as f:
+        content = f.read()
+
+    if content[:len(MAGIC)] != MAGIC:
+        raise Exception('%s is not a payload file'%fn)
+
+    (length,) = struct.unpack('<I',content[len(MAGIC):len(MAGIC)+4])
+    start = len(MAGIC)+4
+    header = json.loads(content[start:start+length].decode('utf-8'))
+    if header['version'] > PAYLOAD_VERSION:
+        raise Exception('%s has been saved in the payload version %s, version %s is supported'%(fn,header['version'],PAYLOAD_VERSION))
+
+    body = start+length
+    def read(array):
+        return N.frombuffer(content,dtype=N.dtype(str(array['dtype'])).newbyteorder('<'),count=array['count'],offset=body+array['offset'])
+
+    data = {}
+    for variable in header['variables']:
+        data[variable['name']] = decodeMatrix(variable['shape'],read(variable['starts']),read(variable['lengths']),read(variable['values']))
+
+    return (header,data)
@@ -8,9 +8,11 @@ logger = logging.getLogger('Preprocessing')
 
 
 import settings
+import progress
 
 from data.tables import *
 from data.userlists import *
+from data import roles
 from db import sql
 
 
@@ -55,9 +57,15 @@ def createTable(query,tablename):
         
         if not tableExists(tablename):
             cur = sql.getCursor()
-            logger.info('Creating %s table'%tablename)
-            cur.execute(query)
-            logger.info('Finished creating %s table'%tablename)
+            p = progress.Progress('Creating %s'%tablename)
+            p.startHeartbeat()
+            try:
+                cur.execute(query)
+            except:
+                p.finish(state='failed')
+                raise
+            p.processed = progress.estimateRows(tablename) or 0
+            p.finish()
         else:
             logger.info('Table %s exists already! Do nothing'%tablename)
     except:
@@ -71,11 +79,15 @@ def createIndex(query,tablename):
     :arg tablename: str, name of the table
     :arg query: str, query to execute
     """
+    p = progress.Progress('Indexing %s'%tablename,unit='indexes')
+    p.startHeartbeat()
     try:  
         cur = sql.getCursor()          
         cur.execute(query)
-        logger.info("Created indexes on %s"%tablename)
+        p.processed = 1
+        p.finish()
     except:
+        p.finish(state='failed')
         logger.warning("Could not create index on %s. Possibly it already exists"%tablename)
 
 def executeCommand(command,comment):
@@ -121,10 +133,14 @@ def process():
     createIndex(INDEX_REV_LEN_CHANGED,REV_LEN_CHANGED)
 
     createTable(CREATE_EDITOR_YEAR_MONTH,EDITOR_YEAR_MONTH)
+    createIndex(INDEX_EDITOR_YEAR_MONTH,EDITOR_YEAR_MONTH)
     createTable(CREATE_EDITOR_YEAR_MONTH_NAMESPACE,EDITOR_YEAR_MONTH_NAMESPACE)
+    createIndex(INDEX_EDITOR_YEAR_MONTH_NAMESPACE,EDITOR_YEAR_MONTH_NAMESPACE)
 
-    # not creating the 'day' table, it can be used for time series analysis, it is not useful for cohort visualizations.
-    # createTable(CREATE_EDITOR_YEAR_MONTH_DAY_NAMESPACE,EDITOR_YEAR_MONTH_DAY_NAMESPACE)
+    # the 'day' table is only used by the day resolution age cohorts
+    if settings.daytable:
+        createTable(CREATE_EDITOR_YEAR_MONTH_DAY_NAMESPACE,EDITOR_YEAR_MONTH_DAY_NAMESPACE)
+        createIndex(INDEX_EDITOR_YEAR_MONTH_DAY_NAMESPACE,EDITOR_YEAR_MONTH_DAY_NAMESPACE)
 
     createTable(CREATE_TIME_YEAR_MONTH_NAMESPACE,TIME_YEAR_MONTH_NAMESPACE)
 
@@ -138,6 +154,9 @@ def process():
     
     executeCommand(EXPORT_BOT_LIST,'Exporting bot list for cohort analysis')
 
+    # user group membership of the editors, used by the role based cohorts
+    roles.buildRoleIndex()
+
 
 
 
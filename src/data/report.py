@@ -1,8 +1,7 @@
 """This module defines the content of a report, which consists of the following at the moment. 
 
 * Community roles
-    * User  
-    * Administrators
+    * Activity of administrators, bureaucrats, rollbackers and other users
 * Cohort trends
     * Age Cohorts            
         * More than 1 edit 
@@ -61,6 +60,11 @@ class ReportItem():
         for varName in self.cohort.data_description.keys():  
             self.cohort.loadDataFromDisk(varName=varName,destination=os.path.join(REPORTDATA,self.relDest))
 
+    def loadSavedData(self):
+        '''Returns the previously saved data of the cohort without modifying it, see :meth:`.Cohort.loadSavedData`
+        '''
+        return self.cohort.loadSavedData(destination=os.path.join(REPORTDATA,self.relDest))
+
     def freeData(self):
         '''Frees the data in hope of reducing the memory usage of the process.        
         '''  
@@ -71,10 +75,22 @@ class ReportItem():
 
 
     def generateData(self):
-        '''Generates and saves the cohort data. Calls the :meth:`.aggregateDataFromSQL` method from the :class:`.Cohort` instance passed as argument. The collected data matrices are stored in the :attr:`.Cohort.data` attribute. The data matrices are saved as txt files in the data destination directory.'''
-        
-        self.cohort.aggregateDataFromSQL(verbose=True)   
-        
+        '''Generates and saves the cohort data. Calls the :meth:`.aggregateDataFromSQL` method from the :class:`.Cohort` instance passed as argument, unless the data is in the result cache (see :mod:`data.cache`). The collected data matrices are stored in the :attr:`.Cohort.data` attribute. The data matrices are saved as binary files in the data destination directory, see :mod:`cohorts.store`.'''
+        from data import cache
+
+        resultCache = cache.getCache()
+        (key,parameters) = cache.getKey(self.cohort) if resultCache else (None,None)
+
+        if resultCache is None or not resultCache.get(key,self.cohort):
+            self.cohort.aggregateDataFromSQL(verbose=True)
+            if resultCache is not None:
+                resultCache.put(key,self.cohort,parameters)
+
+        self.saveData()
+
+    def saveData(self):
+        '''Saves the aggregated cohort data as binary files in the data destination directory and frees the memory.'''
+
         dest = self.createDirectory(base=REPORTDATA)
         self.cohort.saveDataToDisk(destination=dest)
 
@@ -82,16 +98,46 @@ class ReportItem():
         self.freeData()
 
 
-    def generateCSV(self):
-        '''Stores a simple csv file in a format used by the javascript `dygraphs <http://dygraphs.com/>`_ library.    
+    def generateCSV(self,compress=False):
+        '''Stores a simple csv file in a format used by the javascript `dygraphs <http://dygraphs.com/>`_ library, and the manifest of the files of the report item.
+
+        :arg compress: bool, if True, gzip compressed copies of the csv files are saved as well, see :meth:`.Cohort.saveDataToCSV`
         '''
         
         self.loadData()
 
         dest = self.createDirectory(base=REPORTCSV)
 
-        self.cohort.saveDataToCSV(destination=dest)
+        self.cohort.saveDataToCSV(destination=dest,compress=compress)
+
+        self.freeData()
+
+
+    def generatePayload(self,compress=False):
+        '''Saves the data of all variables of the report item to one compact payload file, from which the report pages render the charts (see :mod:`data.payload`).
+
+        :arg compress: bool, if True, a gzip compressed copy of the payload is saved as well
+        '''
+        from data import payload
+
+        self.loadData()
+
+        dest = self.createDirectory(base=REPORTPAYLOAD)
+
+        payload.savePayload(os.path.join(dest,'%s%s'%(self.cohort.__class__.__name__,payload.PAYLOAD_EXTENSION)),self.cohort,compress=compress)
+
+        self.freeData()
+
+    def saveToWarehouse(self,warehouse):
+        '''Adds the saved data of the report item to the cohort warehouse, under the language of the settings and the relative destination of the item (see :mod:`data.warehouse`)
+
+        :arg warehouse: :class:`data.warehouse.Warehouse`
+        '''
+        self.loadData()
+
+        warehouse.put(settings.language,self.relDest,self.cohort)
 
+        self.freeData()
 
     def generateVisualizations(self,varNames, **kargs):
         '''For the variables names in `varNames`, produces the WikiPride graphs using :meth:`.wikiPride` (e.g. `added`, `editors`, ...). If the cohort defines `linePlots`, they are also generated.
@@ -112,6 +158,94 @@ class ReportItem():
         self.freeData()
 
 
+def generateSharedData(items,refresh=False):
+    '''Generates and saves the data of several report items. Report items whose cohorts use the same SQL query are aggregated from a single scan of the result set (see :func:`cohorts.base.aggregateCohortsFromSQL`), which avoids scanning the same large table once per cohort. If `settings.processes` is larger than one, the scan is split into `user_id` ranges that are aggregated in parallel (see :func:`cohorts.base.aggregateCohortsParallel`).
+
+    If `settings.usesnapshot` is True, the cohorts that support it are aggregated from the local snapshot of their table instead (see :func:`cohorts.base.aggregateCohortsFromSnapshot`). These cohorts are aggregated from scratch, they are not refreshed from the MySQL server.
+
+    Otherwise, if `settings.checkpointinterval` is set, the scan is checkpointed in `settings.datadirectory` and resumed after a failure (see :func:`cohorts.base.aggregateCohortsWithCheckpoints`).
+
+    :class:`.EditorActivity` histograms with different bins are aggregated together from one set of fine bins, see :class:`cohorts.histogram.ActivityHistograms`.
+
+    If `refresh` is True, the previously saved data is loaded and only the rows of the last saved month and the following months are aggregated (see :meth:`cohorts.base.Cohort.getRefreshStart`). Groups whose data can't be refreshed are aggregated from scratch.
+
+    The items whose data is in the result cache (see :mod:`data.cache`) are not aggregated, the aggregated data of the other items is added to the cache. The data aggregated from a snapshot is cached under the manifest of the snapshot, see :func:`data.cache.getKey`.
+
+    :arg items: list of :class:`.ReportItem`
+    :arg refresh: bool, refresh the saved data incrementally
+    '''
+    from collections import OrderedDict
+    from cohorts.base import aggregateCohortsFromSQL,aggregateCohortsParallel,aggregateCohortsFromSnapshot
+    from cohorts.histogram import combineHistograms
+    from data import snapshot
+    from data import cache
+
+    resultCache = cache.getCache()
+
+    groups = OrderedDict()
+    for item in items:
+        groups.setdefault(item.cohort.sqlQuery,[]).append(item)
+
+    for sqlQuery,group in groups.items():
+        cohorts = [item.cohort for item in group]
+
+        fromSnapshot = settings.usesnapshot and cohorts[0].sqlTable is not None and all(c.sqlColumns is not None for c in cohorts) and snapshot.hasSnapshot(cohorts[0].sqlTable)
+
+        keys = {}
+        if resultCache is not None:
+            for item in list(group):
+                keys[item] = cache.getKey(item.cohort,source='snapshot' if fromSnapshot else 'sql')
+                if resultCache.get(keys[item][0],item.cohort):
+                    item.saveData()
+                    group.remove(item)
+            if not group:
+                continue
+            cohorts = [item.cohort for item in group]
+
+        logger.info('Aggregating data for %s'%', '.join(str(item.cohort) for item in group))
+
+        saved,start,conditions = None,None,None
+        if refresh and not fromSnapshot:
+            saved = [item.loadSavedData() for item in group]
+            starts = [item.cohort.getRefreshStart(data) for item,data in zip(group,saved)]
+            if None in starts:
+                logger.info('No saved data to refresh, aggregating from scratch')
+            else:
+                start = min(starts)
+                conditions = cohorts[0].getRefreshConditions(start)
+                logger.info('Refreshing the data from %s'%cohorts[0].time_stamps.getISOLabel(start))
+
+        # histograms with different bins are aggregated together
+        cohorts = combineHistograms(cohorts)
+
+        if conditions is not None:
+            if settings.processes > 1:
+                aggregateCohortsParallel(cohorts,settings.processes,verbose=True,conditions=conditions)
+            else:
+                aggregateCohortsFromSQL(cohorts,verbose=True,conditions=conditions)
+        elif fromSnapshot:
+            aggregateCohortsFromSnapshot(cohorts,verbose=True)
+        elif settings.processes > 1 and cohorts[0].sqlTable is not None:
+            aggregateCohortsParallel(cohorts,settings.processes,verbose=True)
+        elif settings.checkpointinterval and cohorts[0].sqlTable is not None:
+            checkpoint = os.path.join(settings.datadirectory,'%s.checkpoint'%cohorts[0].sqlTable.split('.')[-1])
+            aggregateCohortsFromSQL(cohorts,verbose=True,checkpoint=checkpoint,checkpointInterval=settings.checkpointinterval)
+        else:
+            aggregateCohortsFromSQL(cohorts,verbose=True)
+
+        for c in cohorts:
+            c.finalizeData()
+
+        if conditions is not None:
+            for item,data in zip(group,saved):
+                item.cohort.mergeData(data,start)
+
+        for item in group:
+            if resultCache is not None:
+                resultCache.put(keys[item][0],item.cohort,keys[item][1])
+            item.saveData()
+
+
 #hackz
 try:
 
@@ -121,6 +255,7 @@ try:
     REPORTGRAPHS = os.path.join(settings.reportdirectory,'graphs')
     REPORTLISTS = os.path.join(settings.reportdirectory,'lists')
     REPORTCSV = os.path.join(settings.reportdirectory,'csv')
+    REPORTPAYLOAD = os.path.join(settings.reportdirectory,'payload')
 
     #Relative path directory tree for the report
 
@@ -151,7 +286,9 @@ try:
     from cohorts import age
     from cohorts import histogram
     from cohorts import simple
+    from cohorts import community
 
+    communityRoles = ReportItem(cohort=community.CommunityRoles(), dest=COMMUNITY)
     absMore1 = ReportItem(cohort=age.AbsoluteAgeAllNamespaces(minedits = 1), dest=ABS_MORE1)
     absMore5 = ReportItem(cohort=age.AbsoluteAgeAllNamespaces(minedits = 5), dest=ABS_MORE5)
     absMore100 = ReportItem(cohort=age.AbsoluteAgeAllNamespaces(minedits = 100), dest=ABS_MORE100)
@@ -178,51 +315,82 @@ def processData():
     '''
     logger.info('Aggregating the cohort data for %swiki'%settings.language)
 
-    utils.setFilterBots(settings.filterbots,userlists.BOT_LIST_FILE)
+    utils.setFilterBots(settings.filterbots,userlists.BOT_LIST_FILE,userlists.BOT_LIST)
 
-    # aggregate and save cohort data
-    absMore1.generateData()
-    absMore5.generateData()
-    absMore100.generateData()
-    absLess100.generateData()
+    # aggregate and save cohort data, cohorts querying the same table share one scan
+    generateSharedData([
+        communityRoles,
+
+        absMore1,
+        absMore5,
+        absMore100,
+        absLess100,
     
-    relMore1.generateData()
-    relMore5.generateData()
-    relMore100.generateData()
-    relLess100.generateData()
+        relMore1,
+        relMore5,
+        relMore100,
+        relLess100,
 
-    editorActivity.generateData()
+        editorActivity,
 
-    nsCohort.generateData()
+        nsCohort,
     
-    newEditors.generateData()
+        newEditors
+    ],refresh=settings.refresh)
 
 
-def processCSV():
+def processCSV(compress=False):
     '''The aggregation of the cohort data requires that  :func:`data.preprocessing.process` has been executed and the data thus preprocessed. The :func:`data.cohortdata.processData` method will use the report definition in :mod:`.report` to create a directory structure that contains the data of the cohort defitintions described below. The data is stored in the form of `numpy` matrices.                
+
+    :arg compress: bool, if True, gzip compressed copies of the csv files are saved as well
     '''
     logger.info('Saving dygraph CSV data files for %swiki'%settings.language)
 
-    utils.setFilterBots(settings.filterbots,userlists.BOT_LIST_FILE)
+    utils.setFilterBots(settings.filterbots,userlists.BOT_LIST_FILE,userlists.BOT_LIST)
 
     # aggregate and save cohort data
-    absMore1.generateCSV()
-    absMore5.generateCSV()
-    absMore100.generateCSV()
-    absLess100.generateCSV()
+    communityRoles.generateCSV(compress=compress)
+
+    absMore1.generateCSV(compress=compress)
+    absMore5.generateCSV(compress=compress)
+    absMore100.generateCSV(compress=compress)
+    absLess100.generateCSV(compress=compress)
     
-    relMore1.generateCSV()
-    relMore5.generateCSV()
-    relMore100.generateCSV()
-    relLess100.generateCSV()
+    relMore1.generateCSV(compress=compress)
+    relMore5.generateCSV(compress=compress)
+    relMore100.generateCSV(compress=compress)
+    relLess100.generateCSV(compress=compress)
 
-    editorActivity.generateCSV()
+    editorActivity.generateCSV(compress=compress)
 
-    nsCohort.generateCSV()
+    nsCohort.generateCSV(compress=compress)
     
-    newEditors.generateCSV()
+    newEditors.generateCSV(compress=compress)
+
+
 
 
+def processPayload(compress=False):
+    '''Saves the compact payload files of the report items (see :mod:`data.payload`), which requires that :func:`data.report.processData` has been executed and the data thus aggregated. The report pages render the charts from the payloads, the images of :func:`processReport` are not needed.
+
+    :arg compress: bool, if True, gzip compressed copies of the payloads are saved as well
+    '''
+    logger.info('Saving the payload files for %swiki'%settings.language)
+
+    for item in [communityRoles,absMore1,absMore5,absMore100,absLess100,relMore1,relMore5,relMore100,relLess100,editorActivity,nsCohort,newEditors]:
+        item.generatePayload(compress=compress)
+
+
+def processWarehouse():
+    '''Adds the data of the report items to the cohort warehouse in `settings.warehousedirectory` (see :mod:`data.warehouse`), which requires that :func:`data.report.processData` has been executed and the data thus aggregated. Running it for several languages allows to compare the wikis.
+    '''
+    from data import warehouse
+
+    logger.info('Adding the data of %swiki to the warehouse %s'%(settings.language,settings.warehousedirectory))
+
+    w = warehouse.Warehouse(settings.warehousedirectory)
+    for item in [communityRoles,absMore1,absMore5,absMore100,absLess100,relMore1,relMore5,relMore100,relLess100,editorActivity,nsCohort,newEditors]:
+        item.saveToWarehouse(w)
 
 
 def processReport():
@@ -231,6 +399,8 @@ def processReport():
 
     stdVars = ['added','edits','editors']
 
+    communityRoles.generateVisualizations(varNames=stdVars)
+
     absMore1.generateVisualizations(varNames=stdVars)
     absMore5.generateVisualizations(varNames=stdVars)
     absMore100.generateVisualizations(varNames=stdVars)
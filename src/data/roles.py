@@ -0,0 +1,170 @@
+'''
+The user group (role) membership of the editors of a wiki, e.g. sysop, bureaucrat, bot or rollbacker. The index is built once per wiki from the `user_groups` table and cached on disk (see :func:`getRoleIndexFile`).
+
+Every user group is assigned a bit, the index stores the bitmask of the groups of each user who is member of at least one group. Looking up the roles of a chunk of editors is a single vectorized lookup, see :meth:`.RoleIndex.getMasks`.
+'''
+
+import os, errno
+import logging
+logger = logging.getLogger('Roles')
+
+import numpy as N
+
+import settings
+
+
+MAXROLES = 64
+'''Maximal number of user groups in the index (bits of the uint64 bitmasks)
+'''
+
+
+def getRoleIndexFile():
+    '''Returns the cache file of the role index. The path depends on the configuration and is resolved when the index is used.
+    '''
+    return os.path.join(settings.userlistdirectory or '','%swiki_roles.npz'%settings.language)
+
+
+class RoleIndex():
+    '''Maps user ids to the bitmasks of their user groups.
+
+    :arg roles: list of str, the user groups. Bit `i` of a mask is set if the user is member of `roles[i]`.
+    :arg user_ids: sorted numpy.array of the user ids that are member of a group
+    :arg masks: numpy.array of uint64, the bitmask of each user in `user_ids`
+    '''
+    def __init__(self,roles,user_ids,masks):
+
+        self.roles = list(roles)
+        '''The user groups, in the order of the bits'''
+
+        self.user_ids = N.asarray(user_ids,dtype=N.int64)
+        '''Sorted user ids'''
+
+        self.masks = N.asarray(masks,dtype=N.uint64)
+        '''Bitmasks of the users'''
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def getBit(self,role):
+        '''Returns the bitmask of a user group, or 0 if no user is member of the group
+
+        :arg role: str, user group, e.g. 'sysop'
+        '''
+        if role not in self.roles:
+            return N.uint64(0)
+        return N.uint64(1) << N.uint64(self.roles.index(role))
+
+    def getMasks(self,user_ids):
+        '''Returns the bitmasks of the users. Users that are not member of a group have the mask 0.
+
+        :arg user_ids: numpy.array of user ids
+        :returns: numpy.array of uint64
+        '''
+        user_ids = N.asarray(user_ids,dtype=N.int64)
+
+        if len(self.user_ids) == 0:
+            return N.zeros(len(user_ids),dtype=N.uint64)
+
+        pos = N.minimum(N.searchsorted(self.user_ids,user_ids),len(self.user_ids)-1)
+        return N.where(self.user_ids[pos] == user_ids, self.masks[pos], N.uint64(0))
+
+    def getMask(self,user_id):
+        '''Scalar version of :meth:`.getMasks`
+        '''
+        return self.getMasks(N.array([user_id]))[0]
+
+    def hasRole(self,user_ids,role):
+        '''Returns a boolean numpy.array which is True for the users that are member of the user group
+
+        :arg user_ids: numpy.array of user ids
+        :arg role: str, user group
+        '''
+        return (self.getMasks(user_ids) & self.getBit(role)) != 0
+
+    def getUsers(self,role):
+        '''Returns the set of the users that are member of the user group
+
+        :arg role: str, user group
+        '''
+        return set(int(u) for u in self.user_ids[(self.masks & self.getBit(role)) != 0])
+
+    def save(self,fn):
+        '''Saves the index to a `.npz` file. The file is replaced atomically.
+
+        :arg fn: str, file name
+        '''
+        tmp = '%s.%s.tmp'%(fn,os.getpid())
+        with open(tmp,'wb') as f:
+            N.savez(f,roles=N.array(self.roles),user_ids=self.user_ids,masks=self.masks)
+        os.rename(tmp,fn)
+
+    @staticmethod
+    def load(fn):
+        '''Loads an index saved by :meth:`.save`
+
+        :arg fn: str, file name
+        '''
+        f = N.load(fn)
+        return RoleIndex([str(r) for r in f['roles']],f['user_ids'],f['masks'])
+
+
+def buildRoleIndex(fn=None):
+    '''Builds the role index from the `user_groups` table of the wiki database and saves it to `fn`.
+
+    :arg fn: str, the cache file, by default :func:`getRoleIndexFile`
+    :returns: :class:`.RoleIndex`
+    '''
+    if fn is None:
+        fn = getRoleIndexFile()
+
+    from db import sql
+
+    logger.info('Building the role index of %swiki from %s.user_groups'%(settings.language,settings.sqlwikidb))
+
+    cur = sql.getCursor()
+    cur.execute('SELECT ug_user, ug_group FROM %s.user_groups;'%settings.sqlwikidb)
+    rows = cur.fetchall()
+    cur.close()
+
+    def decode(group):
+        return group.decode('utf-8') if isinstance(group,bytes) else group
+
+    roles = sorted(set(decode(g) for (u,g) in rows))
+    if len(roles) > MAXROLES:
+        logger.warning('%s user groups, only the first %s are indexed'%(len(roles),MAXROLES))
+        roles = roles[:MAXROLES]
+    bits = dict((r,N.uint64(1) << N.uint64(i)) for i,r in enumerate(roles))
+
+    masks = {}
+    for (u,g) in rows:
+        g = decode(g)
+        if g in bits:
+            masks[int(u)] = masks.get(int(u),N.uint64(0)) | bits[g]
+
+    user_ids = N.array(sorted(masks),dtype=N.int64)
+    index = RoleIndex(roles,user_ids,N.array([masks[u] for u in user_ids],dtype=N.uint64))
+
+    try:
+        os.makedirs(os.path.dirname(fn))
+    except OSError as exc:
+        if exc.errno == errno.EEXIST:
+            pass
+        else: raise
+
+    index.save(fn)
+    logger.info('%s users in %s user groups, saved to %s'%(len(index),len(roles),fn))
+
+    return index
+
+def loadRoleIndex(fn=None):
+    '''Returns the role index from the cache file, the index is built if it hasn't been cached yet.
+
+    :arg fn: str, the cache file, by default :func:`getRoleIndexFile`
+    :returns: :class:`.RoleIndex`
+    '''
+    if fn is None:
+        fn = getRoleIndexFile()
+
+    if os.path.isfile(fn):
+        return RoleIndex.load(fn)
+    return buildRoleIndex(fn)
@@ -0,0 +1,192 @@
+'''
+Exports the preprocessed SQL tables into a local columnar snapshot, so that the cohort data can be aggregated without querying the MySQL server (see :meth:`cohorts.base.Cohort.aggregateDataFromSnapshot`).
+
+Each table is stored in its own directory in `settings.snapshotdirectory`. Every numeric column is saved as a `.npy` file containing an int64 array (NULL values are stored as 0), which can be memory-mapped. The NULL values of the :data:`cohorts.base.NULLABLE_COLUMNS` are marked in an additional boolean column `<name>_null`. The `manifest.json` file lists the columns and the number of rows of the snapshot.
+'''
+
+import os, errno
+import json
+import time
+import logging
+logger = logging.getLogger('Snapshot')
+
+import numpy as N
+
+import settings
+import progress
+
+from data.tables import *
+from db import sql
+
+
+SNAPSHOT_TABLES = [EDITOR_YEAR_MONTH,EDITOR_YEAR_MONTH_NAMESPACE]
+'''The tables exported by :func:`process`
+'''
+
+MANIFEST = 'manifest.json'
+'''Name of the manifest file of a snapshot
+'''
+
+NUMERIC_TYPES = ['tinyint','smallint','mediumint','int','bigint','decimal']
+'''MySQL data types of the columns that are exported
+'''
+
+
+def getSnapshotDirectory(tablename):
+    """Returns the directory of the snapshot of a table
+
+    :arg tablename: str, name of the table (including the database, e.g. `u_declerambaul.dewiki_editor_centric_year_month`)
+    """
+    return os.path.join(settings.snapshotdirectory,tablename.split('.')[-1])
+
+def hasSnapshot(tablename):
+    """Returns True if a complete snapshot of the table exists
+
+    :arg tablename: str, name of the table
+    """
+    return os.path.isfile(os.path.join(getSnapshotDirectory(tablename),MANIFEST))
+
+def getManifest(tablename):
+    """Returns the manifest of the snapshot of a table
+
+    :arg tablename: str, name of the table
+    :returns: dict, see :func:`exportTable`
+    """
+    dest = getSnapshotDirectory(tablename)
+
+    if not hasSnapshot(tablename):
+        raise Exception('No snapshot of %s in %s. Run the snapshot workstep first!'%(tablename,dest))
+
+    with open(os.path.join(dest,MANIFEST)) as f:
+        return json.load(f)
+
+def getNumericColumns(tablename):
+    """Returns the names of the numeric columns of a table, in the order of the table definition
+
+    :arg tablename: str, name of the table
+    """
+    (db,table) = tablename.split('.')
+
+    cur = sql.getCursor()
+    cur.execute("SELECT COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS WHERE TABLE_SCHEMA='%s' AND TABLE_NAME='%s' ORDER BY ORDINAL_POSITION;"%(db,table))
+    columns = [name for (name,datatype) in cur.fetchall() if datatype.lower() in NUMERIC_TYPES]
+    cur.close()
+
+    return columns
+
+def exportTable(tablename,batchsize=100000):
+    """Exports a SQL table into a columnar snapshot. The rows are streamed from the server and written into memory-mapped `.npy` files, the manifest is written last.
+
+    :arg tablename: str, name of the table
+    :arg batchsize: int, number of rows fetched at once
+    """
+    from cohorts.base import rowsToColumns,NULLABLE_COLUMNS
+
+    dest = getSnapshotDirectory(tablename)
+    try:
+        os.makedirs(dest)
+    except OSError as exc:
+        if exc.errno == errno.EEXIST:
+            pass
+        else: raise
+
+    # an incomplete snapshot must not be used
+    manifest = os.path.join(dest,MANIFEST)
+    if os.path.isfile(manifest):
+        os.remove(manifest)
+
+    columns = getNumericColumns(tablename)
+
+    cur = sql.getCursor()
+    cur.execute('SELECT COUNT(*) FROM %s;'%tablename)
+    nrows = int(cur.fetchone()[0])
+    cur.close()
+
+    logger.info('Exporting %s rows and %s columns of %s to %s'%(nrows,len(columns),tablename,dest))
+
+    nulls = ['%s_null'%c for c in columns if c in NULLABLE_COLUMNS]
+
+    arrays = {}
+    for c in columns:
+        arrays[c] = N.lib.format.open_memmap(os.path.join(dest,'%s.npy'%c), mode='w+', dtype=N.int64, shape=(nrows,))
+    for c in nulls:
+        arrays[c] = N.lib.format.open_memmap(os.path.join(dest,'%s.npy'%c), mode='w+', dtype=bool, shape=(nrows,))
+
+    cur = sql.getSSCursor()
+    cur.execute('SELECT %s FROM %s;'%(', '.join(columns),tablename))
+
+    p = progress.Progress('Snapshot of %s'%tablename,total=nrows)
+
+    start = 0
+    while True:
+        rows = cur.fetchmany(batchsize)
+        if not rows:
+            break
+
+        if start+len(rows) > nrows:
+            raise Exception('The table %s has changed during the export!'%tablename)
+
+        cols = rowsToColumns(rows,columns,positional=True)
+        for c in arrays:
+            arrays[c][start:start+len(rows)] = cols[c]
+
+        start += len(rows)
+        p.update(len(rows))
+
+    cur.close()
+    p.finish()
+
+    if start != nrows:
+        raise Exception('The table %s has changed during the export!'%tablename)
+
+    for c in arrays:
+        arrays[c].flush()
+    del arrays
+
+    with open(manifest,'w') as f:
+        json.dump({ 'table' : tablename,
+                    'rows' : nrows,
+                    'columns' : columns,
+                    'nulls' : nulls,
+                    'dtype' : 'int64',
+                    'created' : time.strftime('%Y-%m-%d %H:%M:%S') }, f, indent=2)
+
+    logger.info('Finished exporting %s'%tablename)
+
+def loadSnapshot(tablename,columns=None):
+    """Loads the snapshot of a table. The columns are memory-mapped, they are only read from disk when they are accessed.
+
+    :arg tablename: str, name of the table
+    :arg columns: list of str, the columns to load. If None, all columns are loaded. The NULL marks of the columns are loaded as well, if the snapshot has them.
+    :returns: (int, dict), the number of rows and {column name : numpy.memmap}
+    """
+    dest = getSnapshotDirectory(tablename)
+    manifest = getManifest(tablename)
+
+    if columns is None:
+        columns = manifest['columns']
+
+    missing = [c for c in columns if c not in manifest['columns']]
+    if missing:
+        raise Exception('The snapshot of %s lacks the columns %s'%(tablename,', '.join(missing)))
+
+    cols = {}
+    for c in columns:
+        cols[c] = N.load(os.path.join(dest,'%s.npy'%c), mmap_mode='r')
+
+    if 'nulls' not in manifest:
+        logger.warning('The snapshot of %s has no NULL marks, NULL values are read as 0. Run the snapshot workstep again!'%tablename)
+    for c in manifest.get('nulls',[]):
+        if c[:-len('_null')] in columns:
+            cols[c] = N.load(os.path.join(dest,'%s.npy'%c), mmap_mode='r')
+
+    return (manifest['rows'],cols)
+
+
+def process():
+    """Exports the tables in :data:`SNAPSHOT_TABLES` into local snapshots (prerequisite: preprocessing workstep). Existing snapshots are overwritten.
+    """
+    logger.info('Creating snapshot of the preprocessed tables of %swiki in %s'%(settings.language,settings.snapshotdirectory))
+
+    for tablename in SNAPSHOT_TABLES:
+        exportTable(tablename)
@@ -2,6 +2,7 @@
 """
 
 import settings
+import utils
 
 
 CREATE_USER_DATABASE = 'CREATE DATABASE IF NOT EXISTS %s;'%settings.sqluserdb
@@ -14,6 +15,22 @@ EDITOR_YEAR_MONTH_NS0_NOREDIRECT = "%s.%swiki_editor_centric_year_month_ns0_nore
 EDITOR_YEAR_MONTH_DAY_NAMESPACE = "%s.%swiki_editor_centric_year_month_day_namespace"%(settings.sqluserdb,settings.language)
 TIME_YEAR_MONTH_NAMESPACE ="%s.%swiki_time_centric_year_month_namespace"%(settings.sqluserdb,settings.language)
 TIME_YEAR_MONTH_DAY_NAMESPACE = "%s.%swiki_time_centric_year_month_day_namespace"%(settings.sqluserdb,settings.language)
+REVERT_YEAR_MONTH = "%s.%swiki_%%s_editor_year_month"%(settings.sqluserdb,settings.language)
+HUGGLE = "%s.%swiki_huggle"%(settings.sqluserdb,settings.language)
+
+EDITS = "(IFNULL(add_edits,0)+IFNULL(remove_edits,0)+IFNULL(noop_edits,0))"
+"""SQL expression for the total number of edits of a row in the editor centric tables.
+"""
+
+EDITOR_AGGREGATES = [
+    ('editors', 'COUNT(*)'),
+    ('added', 'SUM(IFNULL(len_added,0))'),
+    ('removed', '-SUM(IFNULL(len_removed,0))'),
+    ('net', 'SUM(IFNULL(len_added+len_removed,0))'),
+    ('edits', 'SUM(%s)'%EDITS)
+    ]
+"""The aggregates collected by most cohorts on the editor centric tables as (variable name, SQL expression). Used to build pushdown queries, see :meth:`cohorts.base.Cohort.buildPushdownQuery`.
+"""
 
 
 CREATE_USER_COHORTS = """
@@ -25,6 +42,7 @@ SELECT /* SLOW_OK */
     MIN(first_edit)         AS first_edit,
     YEAR(MIN(first_edit))   AS first_edit_year,
     MONTH(MIN(first_edit))  AS first_edit_month,
+    (YEAR(MIN(first_edit))-%s)*12+MONTH(MIN(first_edit))-1 AS first_edit_month_idx,
     MAX(first_edit)         AS last_edit
 FROM
 (
@@ -53,7 +71,7 @@ INNER JOIN %s.user u
 GROUP BY user_id
 ) AS whocares_doesntmatter
 GROUP BY user_id, user_name;
-"""%(USER_COHORT,settings.sqlwikidb,settings.sqlwikidb,settings.sqlwikidb,settings.sqlwikidb)
+"""%(USER_COHORT,utils.EPOCH_YEAR,settings.sqlwikidb,settings.sqlwikidb,settings.sqlwikidb,settings.sqlwikidb)
 """Query to create an augmented user table. Includes time stamp for first edit of user, also considering archived revisions. A detailed description is available `here <http://meta.wikimedia.org/wiki/WSoR_datasets/user_cohort>`_.
 """
 
@@ -99,9 +117,11 @@ SELECT /* SLOW_OK */
     rlc.user_id,
     rlc.rev_year,
     rlc.rev_month,
+    (rlc.rev_year-%s)*12+rlc.rev_month-1  AS rev_month_idx,
     uc.first_edit,
     uc.first_edit_year,
     uc.first_edit_month,
+    uc.first_edit_month_idx,
     SUM(len_change = 0)                    AS noop_edits,
     SUM(len_change > 0)                    AS add_edits,
     SUM(len_change < 0)                    AS remove_edits,
@@ -113,8 +133,14 @@ GROUP BY
     rlc.user_id,
     rlc.rev_year,
     rlc.rev_month;
-"""%(EDITOR_YEAR_MONTH,REV_LEN_CHANGED,USER_COHORT)
-"""Query to editor centric table. For each user and each year/month, it contains the number of add/remove edits as well as number bytes added/removed.
+"""%(EDITOR_YEAR_MONTH,utils.EPOCH_YEAR,REV_LEN_CHANGED,USER_COHORT)
+"""Query to editor centric table. For each user and each year/month, it contains the number of add/remove edits as well as number bytes added/removed. The year/months of the edits and of the first edit are also stored as integer month indexes (`rev_month_idx`, `first_edit_month_idx`, see :func:`utils.monthIndex`).
+"""
+
+INDEX_EDITOR_YEAR_MONTH="""
+CREATE INDEX /* SLOW_OK */ user_month on %s (user_id,rev_month_idx);
+"""%EDITOR_YEAR_MONTH
+"""Index used to scan the editor centric table in pages ordered by editor, see :func:`cohorts.base.aggregateCohortsWithCheckpoints`
 """
 
 
@@ -125,9 +151,11 @@ SELECT /* SLOW_OK */
     rlc.namespace,
     rlc.rev_year,
     rlc.rev_month,
+    (rlc.rev_year-%s)*12+rlc.rev_month-1  AS rev_month_idx,
     uc.first_edit,
     uc.first_edit_year,
     uc.first_edit_month,
+    uc.first_edit_month_idx,
     SUM(len_change = 0)                    AS noop_edits,
     SUM(len_change > 0)                    AS add_edits,
     SUM(len_change < 0)                    AS remove_edits,
@@ -140,10 +168,14 @@ GROUP BY
     rlc.rev_year,
     rlc.rev_month,
     rlc.namespace;
-"""%(EDITOR_YEAR_MONTH_NAMESPACE,REV_LEN_CHANGED,USER_COHORT)
+"""%(EDITOR_YEAR_MONTH_NAMESPACE,utils.EPOCH_YEAR,REV_LEN_CHANGED,USER_COHORT)
 """Query to editor centric table. Same as `EDITOR_YEAR_MONTH` but including namespace. For each user and each year/month/namespace, it contains the number of add/remove edits as well as number bytes added/removed.
 """
 
+INDEX_EDITOR_YEAR_MONTH_NAMESPACE="""
+CREATE INDEX /* SLOW_OK */ user_month on %s (user_id,rev_month_idx);
+"""%EDITOR_YEAR_MONTH_NAMESPACE
+
 # CREATE_EDITOR_YEAR_MONTH_NS0_NOREDIRECT = """
 # CREATE TABLE IF NOT EXISTS %s
 # SELECT /* SLOW_OK */
@@ -177,6 +209,7 @@ SELECT /* SLOW_OK */
     rlc.user_id,    
     rlc.rev_year,
     rlc.rev_month,
+    (rlc.rev_year-%s)*12+rlc.rev_month-1  AS rev_month_idx,
     SUM(len_change = 0)                    AS noop_edits,
     SUM(len_change > 0)                    AS add_edits,
     SUM(len_change < 0)                    AS remove_edits,
@@ -192,7 +225,7 @@ GROUP BY
     rlc.user_id,
     rlc.rev_year,
     rlc.rev_month;
-"""%(EDITOR_YEAR_MONTH_NS0_NOREDIRECT,REV_LEN_CHANGED,settings.sqlwikidb)
+"""%(EDITOR_YEAR_MONTH_NS0_NOREDIRECT,utils.EPOCH_YEAR,REV_LEN_CHANGED,settings.sqlwikidb)
 """Query to editor centric table. Same as `EDITOR_YEAR_MONTH` but including only for namespace 0 (main) and only for pages that are no redirects. For each user and each year/month, it contains the number of add/remove edits as well as number bytes added/removed.
 """
 
@@ -204,9 +237,11 @@ SELECT /* SLOW_OK */
     rlc.rev_year,
     rlc.rev_month,
     rlc.rev_day,
+    DATEDIFF(DATE(MIN(rlc.rev_timestamp)),'%s-01-01') AS rev_day_idx,
     uc.first_edit,
     uc.first_edit_year,
     uc.first_edit_month,
+    DATEDIFF(DATE(uc.first_edit),'%s-01-01')         AS first_edit_day_idx,
     SUM(len_change = 0)                    AS noop_edits,
     SUM(len_change > 0)                    AS add_edits,
     SUM(len_change < 0)                    AS remove_edits,
@@ -220,7 +255,13 @@ GROUP BY
     rlc.rev_month,
     rlc.rev_day,
     rlc.namespace;
-"""%(EDITOR_YEAR_MONTH_DAY_NAMESPACE,REV_LEN_CHANGED,USER_COHORT)
+"""%(EDITOR_YEAR_MONTH_DAY_NAMESPACE,utils.EPOCH_YEAR,utils.EPOCH_YEAR,REV_LEN_CHANGED,USER_COHORT)
+"""Query to editor centric table. Same as `EDITOR_YEAR_MONTH_NAMESPACE` but for each day. The days of the edits and of the first edit are also stored as integer day indexes (`rev_day_idx`, `first_edit_day_idx`, see :func:`utils.dayIndex`).
+"""
+
+INDEX_EDITOR_YEAR_MONTH_DAY_NAMESPACE="""
+CREATE INDEX /* SLOW_OK */ user_day on %s (user_id,rev_day_idx);
+"""%EDITOR_YEAR_MONTH_DAY_NAMESPACE
 
 CREATE_TIME_YEAR_MONTH_NAMESPACE = """
 CREATE TABLE %s
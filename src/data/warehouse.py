@@ -0,0 +1,268 @@
+'''
+The cohort warehouse stores the data matrices of the report items of several wikis in one directory tree (`settings.warehousedirectory`), indexed by language, cohort and variable. The cohorts are identified by the relative destination of their report item (e.g. :data:`data.report.REL_MORE1`). The matrices are saved in the binary format of :mod:`cohorts.store`, their sidecars hold the time axis and the cohort labels.
+
+The wikis are compared on stacks of matrices aligned on a common time axis and on the union of the cohort labels (see :meth:`.Warehouse.stack`), e.g. the share of the edits by the editors under 6 months old, for all wikis from 2004 to 2012::
+
+    w = Warehouse(settings.warehousedirectory)
+    s = w.stack(report.REL_MORE1,'edits').select(start='200401',end='201212')
+    share = s.share(range(6))
+
+`share` is a (languages x months) numpy.array, the languages are listed in `s.languages`.
+'''
+
+import os, errno
+import logging
+logger = logging.getLogger('Warehouse')
+
+import numpy as N
+
+import timeaxis
+
+from cohorts import store
+
+
+class CohortStack():
+    '''The matrices of a cohort variable of several wikis, stacked in a (languages x cohorts x time units) numpy.array. The cells of a wiki outside of its own time axis or cohorts are zero.
+
+    :arg data: 3d numpy.array
+    :arg languages: list of str, the languages of the first axis
+    :arg cohort_labels: list of str, the labels of the cohorts of the second axis
+    :arg time_stamps: :class:`timeaxis.TimeAxis` of the third axis
+    '''
+    def __init__(self,data,languages,cohort_labels,time_stamps):
+
+        self.data = data
+        '''The stacked matrices'''
+
+        self.languages = list(languages)
+        '''The languages of the wikis'''
+
+        self.cohort_labels = list(cohort_labels)
+        '''The cohort labels'''
+
+        self.time_stamps = time_stamps
+        '''The common time axis'''
+
+    def __repr__(self):
+        return 'CohortStack(%s languages, %s cohorts, %r)'%(len(self.languages),len(self.cohort_labels),self.time_stamps)
+
+    def getLanguage(self,language):
+        '''Returns the (cohorts x time units) matrix of a wiki
+
+        :arg language: str
+        '''
+        return self.data[self.languages.index(language)]
+
+    def getCohortIndex(self,cohorts):
+        '''Returns the indexes of cohorts
+
+        :arg cohorts: list of cohort labels or indexes, or a slice
+        :returns: numpy.array of int
+        '''
+        if isinstance(cohorts,slice):
+            return N.arange(len(self.cohort_labels))[cohorts]
+        return N.array([c if isinstance(c,(int,N.integer)) else self.cohort_labels.index(c) for c in cohorts],dtype=N.int64)
+
+    def select(self,languages=None,start=None,end=None):
+        '''Returns the stack of a subset of the wikis and of the time units
+
+        :arg languages: list of str. If None, all languages are selected.
+        :arg start: str, first time unit, 'yyyymm' or 'yyyymmdd' format. If None, the stack starts with the first time unit.
+        :arg end: str, last time unit, 'yyyymm' or 'yyyymmdd' format. If None, the stack ends with the last time unit.
+        :returns: :class:`.CohortStack`
+        '''
+        first = 0
+        if start is not None:
+            first = min(max(self.time_stamps.getUnit(*timeaxis.parseTimeStamp(start)) - self.time_stamps.first,0),len(self.time_stamps))
+        last = len(self.time_stamps)
+        if end is not None:
+            last = min(max(self.time_stamps.getUnit(*timeaxis.parseTimeStamp(end)) - self.time_stamps.first + 1,first),len(self.time_stamps))
+
+        languages = self.languages if languages is None else list(languages)
+        index = [self.languages.index(l) for l in languages]
+
+        axis = timeaxis.TimeAxis.fromUnits(self.time_stamps.first+first,last-first,self.time_stamps.granularity)
+        return CohortStack(self.data[index][:,:,first:last],languages,self.cohort_labels,axis)
+
+    def resample(self,granularity,how='sum'):
+        '''Returns the stack resampled to a coarser time axis, see :meth:`cohorts.base.Cohort.resampleTime`
+
+        :arg granularity: str, a coarser granularity, see :data:`timeaxis.RESAMPLING`
+        :arg how: str, 'sum', 'mean', 'max' or 'last'
+        :returns: :class:`.CohortStack`
+        '''
+        from cohorts.base import resampleColumns
+
+        (axis,index) = self.time_stamps.resample(granularity)
+        starts = N.flatnonzero(N.diff(N.concatenate(([-1],index))))
+        counts = N.diff(N.concatenate((starts,[len(index)])))
+
+        (L,C,T) = self.data.shape
+        data = resampleColumns(self.data.reshape((L*C,T)),starts,counts,how).reshape((L,C,len(axis)))
+        return CohortStack(data,self.languages,self.cohort_labels,axis)
+
+    def total(self):
+        '''Returns the sum over all cohorts, a (languages x time units) numpy.array
+        '''
+        return self.data.sum(axis=1)
+
+    def sum(self,cohorts):
+        '''Returns the sum over a subset of the cohorts, a (languages x time units) numpy.array
+
+        :arg cohorts: list of cohort labels or indexes, or a slice
+        '''
+        return self.data[:,self.getCohortIndex(cohorts),:].sum(axis=1)
+
+    def share(self,cohorts):
+        '''Returns the share of a subset of the cohorts in the total, a (languages x time units) numpy.array. The share is 0 for the time units without data.
+
+        :arg cohorts: list of cohort labels or indexes, or a slice
+        '''
+        total = self.total()
+        part = self.sum(cohorts)
+        return N.where(total != 0,part/N.where(total != 0,total,1),0.)
+
+
+class Warehouse():
+    '''The directory tree `directory/<language>/<cohort>/<variable>.npy` of the cohort data of several wikis
+
+    :arg directory: str, the warehouse directory
+    '''
+    def __init__(self,directory):
+
+        self.directory = directory
+        '''The warehouse directory'''
+
+    def getPath(self,language,cohort,variable=None):
+        '''Returns the directory of a cohort, or the file name (without extension) of a variable
+
+        :arg language: str
+        :arg cohort: str, cohort name, e.g. the destination of a report item
+        :arg variable: str, variable name
+        '''
+        path = os.path.join(self.directory,language,cohort)
+        if variable is None:
+            return path
+        return os.path.join(path,variable)
+
+    def put(self,language,cohort,instance):
+        '''Saves the data of a :class:`cohorts.base.Cohort` instance to the warehouse, replacing the previously saved data of its variables
+
+        :arg language: str
+        :arg cohort: str, cohort name
+        :arg instance: :class:`cohorts.base.Cohort`
+        '''
+        path = self.getPath(language,cohort)
+        try:
+            os.makedirs(path)
+        except OSError as exc:
+            if exc.errno == errno.EEXIST:
+                pass
+            else: raise
+
+        for varName,data in instance.data.items():
+            store.saveData(self.getPath(language,cohort,varName),data,instance.getStoreMetadata(varName))
+
+    def load(self,language,cohort,variable,mmap=True):
+        '''Loads a matrix, see :func:`cohorts.store.loadData`
+
+        :returns: tuple, (matrix, sidecar)
+        '''
+        return store.loadData(self.getPath(language,cohort,variable),mmap)
+
+    def getLanguages(self,cohort=None,variable=None):
+        '''Returns the languages in the warehouse, optionally only the ones that have the data of a cohort variable
+
+        :arg cohort: str, cohort name
+        :arg variable: str, variable name
+        :returns: sorted list of str
+        '''
+        if not os.path.isdir(self.directory):
+            return []
+
+        languages = sorted(l for l in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory,l)))
+        if cohort is None:
+            return languages
+        if variable is None:
+            return [l for l in languages if os.path.isdir(self.getPath(l,cohort))]
+        return [l for l in languages if os.path.isfile(self.getPath(l,cohort,variable)+store.SIDECAR_EXTENSION)]
+
+    def getCohorts(self,language):
+        '''Returns the names of the cohorts of a language
+
+        :returns: sorted list of str
+        '''
+        root = os.path.join(self.directory,language)
+        cohorts = []
+        for (path,dirs,files) in os.walk(root):
+            if any(fn.endswith(store.SIDECAR_EXTENSION) for fn in files):
+                cohorts.append(os.path.relpath(path,root))
+        return sorted(cohorts)
+
+    def getVariables(self,language,cohort):
+        '''Returns the variables of a cohort of a language
+
+        :returns: sorted list of str
+        '''
+        path = self.getPath(language,cohort)
+        return sorted(fn[:-len(store.SIDECAR_EXTENSION)] for fn in os.listdir(path) if fn.endswith(store.SIDECAR_EXTENSION))
+
+    def stack(self,cohort,variable,languages=None,granularity=None,how='sum'):
+        '''Returns the matrices of a cohort variable of several wikis, aligned on a common time axis spanning the axes of all wikis, and on the union of their cohort labels.
+
+        :arg cohort: str, cohort name
+        :arg variable: str, variable name
+        :arg languages: list of str. If None, all languages having the variable are stacked.
+        :arg granularity: str, the granularity of the common time axis. If None, the coarsest granularity of the wikis is used. The finer axes are resampled, see :meth:`timeaxis.TimeAxis.resample`.
+        :arg how: str, the resampling of the finer axes, see :meth:`.CohortStack.resample`
+        :returns: :class:`.CohortStack`
+        '''
+        if languages is None:
+            languages = self.getLanguages(cohort,variable)
+        if not languages:
+            raise ValueError('No data of %s %s in %s'%(cohort,variable,self.directory))
+
+        stacks = []
+        for language in languages:
+            (data,sidecar) = self.load(language,cohort,variable)
+            if sidecar is None:
+                raise ValueError('No time axis saved for %s %s %s'%(language,cohort,variable))
+            axis = timeaxis.TimeAxis.fromDict(sidecar['time_stamps'])
+            stacks.append(CohortStack(N.asarray(data,dtype=N.float64)[None],[language],sidecar['cohort_labels'],axis))
+
+        if granularity is None:
+            granularity = max((s.time_stamps.granularity for s in stacks),key=timeaxis.GRANULARITIES.index)
+        stacks = [s.resample(granularity,how) for s in stacks]
+
+        first = min(s.time_stamps.first for s in stacks)
+        last = max(s.time_stamps.first+len(s.time_stamps) for s in stacks)
+        axis = timeaxis.TimeAxis.fromUnits(first,last-first,granularity)
+
+        labels = mergeLabels([s.cohort_labels for s in stacks])
+        position = dict((l,i) for i,l in enumerate(labels))
+
+        data = N.zeros((len(stacks),len(labels),len(axis)))
+        for i,s in enumerate(stacks):
+            rows = N.array([position[l] for l in s.cohort_labels],dtype=N.int64)
+            start = s.time_stamps.first - first
+            data[i,rows,start:start+len(s.time_stamps)] = s.data[0]
+
+        return CohortStack(data,languages,labels,axis)
+
+
+def mergeLabels(lists):
+    '''Returns the union of lists of labels. The order of the labels of each list is kept, a label that is not in the union yet is inserted after the preceding label of its list.
+
+    :arg lists: list of lists of str
+    :returns: list of str
+    '''
+    merged = []
+    for labels in lists:
+        pos = 0
+        for l in labels:
+            if l in merged:
+                pos = merged.index(l)+1
+            else:
+                merged.insert(pos,l)
+                pos += 1
+    return merged
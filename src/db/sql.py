@@ -8,8 +8,11 @@ import logging
 
 try:
     import MySQLdb,MySQLdb.cursors
+    Error = MySQLdb.Error
 except:
     logging.error("SQL module MySQLdb could not be imported.")    
+    # without the module connect() fails with a NameError
+    Error = NameError
 
 
 db = None
@@ -27,6 +30,16 @@ def connect():
 
 
 
+def close():
+    """
+    Closes the MySQL connection. A new connection is opened by the next cursor request
+    """
+    global db
+    if db is not None:
+        db.close()
+        db = None
+
+
 def getSSDictCursor():
     """
     Returns a server-side dictionary cursor
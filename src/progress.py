@@ -0,0 +1,187 @@
+'''
+Progress reporting for the long-running worksteps. Each task (e.g. the scan of a table shared by several cohorts, or the creation of a preprocessed table) logs the number of processed rows, the throughput and an ETA at regular intervals. The state of all tasks is also written to a machine-readable JSON status file (`settings.statusfile`), which can be monitored to tell whether a job is stalled or just slow.
+'''
+
+import os
+import time
+import json
+import datetime
+import threading
+import logging
+logger = logging.getLogger('Progress')
+
+import settings
+
+
+INTERVAL = 60
+'''Default number of seconds between two progress reports
+'''
+
+_tasks = {}
+'''The state of all tasks of the process, {task name : dict}. Written to the status file.
+'''
+_lock = threading.Lock()
+
+
+def estimateRows(tablename):
+    """Returns the estimated number of rows of a table from `information_schema`, which is much faster than counting the rows. The estimate can be off for InnoDB tables.
+
+    :arg tablename: str, name of the table (including the database, e.g. `u_declerambaul.dewiki_editor_centric_year_month`)
+    :returns: int, or None if no estimate is available
+    """
+    from db import sql
+
+    try:
+        (db,table) = tablename.split('.')
+
+        cur = sql.getCursor()
+        cur.execute("SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA='%s' AND TABLE_NAME='%s';"%(db,table))
+        row = cur.fetchone()
+        cur.close()
+    except:
+        logger.warning('Could not estimate the number of rows of %s'%tablename)
+        return None
+
+    if row is None or row[0] is None:
+        return None
+
+    return int(row[0])
+
+def writeStatus():
+    """Writes the state of all tasks to `settings.statusfile` (if set). The file is replaced atomically.
+    """
+    if not settings.statusfile:
+        return
+
+    with _lock:
+        status = {  'pid' : os.getpid(),
+                    'language' : settings.language,
+                    'updated' : time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'tasks' : _tasks }
+
+        tmp = '%s.%s.tmp'%(settings.statusfile,os.getpid())
+        try:
+            with open(tmp,'w') as f:
+                json.dump(status,f,indent=2,sort_keys=True)
+            os.rename(tmp,settings.statusfile)
+        except (IOError,OSError):
+            logger.warning('Could not write the status file %s'%settings.statusfile)
+
+def formatDuration(seconds):
+    """Formats a number of seconds as `[D days, ]H:MM:SS`
+    """
+    return str(datetime.timedelta(seconds=int(seconds)))
+
+
+class Progress():
+    """Tracks the progress of a task. Call :meth:`.update` with the number of rows processed since the last call, a report is logged (and the status file updated) at most every `interval` seconds. Call :meth:`.finish` at the end of the task.
+
+    For tasks that block in a single call (e.g. a ``CREATE TABLE ... SELECT`` query), :meth:`.startHeartbeat` logs the elapsed time at regular intervals from a background thread.
+    """
+    def __init__(self,name,total=None,unit='rows',interval=INTERVAL):
+
+        self.name = name
+        '''Name of the task
+        '''
+        self.total = total
+        '''Expected number of rows, e.g. from :func:`estimateRows`. If None, no ETA is computed.
+        '''
+        self.unit = unit
+        '''Unit of the processed items
+        '''
+        self.interval = interval
+        '''Number of seconds between two reports
+        '''
+        self.processed = 0
+        '''Number of rows processed so far
+        '''
+        self.started = time.time()
+        self.lastReport = self.started
+        self.heartbeat = None
+
+        self.setStatus('running')
+        logger.info('%s: started%s'%(self.name,'' if total is None else ' (about %s %s)'%(total,unit)))
+
+    def getRate(self):
+        '''Returns the average number of rows per second
+        '''
+        elapsed = time.time()-self.started
+        if elapsed <= 0:
+            return 0.
+        return self.processed/elapsed
+
+    def getETA(self):
+        '''Returns the estimated number of seconds until the task is finished, or None if unknown
+        '''
+        rate = self.getRate()
+        if self.total is None or rate <= 0:
+            return None
+        return max(self.total-self.processed,0)/rate
+
+    def setStatus(self,state):
+        '''Updates the state of the task in the status file
+
+        :arg state: str, 'running', 'finished' or 'failed'
+        '''
+        eta = self.getETA()
+        with _lock:
+            _tasks[self.name] = {   'state' : state,
+                                    'unit' : self.unit,
+                                    'processed' : self.processed,
+                                    'total' : self.total,
+                                    'rate' : round(self.getRate(),1),
+                                    'elapsed' : int(time.time()-self.started),
+                                    'eta' : None if eta is None else int(eta),
+                                    'started' : time.strftime('%Y-%m-%d %H:%M:%S',time.localtime(self.started)),
+                                    'updated' : time.strftime('%Y-%m-%d %H:%M:%S') }
+        writeStatus()
+
+    def update(self,n):
+        '''Adds `n` processed rows and reports the progress if the last report is older than `interval` seconds
+
+        :arg n: int, number of rows processed since the last call
+        '''
+        self.processed += n
+
+        if time.time()-self.lastReport >= self.interval:
+            self.report()
+
+    def report(self):
+        '''Logs the progress and updates the status file
+        '''
+        self.lastReport = time.time()
+
+        msg = '%s: %s %s, %.0f %s/sec'%(self.name,self.processed,self.unit,self.getRate(),self.unit)
+        if self.total:
+            msg += ', %.1f%%'%(100.*self.processed/self.total)
+        eta = self.getETA()
+        if eta is not None:
+            msg += ', ETA %s'%formatDuration(eta)
+        msg += ', elapsed %s'%formatDuration(time.time()-self.started)
+
+        logger.info(msg)
+        self.setStatus('running')
+
+    def startHeartbeat(self):
+        '''Reports the progress every `interval` seconds from a background thread, until :meth:`.finish` is called
+        '''
+        self.heartbeat = threading.Event()
+
+        def beat(stop):
+            while not stop.wait(self.interval):
+                self.report()
+
+        thread = threading.Thread(target=beat,args=(self.heartbeat,))
+        thread.daemon = True
+        thread.start()
+
+    def finish(self,state='finished'):
+        '''Marks the task as finished and logs the totals
+
+        :arg state: str, the final state of the task, 'finished' or 'failed'
+        '''
+        if self.heartbeat is not None:
+            self.heartbeat.set()
+
+        logger.info('%s: %s, %s %s in %s (%.0f %s/sec)'%(self.name,state,self.processed,self.unit,formatDuration(time.time()-self.started),self.getRate(),self.unit))
+        self.setStatus(state)
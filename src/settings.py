@@ -2,7 +2,7 @@
 Settings used for cohort analysis. Many of these settings can be overwritten in the cohort class __init__ calls.
 '''
 
-import utils
+import timeaxis
 import logging
 
 # Configure logging
@@ -36,11 +36,28 @@ def nobots():
 	return filterbots
 
 
-time_stamps = None
-'''List containing all YM (e.g. '200401' for January 2004) that we want to analyze
+processes = 1
+'''Number of worker processes used to aggregate the cohort data. If larger than one, the tables are split into user_id ranges that are aggregated in parallel
+'''
+
+
+checkpointinterval = 0
+'''Number of seconds between two checkpoints of the aggregation of the cohort data. The aggregation of a table is resumed from its checkpoint after a failure. If 0 (default), no checkpoints are saved and the table is scanned in one streaming query
+'''
+
+
+daytable = False
+'''Create the day resolution table :data:`data.tables.EDITOR_YEAR_MONTH_DAY_NAMESPACE` in the preprocessing step? It is only needed by the day resolution age cohorts (see :class:`cohorts.age.AgePerDay`), and it is much larger than the month tables
 '''
-time_stamps_index = None
-'''A dictionary mapping each YM in `time_stamps` to its array index (used to access numpy arrays)
+
+
+cachesize = 1024
+'''Maximal size of the result cache in megabytes (see :mod:`data.cache`). The least recently used results are evicted when the cache grows larger. If 0, the aggregated data isn't cached
+'''
+
+
+time_stamps = None
+'''The :class:`timeaxis.TimeAxis` of the months that we want to analyze (e.g. '200401' for January 2004)
 '''
 
 
@@ -70,6 +87,24 @@ reportdirectory = None
 wikipridedirectory = None
 '''Path to store wikipride visualizations of user defined cohorts
 '''
+statusfile = None
+'''Path to the machine-readable status file, which contains the progress of the running worksteps (see :mod:`progress`). If None, no status file is written
+'''
+snapshotdirectory = None
+'''Path to the local columnar snapshots of the preprocessed tables (see :mod:`data.snapshot`)
+'''
+cachedirectory = None
+'''Path to the result cache of the aggregated cohort data (see :mod:`data.cache`). The cache can be shared by the wikis of several languages
+'''
+warehousedirectory = None
+'''Path to the cohort warehouse, which holds the cohort data of the wikis of several languages (see :mod:`data.warehouse`)
+'''
+refresh = False
+'''If True, the data workstep only aggregates the months that are new since the data has been saved, and merges them into the saved data
+'''
+usesnapshot = False
+'''If True, the data workstep aggregates the cohorts from the local snapshots instead of the SQL server
+'''
 
 
 ###
@@ -114,8 +149,8 @@ mongoQueryVars = None
 '''
 
 def setTimeStamps(startYM,endYM):
-	global time_stamps,time_stamps_index
-	(time_stamps,time_stamps_index) = utils.create_time_stamps_month(fromym=startYM,toym=endYM)
+	global time_stamps
+	time_stamps = timeaxis.TimeAxis(startYM,endYM)
 
 
 def readConfig(configfile):
@@ -125,7 +160,7 @@ def readConfig(configfile):
 	:arg configfile: A file that can be read by a `ConfigParser` instance
 	'''
 
-	global language,filterbots,time_stamps,time_stamps_index,botfile,basedirectory,datadirectory,userlistdirectory,reportdirectory,wikipridedirectory,sqlhost,sqlwikidb,sqluserdb,sqlconfigfile,sqldroptables
+	global language,filterbots,processes,checkpointinterval,daytable,cachesize,time_stamps,botfile,basedirectory,datadirectory,userlistdirectory,reportdirectory,wikipridedirectory,snapshotdirectory,cachedirectory,warehousedirectory,statusfile,sqlhost,sqlwikidb,sqluserdb,sqlconfigfile,sqldroptables
 
 	import os
 	import ConfigParser
@@ -139,10 +174,22 @@ def readConfig(configfile):
 		raise Exception('Language code should be two characters (%s)'%language)
 
 	filterbots = config.get('General','filterbots')	
+
+	if config.has_option('General','processes'):
+		processes = config.getint('General','processes')
+
+	if config.has_option('General','checkpointinterval'):
+		checkpointinterval = config.getint('General','checkpointinterval')
+
+	if config.has_option('General','daytable'):
+		daytable = config.getboolean('General','daytable')
+
+	if config.has_option('General','cachesize'):
+		cachesize = config.getint('General','cachesize')
 	
 	startYM = config.get('General','startYM') 
 	endYM = config.get('General','endYM') 
-	(time_stamps,time_stamps_index) = utils.create_time_stamps_month(fromym=startYM,toym=endYM)
+	time_stamps = timeaxis.TimeAxis(startYM,endYM)
 	
 	# directories	
 	basedirectory = os.path.expanduser(config.get('Directories','basedirectory'))
@@ -150,6 +197,22 @@ def readConfig(configfile):
 	userlistdirectory = os.path.expanduser(config.get('Directories','userlistdirectory'))
 	reportdirectory = os.path.expanduser(config.get('Directories','reportdirectory'))
 	wikipridedirectory = os.path.expanduser(config.get('Directories','wikipridedirectory'))
+	if config.has_option('Directories','snapshotdirectory'):
+		snapshotdirectory = os.path.expanduser(config.get('Directories','snapshotdirectory'))
+	else:
+		snapshotdirectory = os.path.join(datadirectory,'snapshot')
+	if config.has_option('Directories','cachedirectory'):
+		cachedirectory = os.path.expanduser(config.get('Directories','cachedirectory'))
+	else:
+		cachedirectory = os.path.join(basedirectory,'cache')
+	if config.has_option('Directories','warehousedirectory'):
+		warehousedirectory = os.path.expanduser(config.get('Directories','warehousedirectory'))
+	else:
+		warehousedirectory = os.path.join(basedirectory,'warehouse')
+	if config.has_option('Directories','statusfile'):
+		statusfile = os.path.expanduser(config.get('Directories','statusfile'))
+	else:
+		statusfile = os.path.join(basedirectory,'status_%swiki.json'%language)
 
 	# if not os.path.isdir(basedirectory):
 	# 	import errno
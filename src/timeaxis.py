@@ -0,0 +1,328 @@
+'''
+The time axis of the cohort data. A :class:`TimeAxis` maps the months (or days) of the analyzed time span to the column indexes of the data matrices with integer arithmetic: every month is identified by its month index (see :func:`utils.monthIndex`) and every day by its day index (see :func:`utils.dayIndex`), the time index is the difference to the first unit of the axis. The time stamp strings and the labels of the plots are only formatted when they are needed.
+
+The data is aggregated per month or per day. Coarser axes (weeks, quarters and years) are obtained by resampling an aggregated axis, see :meth:`TimeAxis.resample`.
+'''
+
+import datetime
+import logging
+logger = logging.getLogger('Time axis')
+
+import numpy as N
+
+import utils
+
+
+DAY = 'day'
+'''Granularity of an axis with one time unit per day
+'''
+WEEK = 'week'
+'''Granularity of an axis with one time unit per week. The weeks start on monday, the week index counts the weeks since the week of January 1st of :data:`utils.EPOCH_YEAR`.
+'''
+MONTH = 'month'
+'''Granularity of an axis with one time unit per month
+'''
+QUARTER = 'quarter'
+'''Granularity of an axis with one time unit per quarter
+'''
+YEAR = 'year'
+'''Granularity of an axis with one time unit per year
+'''
+
+GRANULARITIES = [DAY,WEEK,MONTH,QUARTER,YEAR]
+'''The granularities, from the finest to the coarsest
+'''
+
+RESAMPLING = { DAY : [WEEK,MONTH,QUARTER,YEAR], WEEK : [], MONTH : [QUARTER,YEAR], QUARTER : [YEAR], YEAR : [] }
+'''The coarser granularities an axis can be resampled to, see :meth:`TimeAxis.resample`. The weeks are not aligned with the months.
+'''
+
+ISO_FORMATS = { DAY : '%Y-%m-%d', WEEK : '%Y-%m-%d', MONTH : '%Y-%m', QUARTER : '%Y-Q%q', YEAR : '%Y' }
+'''The date formats of the time units in data files, by granularity
+'''
+LABEL_FORMATS = { DAY : '%d.%m.%Y', WEEK : '%d.%m.%Y', MONTH : '%m / %Y', QUARTER : 'Q%q / %Y', YEAR : '%Y' }
+'''The date formats of the tick labels of the plots, by granularity
+'''
+STEPS = { DAY : '1d', WEEK : '1w', MONTH : '1mo', QUARTER : '3mo', YEAR : '1y' }
+'''The length of the time units in the data file descriptions, by granularity
+'''
+
+
+def parseTimeStamp(ts):
+    '''Splits a time stamp into integers
+
+    :arg ts: str, 'yyyymm' or 'yyyymmdd' format
+    :returns: tuple, (year, month, day). The day is 1 for 'yyyymm' time stamps.
+    '''
+    ts = str(ts)
+    if len(ts) not in (6,8):
+        raise ValueError('Invalid time stamp %s, expected yyyymm or yyyymmdd'%ts)
+
+    return (int(ts[:4]),int(ts[4:6]),int(ts[6:8]) if len(ts) == 8 else 1)
+
+
+def formatDate(fmt,year,month,day):
+    '''Formats a date, the directives `%Y`, `%m`, `%d` and `%q` (quarter) are supported
+
+    :arg fmt: str, date format
+    :returns: str
+    '''
+    return fmt.replace('%Y','%04d'%year).replace('%m','%02d'%month).replace('%d','%02d'%day).replace('%q','%d'%((month-1)//3+1))
+
+
+class TimeAxis():
+    '''The time units from `start` to `end` (both included).
+
+    :arg start: str, first time unit, 'yyyymm' or 'yyyymmdd' format. The time unit containing the date is the first unit, the day is the first of the month if omitted.
+    :arg end: str, last time unit, 'yyyymm' or 'yyyymmdd' format. The time unit containing the date is the last unit, the day is the last of the month if omitted.
+    :arg granularity: str, one of :data:`GRANULARITIES`
+    '''
+    def __init__(self,start,end,granularity=MONTH):
+
+        if granularity not in GRANULARITIES:
+            raise ValueError('Unknown granularity %s'%granularity)
+
+        self.granularity = granularity
+        '''One of :data:`GRANULARITIES`'''
+
+        (y,m,d) = parseTimeStamp(start)
+        self.first = self.getUnit(y,m,d)
+        '''The unit index (e.g. the month index) of the first time unit, see :meth:`.getUnit`'''
+
+        (y,m,d) = parseTimeStamp(end)
+        if len(str(end)) == 6:
+            # last day of the month
+            d = utils.dayIndex(y+m//12,m%12+1,1) - utils.dayIndex(y,m,1)
+        self.length = max(self.getUnit(y,m,d) - self.first + 1, 0)
+        '''Number of time units'''
+
+    @staticmethod
+    def fromUnits(first,length,granularity=MONTH):
+        '''Returns the axis of `length` time units starting with the unit index `first`
+
+        :arg first: int, unit index of the first time unit, see :meth:`.getUnit`
+        :arg length: int, number of time units
+        :arg granularity: str, one of :data:`GRANULARITIES`
+        '''
+        axis = TimeAxis('%d01'%utils.EPOCH_YEAR,'%d01'%utils.EPOCH_YEAR,granularity)
+        axis.first = int(first)
+        axis.length = int(length)
+        return axis
+
+    def toDict(self):
+        '''Returns a JSON serializable description of the axis, see :meth:`.fromDict`. The first and last time stamps are included for readability.
+        '''
+        d = { 'granularity' : self.granularity, 'first' : self.first, 'length' : self.length }
+        if self.length > 0:
+            d['start'] = self.getISOLabel(0)
+            d['end'] = self.getISOLabel(self.length-1)
+        return d
+
+    @staticmethod
+    def fromDict(d):
+        '''Returns the axis described by a dict returned by :meth:`.toDict`
+        '''
+        return TimeAxis.fromUnits(d['first'],d['length'],str(d['granularity']))
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self,i):
+        if isinstance(i,slice):
+            return [self.getTimeStamp(j) for j in range(*i.indices(self.length))]
+        if i < 0:
+            i += self.length
+        if i < 0 or i >= self.length:
+            raise IndexError('Time index %s out of range'%i)
+        return self.getTimeStamp(i)
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self.getTimeStamp(i)
+
+    def __eq__(self,other):
+        return isinstance(other,TimeAxis) and (self.granularity,self.first,self.length) == (other.granularity,other.first,other.length)
+
+    def __ne__(self,other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        if self.length == 0:
+            return 'TimeAxis(empty, %s)'%self.granularity
+        return 'TimeAxis(%s, %s, %s)'%(self.getTimeStamp(0),self.getTimeStamp(self.length-1),self.granularity)
+
+    def getUnit(self,year,month,day=1):
+        '''Returns the unit index of the time unit containing a date: the month index (see :func:`utils.monthIndex`) for month axes, the day index (see :func:`utils.dayIndex`) for day axes, and the number of weeks, quarters or years since January 1st of :data:`utils.EPOCH_YEAR` for the other axes.
+
+        :arg year: int or numpy.array
+        :arg month: int or numpy.array
+        :arg day: int or numpy.array, ignored by month, quarter and year axes
+        '''
+        if self.granularity == DAY:
+            return utils.dayIndex(year,month,day)
+        if self.granularity == WEEK:
+            # January 1st of the epoch is a thursday
+            return (utils.dayIndex(year,month,day)+3)//7
+        if self.granularity == MONTH:
+            return utils.monthIndex(year,month)
+        if self.granularity == QUARTER:
+            return utils.monthIndex(year,month)//3
+        return year - utils.EPOCH_YEAR
+
+    def getIndex(self,unit):
+        '''Returns the time index of a unit index (e.g. a month index for month axes, see :meth:`.getUnit`), or None if the unit is not on the axis. The preprocessed tables store the month of the edits as month index (e.g. `rev_month_idx`).
+
+        :arg unit: int, unit index
+        :returns: int or None
+        '''
+        time_index = unit - self.first
+        if time_index < 0 or time_index >= self.length:
+            return None
+
+        return time_index
+
+    def getIndexArray(self,units):
+        '''Vectorized version of :meth:`.getIndex`, units outside of the axis are mapped to -1.
+
+        :arg units: numpy.array of unit indexes
+        :returns: numpy.array of time indexes
+        '''
+        index = N.asarray(units) - self.first
+        index[(index < 0) | (index >= self.length)] = -1
+
+        return index
+
+    def getIndexOfDate(self,year,month,day=1):
+        '''Returns the time index of a date, or None if the date is not on the axis
+
+        :arg year: int
+        :arg month: int
+        :arg day: int, ignored by month, quarter and year axes
+        :returns: int or None
+        '''
+        return self.getIndex(self.getUnit(year,month,day))
+
+    def getIndexArrayOfDates(self,year,month,day=1):
+        '''Vectorized version of :meth:`.getIndexOfDate`, dates outside of the axis are mapped to -1.
+
+        :arg year: numpy.array
+        :arg month: numpy.array
+        :arg day: numpy.array, ignored by month, quarter and year axes
+        :returns: numpy.array of time indexes
+        '''
+        return self.getIndexArray(self.getUnit(N.asarray(year),N.asarray(month),N.asarray(day)))
+
+    def getIndexSQL(self,column):
+        '''Returns the SQL expression that computes the time index from a unit index column, e.g. a month index column for month axes. This is the SQL counterpart of :meth:`.getIndexArray`, the rows outside of the axis have to be discarded by the query.
+
+        :arg column: str, name of the column (e.g. `rev_month_idx`)
+        :returns: str, SQL expression
+        '''
+        return '(%s-%s)'%(column,self.first)
+
+    def getRangeSQL(self,column):
+        '''Returns the SQL condition that selects the rows of a unit index column inside of the axis. The column is compared to constants, so that an index on the column can be used for the range.
+
+        :arg column: str, name of the column (e.g. `rev_month_idx`)
+        :returns: str, SQL condition
+        '''
+        return '%s BETWEEN %s AND %s'%(column,self.first,self.first+self.length-1)
+
+    def getDates(self,index=None):
+        '''Returns the first days of time units
+
+        :arg index: numpy.array of time indexes. If None, the dates of all time units are returned.
+        :returns: tuple of numpy.arrays, (year, month, day)
+        '''
+        if index is None:
+            index = N.arange(self.length)
+        units = self.first + N.asarray(index)
+
+        if self.granularity in (MONTH,QUARTER,YEAR):
+            months = units*{ MONTH : 1, QUARTER : 3, YEAR : 12 }[self.granularity]
+            return (utils.EPOCH_YEAR + months//12, months%12 + 1, N.ones_like(months))
+
+        if self.granularity == WEEK:
+            # the monday of the week
+            units = units*7 - 3
+        return utils.dateOfDayIndex(units)
+
+    def getDate(self,i):
+        '''Returns the first day of a time unit
+
+        :arg i: int, time index
+        :returns: datetime.date
+        '''
+        (y,m,d) = self.getDates(N.array([i]))
+        return datetime.date(int(y[0]),int(m[0]),int(d[0]))
+
+    def getTimeStamp(self,i):
+        '''Returns the time stamp of a time unit
+
+        :arg i: int, time index
+        :returns: str, 'yyyymm' (month, quarter and year axes) or 'yyyymmdd' (day and week axes) format of the first day of the unit
+        '''
+        date = self.getDate(i)
+        if self.granularity in (MONTH,QUARTER,YEAR):
+            return '%d%02d'%(date.year,date.month)
+        return '%d%02d%02d'%(date.year,date.month,date.day)
+
+    def getLabel(self,i,fmt=None):
+        '''Returns the label of a time unit
+
+        :arg i: int, time index
+        :arg fmt: str, date format of the first day of the unit, the directives `%Y`, `%m`, `%d` and `%q` (quarter) are supported. If None, the format in :data:`LABEL_FORMATS` is used.
+        '''
+        date = self.getDate(i)
+        return formatDate(fmt or LABEL_FORMATS[self.granularity],date.year,date.month,date.day)
+
+    def getLabels(self,fmt=None):
+        '''Returns the labels of all time units, see :meth:`.getLabel`. The dates are computed in one vectorized step.
+
+        :arg fmt: str, date format. If None, the format in :data:`LABEL_FORMATS` is used.
+        :returns: list of str
+        '''
+        fmt = fmt or LABEL_FORMATS[self.granularity]
+        return [formatDate(fmt,y,m,d) for (y,m,d) in zip(*[a.tolist() for a in self.getDates()])]
+
+    def getISOLabel(self,i):
+        '''Returns the label of a time unit in the format of the data files (see :data:`ISO_FORMATS`), e.g. '2004-01'
+        '''
+        return self.getLabel(i,ISO_FORMATS[self.granularity])
+
+    def getISOLabels(self):
+        '''Returns the labels of all time units in the format of the data files, see :meth:`.getLabels`
+        '''
+        return self.getLabels(ISO_FORMATS[self.granularity])
+
+    def getTicks(self,step=5):
+        '''Returns the ticks and the tick labels of the x axis of a plot, about one tick every `step` time units
+
+        :arg step: int, number of time units between two ticks
+        :returns: tuple, (list of time indexes, list of labels)
+        '''
+        if self.length == 0:
+            return ([],[])
+
+        ticks = [ int(i) for i in N.linspace(0,self.length-1,max((self.length-1)//step,min(self.length,2))) ]
+        return (ticks,[self.getLabel(i) for i in ticks])
+
+    def resample(self,granularity):
+        '''Returns the coarser axis containing the time units of this axis, and the time index in the coarser axis of each time unit. The first and last units of the coarser axis can be partially covered by this axis.
+
+        :arg granularity: str, a coarser granularity, see :data:`RESAMPLING`
+        :returns: tuple, (:class:`.TimeAxis`, numpy.array of time indexes)
+        '''
+        if granularity == self.granularity:
+            return (self,N.arange(self.length))
+        if granularity not in RESAMPLING[self.granularity]:
+            raise ValueError('A %s axis cannot be resampled to %s'%(self.granularity,granularity))
+
+        coarse = TimeAxis.fromUnits(0,0,granularity)
+        units = coarse.getUnit(*self.getDates())
+
+        if self.length > 0:
+            coarse.first = int(units[0])
+            coarse.length = int(units[-1]) - coarse.first + 1
+
+        return (coarse,units - coarse.first)
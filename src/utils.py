@@ -7,17 +7,35 @@ import logging
 
 # Set of bots read from a bot tsv file
 bots = None
+# Sorted numpy.array of the bots, used by isBotArray()
+botsArray = None
+# SQL table of the bots, used by getBotCondition()
+botTable = None
 filterBots = False
-def setFilterBots(fb,botfile):
-    global filterBots,bots
+def setFilterBots(fb,botfile,bottable=None):
+    global filterBots,bots,botsArray,botTable
     
     if fb:
+        botTable = bottable
         try:
             bots = set(long(bot) for bot in open(botfile,'r'))            
+            import numpy as N
+            botsArray = N.array(sorted(bots), dtype=N.int64)
             filterBots = fb
             logging.info("%s Bots loaded from %s"%(len(bots),botfile))
         except:
             logging.error("Botlist (%s) could not be loaded, Bots will not be filtered"%botfile)
+            botTable = None
+
+def getBotCondition(column):
+    '''
+    Returns a SQL condition that excludes the rows of known bots with an anti-join on the bot table, or None if the bots are not filtered on the SQL server (see setFilterBots()).
+
+    :arg column: str, the user id column of the filtered table
+    '''
+    if filterBots and botTable is not None:
+        return 'NOT EXISTS (SELECT 1 FROM %s AS bots WHERE bots.user_id = %s)'%(botTable,column)
+    return None
             
 def isBot(u_id):
     '''
@@ -30,6 +48,18 @@ def isBot(u_id):
             return True
     return False        
 
+def isBotArray(u_ids):
+    '''
+    Vectorized version of isBot(). Returns a boolean numpy.array which is True for the known bots in u_ids.
+
+    :arg u_ids: numpy.array of user ids
+    '''
+    import numpy as N
+
+    if filterBots:
+        return N.in1d(u_ids, botsArray)
+    return N.zeros(len(u_ids), dtype=bool)
+
 
 def create_time_stamps_month(fromym='200101',toym='201012'):
     '''
@@ -148,6 +178,53 @@ def computeMonthStartEndtime(ym):
 
     return (start,end)
 
+EPOCH_YEAR = 1970
+'''The month indexes count the months since January of this year
+'''
+
+def monthIndex(year,month):
+    '''Returns the month index, i.e. the number of months since January of :data:`EPOCH_YEAR`. The preprocessed tables store the year/month of the edits as month index (`rev_month_idx`, `first_edit_month_idx`), so that time indexes can be computed with an integer subtraction.
+
+    :arg year: int or numpy.array
+    :arg month: int or numpy.array
+    :returns: int or numpy.array, month index
+    '''
+    return (year-EPOCH_YEAR)*12 + month - 1
+
+EPOCH_ORDINAL = 719163
+'''The proleptic Gregorian ordinal (see `datetime.date.toordinal`) of January 1st of :data:`EPOCH_YEAR`
+'''
+
+def dayIndex(year,month,day):
+    '''Returns the day index, i.e. the number of days since January 1st of :data:`EPOCH_YEAR`. The day counterpart of :func:`monthIndex`, computed with integer arithmetic only.
+
+    :arg year: int or numpy.array
+    :arg month: int or numpy.array
+    :arg day: int or numpy.array
+    :returns: int or numpy.array, day index
+    '''
+    # count the years from March, so that the leap day is the last day of the year
+    y = year - (month <= 2)*1
+    m = (month + 9) % 12
+    return 365*y + y//4 - y//100 + y//400 + (153*m + 2)//5 + day - 1 - (EPOCH_ORDINAL + 305)
+
+def dateOfDayIndex(index):
+    '''Returns the date of a day index, the inverse of :func:`dayIndex`
+
+    :arg index: int or numpy.array, day index
+    :returns: tuple of int or numpy.array, (year, month, day)
+    '''
+    # days since March 1st of year 0, split into 400 year eras
+    z = index + EPOCH_ORDINAL + 305
+    era = z // 146097
+    doe = z - era*146097
+    yoe = (doe - doe//1460 + doe//36524 - doe//146096) // 365
+    doy = doe - (365*yoe + yoe//4 - yoe//100)
+    m = (5*doy + 2)//153
+    day = doy - (153*m + 2)//5 + 1
+    month = (m + 2) % 12 + 1
+    return (era*400 + yoe + (month <= 2)*1, month, day)
+
 def numberOfMonths(ymStart,ymEnd):
     '''Returns the number of months between the parameters.
 
@@ -39,14 +39,41 @@ def main():
 		help='if True, all SQL tables will be dropped before being created',
 	)
 
+	parser.add_argument(
+		'-p', '--processes',
+		metavar='',
+		type=int,
+		default=None,
+		help='number of worker processes used to aggregate the cohort data (overrides the config file)',
+	)
+
+	parser.add_argument(
+		'-s', '--snapshot',
+		action='store_true',
+		dest='snapshot',
+		default=False,
+		help='if True, the data workstep aggregates the cohorts from the local snapshot of the tables instead of the SQL server',
+	)
+
+	parser.add_argument(
+		'-r', '--refresh',
+		action='store_true',
+		dest='refresh',
+		default=False,
+		help='if True, the data workstep only aggregates the months since the last run and merges them into the saved data',
+	)
+
 	parser.add_argument(
 		'workstep',
 		type=str, 
-		choices=['all','preprocessing','data','report'],
+		choices=['all','preprocessing','snapshot','data','report','export','warehouse'],
 		help="""the part of the workflow to be executed. all: preprocessing, data and report. 
 		preprocessing: aggregate mediawiki SQL tables into analytic-friendly auxialiary tables.
+		snapshot: export the auxiliary tables into a local columnar snapshot (prerequisite: preprocessing workstep).
 		data: compute the cohort analysis data (prerequisite: preprocessing workstep)
-		report: create a set of standard reports (prerequisite: data workstep)."""
+		report: create a set of standard reports (prerequisite: data workstep).
+		export: save the compact payloads of the standard reports, rendered by the report pages (prerequisite: data workstep).
+		warehouse: add the cohort data to the warehouse shared by several languages (prerequisite: data workstep)."""
 	)
 
 	args = parser.parse_args()
@@ -60,6 +87,12 @@ def main():
 		return
 
 	settings.droptables = args.droptables
+
+	if args.processes is not None:
+		settings.processes = args.processes
+
+	settings.usesnapshot = args.snapshot
+	settings.refresh = args.refresh
 		
 		
 	
@@ -72,12 +105,21 @@ def main():
 	elif args.workstep == 'preprocessing':
 		from data import preprocessing
 		preprocessing.process()	
+	elif args.workstep == 'snapshot':
+		from data import snapshot
+		snapshot.process()
 	elif args.workstep == 'data':
 		from data import report
 		report.processData()
 	elif args.workstep == 'report':	
 		from data import report
 		report.processReport()	
+	elif args.workstep == 'export':
+		from data import report
+		report.processPayload(compress=True)
+	elif args.workstep == 'warehouse':
+		from data import report
+		report.processWarehouse()
 
 	
 if __name__ == "__main__":
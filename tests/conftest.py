@@ -0,0 +1,93 @@
+'''
+Fixtures shared by the tests. The SQL server is replaced by an in-memory sqlite table of generated rows of the editor centric tables. Run the tests with `python -m pytest tests` from the repository root.
+'''
+
+import os, sys
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','src'))
+
+import random
+
+import pytest
+
+import settings
+import utils
+
+settings.setTimeStamps('200401','200612')
+
+from db import sql
+
+
+def generateRows(seed=1):
+    '''Returns rows of the editor centric tables, with NULL values in the size changes
+    '''
+    rnd = random.Random(seed)
+    rows = []
+    for u in range(1,300):
+        fy,fm = rnd.choice([2003,2004,2005,2006]),rnd.randint(1,12)
+        for k in range(rnd.randint(1,10)):
+            y,m = fy+rnd.randint(0,2),rnd.randint(1,12)
+            if (y,m) < (fy,fm):
+                continue
+            rows.append({   'user_id' : u,
+                            'namespace' : rnd.choice([0,1,2,4,5,8,100]),
+                            'rev_year' : y,
+                            'rev_month' : m,
+                            'first_edit_year' : fy,
+                            'first_edit_month' : fm,
+                            'rev_month_idx' : (y-1970)*12+m-1,
+                            'first_edit_month_idx' : (fy-1970)*12+fm-1,
+                            'add_edits' : rnd.randint(0,200),
+                            'remove_edits' : rnd.randint(0,50),
+                            'noop_edits' : rnd.randint(0,3),
+                            'len_added' : rnd.choice([None,rnd.randint(0,9999)]),
+                            'len_removed' : rnd.choice([None,-rnd.randint(0,999)]) })
+    return rows
+
+
+class Cursor():
+    '''A server side cursor on a sqlite database, returning dictionaries or tuples like the MySQLdb cursors
+    '''
+    def __init__(self,db,dictionary):
+        self.db = db
+        self.dictionary = dictionary
+
+    def execute(self,query):
+        self.result = self.db.execute(query.rstrip(';'))
+
+    def convert(self,row):
+        return dict(row) if self.dictionary else tuple(row)
+
+    def fetchmany(self,n):
+        return [self.convert(row) for row in self.result.fetchmany(n)]
+
+    def fetchall(self):
+        return [self.convert(row) for row in self.result.fetchall()]
+
+    def __iter__(self):
+        return (self.convert(row) for row in self.result)
+
+    def close(self):
+        pass
+
+
+def makeTable(rows):
+    '''Returns an in-memory sqlite database holding the rows in the table `t`
+    '''
+    import sqlite3
+
+    db = sqlite3.connect(':memory:')
+    db.row_factory = sqlite3.Row
+    columns = sorted(rows[0].keys())
+    db.execute('CREATE TABLE t (%s)'%', '.join(columns))
+    db.executemany('INSERT INTO t VALUES (%s)'%', '.join('?'*len(columns)),[tuple(row[c] for c in columns) for row in rows])
+    return db
+
+
+@pytest.fixture
+def table(monkeypatch):
+    db = makeTable(generateRows())
+    monkeypatch.setattr(utils,'filterBots',False)
+    monkeypatch.setattr(sql,'getSSDictCursor',lambda: Cursor(db,True))
+    monkeypatch.setattr(sql,'getSSCursor',lambda: Cursor(db,False))
+    monkeypatch.setattr(sql,'getCursor',lambda: Cursor(db,False))
+    return 't'
@@ -0,0 +1,161 @@
+'''
+Tests of the aggregation of the cohort data and of the payload export, see :mod:`conftest` for the test table.
+'''
+
+import numpy as N
+import pytest
+
+from cohorts import age, histogram, simple
+from cohorts.base import rowsToColumns, getNetColumn
+from data import payload
+from db import sql
+
+
+COHORTS = [ lambda: age.AbsoluteAgeAllNamespaces(minedits=5,maxedits=100),
+            lambda: age.RelativeAgeAllNamespaces(minedits=1,maxedits=150),
+            histogram.EditorActivity,
+            simple.NameSpaces ]
+
+
+@pytest.mark.parametrize('makeCohort',COHORTS)
+def test_batch_matches_rows(table,makeCohort):
+    '''processSQLbatch() (batch mode) aggregates the same data as processSQLrow() (row mode)'''
+    batch = makeCohort()
+    batch.sqlTable = table
+    batch.sqlQuery = 'SELECT * FROM %s;'%table
+    batch.aggregateDataFromSQL(pushdown=False,batchsize=37)
+
+    single = makeCohort()
+    single.sqlTable = table
+    single.sqlQuery = 'SELECT * FROM %s;'%table
+    single.aggregateDataFromSQL(pushdown=False,batchsize=None)
+
+    assert sorted(batch.data.keys()) == sorted(single.data.keys())
+    for varName in single.data:
+        assert N.allclose(N.asarray(batch.data[varName]),N.asarray(single.data[varName])), varName
+    assert N.asarray(single.data['net']).any()
+
+
+def test_net_skips_null_rows():
+    rows = [{'len_added' : 10, 'len_removed' : -3},
+            {'len_added' : None, 'len_removed' : -5},
+            {'len_added' : 7, 'len_removed' : None}]
+    cols = rowsToColumns(rows,['len_added','len_removed'])
+
+    assert list(cols['len_added']) == [10,0,7]
+    assert list(cols['len_added_null']) == [False,True,False]
+    assert list(getNetColumn(cols)) == [7,0,0]
+
+
+def test_payload_roundtrip(tmpdir):
+    rs = N.random.RandomState(3)
+
+    cohort = age.AbsoluteAgeAllNamespaces()
+    cohort.initData()
+    T = len(cohort.time_stamps)
+    for varName in cohort.data:
+        cohort.data[varName] = N.triu(rs.randint(0,1000,(T,T))).astype(N.float64)
+    cohort.data['added'][3,:] = 0
+    # too large for int32 deltas
+    cohort.data['added'][6,7] = 3e9
+
+    fn = str(tmpdir.join('cohort%s'%payload.PAYLOAD_EXTENSION))
+    payload.savePayload(fn,cohort)
+    (header,data) = payload.loadPayload(fn)
+
+    assert sorted(data.keys()) == sorted(cohort.data.keys())
+    for varName in cohort.data:
+        assert N.array_equal(data[varName],cohort.data[varName]), varName
+
+    variables = dict((v['name'],v) for v in header['variables'])
+    assert variables['edits']['values']['dtype'] == 'int32'
+    assert variables['added']['values']['dtype'] == 'int64'
+    assert header['time_stamps'] == cohort.time_stamps.toDict()
+    assert header['cohort_labels'] == ['%s'%l for l in cohort.cohort_labels]
+
+
+def test_payload_roundtrip_banded(tmpdir):
+    rs = N.random.RandomState(5)
+
+    cohort = age.RelativeAgePerDay(maxage=30)
+    cohort.initData()
+    edits = cohort.data['edits']
+    edits.packed[:] = rs.randint(0,5,len(edits.packed))
+
+    fn = str(tmpdir.join('day%s'%payload.PAYLOAD_EXTENSION))
+    payload.savePayload(fn,cohort,varNames=['edits'])
+    (header,data) = payload.loadPayload(fn)
+
+    assert list(data.keys()) == ['edits']
+    assert N.array_equal(data['edits'],edits.toarray())
+
+
+def test_payload_rejects_other_files(tmpdir):
+    fn = str(tmpdir.join('other.csv'))
+    with open(fn,'wb') as f:
+        f.write(b'Date,edits\n')
+
+    with pytest.raises(Exception):
+        payload.loadPayload(fn)
+
+
+def makeReportCohorts(table):
+    '''Returns the cohorts of the report aggregated from the editor centric table'''
+    cohorts = [age.AbsoluteAgeAllNamespaces(minedits=1),
+               age.AbsoluteAgeAllNamespaces(minedits=5),
+               age.AbsoluteAgeAllNamespaces(minedits=100),
+               age.AbsoluteAgeAllNamespaces(minedits=1,maxedits=100),
+               age.RelativeAgeAllNamespaces(minedits=1),
+               age.RelativeAgeAllNamespaces(minedits=5),
+               age.RelativeAgeAllNamespaces(minedits=100),
+               age.RelativeAgeAllNamespaces(minedits=1,maxedits=100),
+               histogram.EditorActivity()]
+    for c in cohorts:
+        c.sqlTable = table
+        c.sqlQuery = 'SELECT * FROM %s;'%table
+    return cohorts
+
+
+def test_combined_pushdown_matches_stream(table,monkeypatch):
+    '''The cohorts on the same table are aggregated by one combined pushdown query'''
+    from cohorts.base import aggregateCohortsFromSQL
+
+    queries = []
+    getCursor = sql.getSSDictCursor
+    def countingCursor():
+        cur = getCursor()
+        execute = cur.execute
+        def countingExecute(query):
+            queries.append(query)
+            execute(query)
+        cur.execute = countingExecute
+        return cur
+    monkeypatch.setattr(sql,'getSSDictCursor',countingCursor)
+
+    pushed = makeReportCohorts(table)
+    aggregateCohortsFromSQL(pushed,pushdown=True)
+    assert len(queries) == 1
+    assert 'rev_month_idx BETWEEN' in queries[0]
+
+    streamed = makeReportCohorts(table)
+    aggregateCohortsFromSQL(streamed,pushdown=False)
+
+    for p,s in zip(pushed,streamed):
+        for varName in s.data:
+            assert N.allclose(N.asarray(p.data[varName]),N.asarray(s.data[varName])), (p,varName)
+        assert N.asarray(s.data['editors']).any()
+
+
+@pytest.mark.parametrize('makeCohort',COHORTS)
+def test_single_pushdown_matches_stream(table,makeCohort):
+    pushed = makeCohort()
+    pushed.sqlTable = table
+    pushed.aggregateDataFromSQL(pushdown=True)
+
+    streamed = makeCohort()
+    streamed.sqlTable = table
+    streamed.sqlQuery = 'SELECT * FROM %s;'%table
+    streamed.aggregateDataFromSQL(pushdown=False)
+
+    for varName in streamed.data:
+        assert N.allclose(N.asarray(pushed.data[varName]),N.asarray(streamed.data[varName])), varName
@@ -0,0 +1,66 @@
+'''
+Tests of the result cache, see :mod:`data.cache`.
+'''
+
+import os
+
+import numpy as N
+
+from cohorts import simple
+from data import cache
+
+
+def makeCohort(value):
+    cohort = simple.NameSpaces()
+    cohort.initData()
+    for varName in cohort.data:
+        cohort.data[varName][:] = value
+    return cohort
+
+
+def setLastUse(resultCache,key,t):
+    fn = os.path.join(resultCache.getEntryDirectory(key),cache.ENTRY_FILE)
+    os.utime(fn,(t,t))
+
+
+def test_put_and_get(tmpdir):
+    resultCache = cache.ResultCache(str(tmpdir),1e9)
+    cohort = makeCohort(3.)
+    resultCache.put('a',cohort,{'sqlQuery' : 'SELECT 1;'})
+
+    loaded = simple.NameSpaces()
+    assert resultCache.get('a',loaded)
+    assert sorted(loaded.data.keys()) == sorted(cohort.data.keys())
+    for varName in cohort.data:
+        assert N.array_equal(N.asarray(loaded.data[varName]),cohort.data[varName]), varName
+
+    assert not resultCache.get('b',simple.NameSpaces())
+    assert not resultCache.get(None,simple.NameSpaces())
+    resultCache.put(None,cohort)
+    assert [key for (t,s,key) in resultCache.getEntries()] == ['a']
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    resultCache = cache.ResultCache(str(tmpdir),1e9)
+    for i,key in enumerate(['a','b','c']):
+        resultCache.put(key,makeCohort(i))
+        setLastUse(resultCache,key,1000+i)
+
+    # a is used again, b becomes the least recently used entry
+    assert resultCache.get('a',simple.NameSpaces())
+    assert [key for (t,s,key) in resultCache.getEntries()] == ['b','c','a']
+
+    sizes = dict((key,s) for (t,s,key) in resultCache.getEntries())
+    resultCache.maxsize = sizes['a']+sizes['c']
+    resultCache.evict()
+    assert sorted(key for (t,s,key) in resultCache.getEntries()) == ['a','c']
+    assert not os.path.exists(resultCache.getEntryDirectory('b'))
+
+    # a new entry evicts the least recently used one
+    resultCache.put('d',makeCohort(4))
+    assert sorted(key for (t,s,key) in resultCache.getEntries()) == ['a','d']
+
+
+def test_tables_of_query():
+    assert cache.getTables('SELECT * FROM u.ptwiki_editor_centric_year_month WHERE rev_month_idx > 3;') == ['u.ptwiki_editor_centric_year_month']
+    assert cache.getTables('select * from u.b join u.a on a.x = b.x') == ['u.a','u.b']
@@ -0,0 +1,101 @@
+'''
+Tests of the checkpointed keyset pagination of the SQL scan, see :func:`cohorts.base.aggregateCohortsWithCheckpoints`.
+'''
+
+import os
+
+import numpy as N
+import pytest
+
+import timeaxis
+
+from cohorts import age, base, histogram
+
+
+def makeCohorts(table):
+    cohorts = [age.AbsoluteAgeAllNamespaces(minedits=5,maxedits=100),
+               age.RelativeAgeAllNamespaces(minedits=1),
+               histogram.EditorActivity()]
+    for c in cohorts:
+        c.sqlTable = table
+        c.sqlQuery = 'SELECT * FROM %s;'%table
+    return cohorts
+
+
+def assertSameData(cohorts,reference):
+    for c,r in zip(cohorts,reference):
+        for varName in r.data:
+            assert N.allclose(N.asarray(c.data[varName]),N.asarray(r.data[varName])), (c,varName)
+
+
+@pytest.fixture
+def reference(table):
+    cohorts = makeCohorts(table)
+    base.aggregateCohortsFromSQL(cohorts,pushdown=False)
+    return cohorts
+
+
+def crash(table,checkpoint,after):
+    '''Runs a checkpointed scan failing after `after` pages'''
+    processRows = base.processRows
+    pages = []
+    def crashing(*args):
+        pages.append(1)
+        if len(pages) > after:
+            raise RuntimeError('connection lost')
+        processRows(*args)
+
+    base.processRows = crashing
+    try:
+        with pytest.raises(RuntimeError):
+            base.aggregateCohortsFromSQL(makeCohorts(table),pushdown=False,batchsize=30,checkpoint=checkpoint,checkpointInterval=0)
+    finally:
+        base.processRows = processRows
+
+
+def test_pages_end_at_editor_boundaries(table,reference,tmpdir):
+    '''Pages smaller than the rows of one editor are doubled, the rows of the last editor of a page are fetched again'''
+    checkpoint = str(tmpdir.join('t.checkpoint'))
+
+    for pagesize in [1,3,30]:
+        cohorts = makeCohorts(table)
+        base.aggregateCohortsFromSQL(cohorts,pushdown=False,batchsize=pagesize,checkpoint=checkpoint,checkpointInterval=0)
+        assertSameData(cohorts,reference)
+        assert not os.path.exists(checkpoint)
+
+
+def test_resume_after_failure(table,reference,tmpdir):
+    checkpoint = str(tmpdir.join('t.checkpoint'))
+
+    crash(table,checkpoint,5)
+    assert os.path.exists(checkpoint)
+
+    probe = makeCohorts(table)
+    for c in probe:
+        c.initData()
+    assert base.loadCheckpoint(checkpoint,probe) is not None
+
+    cohorts = makeCohorts(table)
+    base.aggregateCohortsFromSQL(cohorts,pushdown=False,batchsize=30,checkpoint=checkpoint,checkpointInterval=0)
+    assertSameData(cohorts,reference)
+    assert not os.path.exists(checkpoint)
+
+
+def test_checkpoint_of_other_aggregation_is_dropped(table,reference,tmpdir):
+    checkpoint = str(tmpdir.join('t.checkpoint'))
+
+    crash(table,checkpoint,5)
+
+    # other time axis
+    other = makeCohorts(table)
+    for c in other:
+        c.time_stamps = timeaxis.TimeAxis('200501','200612')
+    base.saveCheckpoint(checkpoint+'.axis',makeCohorts(table),1)
+    assert base.loadCheckpoint(checkpoint+'.axis',other) is None
+    assert not os.path.exists(checkpoint+'.axis')
+
+    # other conditions
+    cohorts = makeCohorts(table)
+    base.aggregateCohortsFromSQL(cohorts,pushdown=False,batchsize=30,conditions=['rev_month_idx >= 0'],checkpoint=checkpoint,checkpointInterval=0)
+    assertSameData(cohorts,reference)
+    assert not os.path.exists(checkpoint)
@@ -0,0 +1,76 @@
+'''
+Tests of the incremental refresh of saved data, see :meth:`cohorts.base.Cohort.getRefreshStart`.
+'''
+
+import numpy as N
+import pytest
+
+import settings
+import timeaxis
+
+from cohorts import age, base, histogram
+
+
+COHORTS = [ lambda: age.AbsoluteAgeAllNamespaces(minedits=5),
+            lambda: age.RelativeAgeAllNamespaces(minedits=1,maxedits=150),
+            histogram.EditorActivity ]
+
+
+def aggregate(makeCohort,table,conditions=None):
+    cohort = makeCohort()
+    cohort.sqlTable = table
+    cohort.sqlQuery = 'SELECT * FROM %s;'%table
+    base.aggregateCohortsFromSQL([cohort],pushdown=False,conditions=conditions)
+    cohort.finalizeData()
+    return cohort
+
+
+@pytest.mark.parametrize('makeCohort',COHORTS)
+def test_refresh_matches_full_aggregation(table,makeCohort,monkeypatch,tmpdir):
+    '''The saved data of a shorter time axis, refreshed from its last month, equals the data aggregated from scratch'''
+    full = aggregate(makeCohort,table)
+
+    axis = settings.time_stamps
+    monkeypatch.setattr(settings,'time_stamps',timeaxis.TimeAxis('200401','200606'))
+    aggregate(makeCohort,table).saveDataToDisk(destination=str(tmpdir))
+    monkeypatch.setattr(settings,'time_stamps',axis)
+
+    probe = makeCohort()
+    probe.sqlTable = table
+    saved = probe.loadSavedData(destination=str(tmpdir))
+    start = probe.getRefreshStart(saved)
+    # the last saved month, June 2006, is aggregated again
+    assert start == 29
+    assert probe.getRefreshConditions(start) == ['rev_month_idx >= %s'%((2006-1970)*12+5)]
+
+    refreshed = aggregate(makeCohort,table,conditions=probe.getRefreshConditions(start))
+    refreshed.mergeData(saved,start)
+
+    for varName in full.data:
+        assert N.allclose(N.asarray(refreshed.data[varName]),N.asarray(full.data[varName])), varName
+
+
+def test_refresh_start_rejects_other_data(table):
+    cohort = age.AbsoluteAgeAllNamespaces()
+    cohort.sqlTable = table
+    T = len(cohort.time_stamps)
+
+    assert cohort.getRefreshStart(None) is None
+    assert cohort.getRefreshStart({'edits' : N.zeros((T,T+1))}) is None
+    assert cohort.getRefreshStart({'edits' : N.zeros((T,3)), 'added' : N.zeros((T,4))}) is None
+    assert cohort.getRefreshStart({'edits' : N.zeros((T+1,3))}) is None
+    assert cohort.getRefreshStart({'other' : N.zeros((T,3))}) is None
+    assert cohort.getRefreshStart({'edits' : N.zeros((3,3))}) == 2
+
+    cohort.sqlTable = None
+    assert cohort.getRefreshStart({'edits' : N.zeros((3,3))}) is None
+
+
+def test_saved_data_of_other_axis_is_not_loaded(table,monkeypatch,tmpdir):
+    axis = settings.time_stamps
+    monkeypatch.setattr(settings,'time_stamps',timeaxis.TimeAxis('200501','200606'))
+    aggregate(histogram.EditorActivity,table).saveDataToDisk(destination=str(tmpdir))
+    monkeypatch.setattr(settings,'time_stamps',axis)
+
+    assert histogram.EditorActivity().loadSavedData(destination=str(tmpdir)) is None
+    assert histogram.EditorActivity().loadSavedData(destination=str(tmpdir.join('missing'))) is None
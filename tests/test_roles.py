@@ -0,0 +1,46 @@
+'''
+Tests of the role index, see :mod:`data.roles`.
+'''
+
+import os
+
+import numpy as N
+
+import settings
+
+from conftest import Cursor, makeTable
+from data import roles
+from db import sql
+
+
+GROUPS = [(3,'sysop'),(3,'bureaucrat'),(7,'bot'),(12,'sysop'),(12,'rollbacker')]
+
+
+def test_file_is_resolved_at_use_time(monkeypatch,tmpdir):
+    monkeypatch.setattr(settings,'userlistdirectory',str(tmpdir))
+    monkeypatch.setattr(settings,'language','pt')
+
+    assert roles.getRoleIndexFile() == os.path.join(str(tmpdir),'ptwiki_roles.npz')
+
+
+def test_build_and_load(monkeypatch,tmpdir):
+    db = makeTable([{'ug_user' : u, 'ug_group' : g} for (u,g) in GROUPS])
+    db.execute('ALTER TABLE t RENAME TO user_groups')
+    monkeypatch.setattr(sql,'getCursor',lambda: Cursor(db,False))
+    monkeypatch.setattr(settings,'sqlwikidb','main')
+    monkeypatch.setattr(settings,'userlistdirectory',str(tmpdir.join('roles')))
+
+    index = roles.loadRoleIndex()
+    assert os.path.isfile(roles.getRoleIndexFile())
+    assert index.roles == ['bot','bureaucrat','rollbacker','sysop']
+
+    # the cached index is loaded without querying the database
+    monkeypatch.setattr(sql,'getCursor',None)
+    cached = roles.loadRoleIndex()
+    assert list(cached.user_ids) == [3,7,12]
+
+    assert cached.getUsers('sysop') == set([3,12])
+    assert list(cached.hasRole(N.array([1,3,7,12,99]),'sysop')) == [False,True,False,True,False]
+    assert cached.getMask(99) == 0
+    assert cached.getMask(3) == cached.getBit('sysop') | cached.getBit('bureaucrat')
+    assert cached.getBit('eliminator') == 0
@@ -0,0 +1,99 @@
+'''
+Tests of the binary store of the cohort data, see :mod:`cohorts.store`.
+'''
+
+import json
+
+import numpy as N
+import pytest
+
+import timeaxis
+
+from cohorts import age, store
+from cohorts.triangular import TriangularMatrix, BandedMatrix, saveMatrix
+
+
+MATRICES = [ lambda: N.arange(12,dtype=N.float64).reshape((3,4)),
+             lambda: N.zeros((0,4)),
+             lambda: TriangularMatrix.fromarray(N.triu(N.arange(1,21).reshape((4,5)))),
+             lambda: BandedMatrix.fromarray(N.triu(N.tril(N.arange(1,21).reshape((4,5)),1)),2) ]
+
+
+@pytest.mark.parametrize('makeMatrix',MATRICES)
+@pytest.mark.parametrize('mmap',[True,False])
+def test_roundtrip(makeMatrix,mmap,tmpdir):
+    data = makeMatrix()
+    fn = str(tmpdir.join('m'))
+    store.saveData(fn,data,{'variable' : 'edits'})
+
+    assert store.hasData(fn)
+    (loaded,sidecar) = store.loadData(fn,mmap)
+
+    assert isinstance(loaded,data.__class__)
+    assert N.array_equal(N.asarray(loaded),N.asarray(data))
+    assert sidecar['variable'] == 'edits'
+    assert sidecar['shape'] == list(data.shape)
+    if isinstance(data,BandedMatrix):
+        assert loaded.bandwidth == data.bandwidth
+
+    # the maps are copy-on-write
+    if isinstance(loaded,N.ndarray):
+        loaded[...] = -1
+    else:
+        loaded.packed[...] = -1
+    assert N.array_equal(N.asarray(store.loadData(fn)[0]),N.asarray(data))
+
+
+def test_text_files_are_loaded(tmpdir):
+    fn = str(tmpdir.join('m'))
+    m = TriangularMatrix.fromarray(N.triu(N.ones((3,3))))
+    saveMatrix(fn+store.TEXT_EXTENSION,m)
+
+    assert store.hasData(fn)
+    (loaded,sidecar) = store.loadData(fn)
+    assert sidecar is None
+    assert N.array_equal(loaded.toarray(),m.toarray())
+
+    # the binary file takes precedence
+    store.saveData(fn,N.zeros((3,3)))
+    assert isinstance(store.loadData(fn)[0],N.ndarray)
+
+    store.removeData(fn)
+    assert isinstance(store.loadData(fn)[0],TriangularMatrix)
+
+    with pytest.raises(IOError):
+        store.loadData(str(tmpdir.join('missing')))
+
+
+def test_newer_format_is_rejected(tmpdir):
+    fn = str(tmpdir.join('m'))
+    store.saveData(fn,N.zeros((2,2)))
+    with open(fn+store.SIDECAR_EXTENSION) as f:
+        sidecar = json.load(f)
+    sidecar['version'] = store.FORMAT_VERSION+1
+    with open(fn+store.SIDECAR_EXTENSION,'w') as f:
+        json.dump(sidecar,f)
+
+    with pytest.raises(Exception):
+        store.loadData(fn)
+
+
+def test_cohort_roundtrip(tmpdir):
+    '''The time axis and the cohort labels of resampled data are restored from the sidecar'''
+    cohort = age.AbsoluteAgeAllNamespaces()
+    cohort.initData()
+    T = len(cohort.time_stamps)
+    for varName in cohort.data:
+        cohort.data[varName] = N.triu(N.ones((T,T)))
+    cohort.groupCohorts(12)
+    cohort.resampleTime(timeaxis.YEAR)
+    cohort.saveDataToDisk(destination=str(tmpdir))
+
+    loaded = age.AbsoluteAgeAllNamespaces()
+    for varName in cohort.data:
+        loaded.loadDataFromDisk(varName,destination=str(tmpdir))
+        assert N.array_equal(N.asarray(loaded.data[varName]),cohort.data[varName]), varName
+
+    assert loaded.time_stamps == cohort.time_stamps
+    assert loaded.cohort_labels == cohort.cohort_labels
+    assert len(loaded.cohorts) == len(cohort.cohorts)
@@ -0,0 +1,95 @@
+'''
+Tests of the time axis, see :mod:`timeaxis`.
+'''
+
+import numpy as N
+import pytest
+
+import timeaxis
+from timeaxis import TimeAxis
+
+from cohorts import simple
+
+
+def test_index_of_months():
+    axis = TimeAxis('200401','200612')
+    first = (2004-1970)*12
+
+    assert len(axis) == 36
+    assert axis.getIndex(first) == 0
+    assert axis.getIndex(first+35) == 35
+    assert axis.getIndex(first-1) is None
+    assert axis.getIndex(first+36) is None
+    assert axis.getIndexOfDate(2005,3) == 14
+
+    units = N.array([first-1,first,first+14,first+35,first+36])
+    assert list(axis.getIndexArray(units)) == [-1,0,14,35,-1]
+    # the argument is not modified
+    assert units[0] == first-1
+    assert list(axis.getIndexArrayOfDates(N.array([2003,2004,2006,2007]),N.array([12,1,12,1]))) == [-1,0,35,-1]
+
+    assert axis.getRangeSQL('rev_month_idx') == 'rev_month_idx BETWEEN %s AND %s'%(first,first+35)
+    assert axis[0] == '200401' and axis[-1] == '200612'
+    assert axis.getISOLabel(14) == '2005-03'
+
+
+def test_index_of_days():
+    axis = TimeAxis('200402','200402',timeaxis.DAY)
+
+    # leap year
+    assert len(axis) == 29
+    assert axis.getIndexOfDate(2004,2,29) == 28
+    assert axis.getIndexOfDate(2004,3,1) is None
+    assert list(axis.getIndexArrayOfDates(N.array([2004,2004,2004]),N.array([1,2,3]),N.array([31,15,1]))) == [-1,14,-1]
+    assert axis.getTimeStamp(14) == '20040215'
+
+
+def test_dict_roundtrip():
+    for axis in [TimeAxis('200401','200612'),TimeAxis('20040101','20040310',timeaxis.DAY),TimeAxis.fromUnits(0,0,timeaxis.YEAR)]:
+        assert TimeAxis.fromDict(axis.toDict()) == axis
+
+
+def test_resample_months():
+    axis = TimeAxis('200402','200512')
+
+    (quarters,index) = axis.resample(timeaxis.QUARTER)
+    # the first quarter is partially covered
+    assert quarters.getISOLabels() == ['2004-Q1','2004-Q2','2004-Q3','2004-Q4','2005-Q1','2005-Q2','2005-Q3','2005-Q4']
+    assert list(index[:4]) == [0,0,1,1]
+    assert len(index) == len(axis) and index[-1] == 7
+
+    (years,index) = axis.resample(timeaxis.YEAR)
+    assert years.getISOLabels() == ['2004','2005']
+    assert list(N.bincount(index)) == [11,12]
+
+    assert axis.resample(timeaxis.MONTH)[0] is axis
+    with pytest.raises(ValueError):
+        axis.resample(timeaxis.DAY)
+    with pytest.raises(ValueError):
+        axis.resample(timeaxis.WEEK)
+
+
+def test_resample_days():
+    axis = TimeAxis('20040101','20040131',timeaxis.DAY)
+
+    (weeks,index) = axis.resample(timeaxis.WEEK)
+    # January 1st 2004 is a thursday, the weeks start on monday
+    assert weeks.getTimeStamp(0) == '20031229'
+    assert list(index[:5]) == [0,0,0,0,1]
+    assert len(weeks) == 5
+
+    (months,index) = axis.resample(timeaxis.MONTH)
+    assert months == TimeAxis('200401','200401')
+    assert not index.any()
+
+
+def test_resample_cohort_data():
+    cohort = simple.NameSpaces()
+    cohort.time_stamps = TimeAxis('200401','200512')
+    cohort.initData()
+    for varName in cohort.data:
+        cohort.data[varName] = N.tile(N.arange(24,dtype=N.float64),(len(cohort.cohorts),1))
+
+    cohort.resampleTime(timeaxis.QUARTER,how='sum')
+    assert cohort.time_stamps == TimeAxis('200401','200512').resample(timeaxis.QUARTER)[0]
+    assert list(cohort.data['edits'][0]) == [3.,12.,21.,30.,39.,48.,57.,66.]
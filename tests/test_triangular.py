@@ -0,0 +1,134 @@
+'''
+Tests of the packed cohort matrices, see :mod:`cohorts.triangular`.
+'''
+
+import numpy as N
+import pytest
+
+from cohorts.triangular import TriangularMatrix, BandedMatrix, saveMatrix, loadMatrix
+
+
+def makeDense(shape,inside,seed=1):
+    '''Returns a random dense matrix which is zero outside of the structure'''
+    rs = N.random.RandomState(seed)
+    (rows,cols) = N.indices(shape)
+    return N.where(inside(rows,cols),rs.randint(1,100,shape),0).astype(N.float64)
+
+
+@pytest.mark.parametrize('shape',[(5,5),(3,6),(6,3),(1,4),(4,1)])
+def test_triangular_pack(shape):
+    dense = makeDense(shape,lambda i,j: i <= j)
+    m = TriangularMatrix.fromarray(dense)
+
+    assert m.packed.shape[0] == N.count_nonzero(N.triu(N.ones(shape)))
+    assert N.array_equal(m.toarray(),dense)
+    assert N.array_equal(N.asarray(m),dense)
+    assert m.sum() == dense.sum()
+    assert N.array_equal(m.sum(axis=0),dense.sum(axis=0))
+    assert N.array_equal(m.sum(axis=1),dense.sum(axis=1))
+
+    with pytest.raises(ValueError):
+        m.pack(dense.T if shape[0] != shape[1] else dense+N.tril(N.ones(shape),-1))
+
+
+def test_triangular_indexing():
+    dense = makeDense((4,6),lambda i,j: i <= j)
+    m = TriangularMatrix.fromarray(dense)
+
+    assert m[1,3] == dense[1,3]
+    assert m[3,1] == 0.
+    assert m[-1,-1] == dense[-1,-1]
+    assert N.array_equal(m[2],dense[2])
+    assert N.array_equal(m[:,4],dense[:,4])
+    assert N.array_equal(m[1:3,::2],dense[1:3,::2])
+    assert N.array_equal(m[[0,3],[5,1]],dense[[0,3]][:,[5,1]])
+    assert N.array_equal(N.flipud(m),N.flipud(dense))
+
+    m[0,2] = 7
+    dense[0,2] = 7
+    m[2,0] = 0
+    with pytest.raises(IndexError):
+        m[2,0] = 1
+    m[1] = 0
+    dense[1] = 0
+    assert N.array_equal(m.toarray(),dense)
+
+
+def test_triangular_accumulate():
+    m = TriangularMatrix(3,4)
+    m.accumulate(N.array([0,0,2,1,2]),N.array([1,1,3,0,1]),N.array([2.,3.,1.,5.,4.]))
+
+    expected = N.zeros((3,4))
+    expected[0,1] = 5
+    expected[2,3] = 1
+    # the cells below the diagonal are dropped
+    assert N.array_equal(m.toarray(),expected)
+
+    m += m.copy()
+    m += expected
+    assert N.array_equal(m.toarray(),3*expected)
+
+
+def test_save_load_triangular(tmpdir):
+    m = TriangularMatrix.fromarray(makeDense((4,6),lambda i,j: i <= j))
+    fn = str(tmpdir.join('m.txt'))
+    saveMatrix(fn,m)
+    loaded = loadMatrix(fn)
+
+    assert isinstance(loaded,TriangularMatrix)
+    assert N.array_equal(loaded.toarray(),m.toarray())
+
+    dense = makeDense((2,3),lambda i,j: True)
+    saveMatrix(fn,dense)
+    assert N.array_equal(loadMatrix(fn),dense)
+
+
+@pytest.mark.parametrize('shape,bandwidth',[((6,6),3),((6,4),3),((3,8),2),((4,4),6)])
+def test_banded_pack(shape,bandwidth):
+    dense = makeDense(shape,lambda i,j: (j-i >= 0) & (j-i < bandwidth))
+    m = BandedMatrix.fromarray(dense,bandwidth)
+
+    assert m.packed.shape[0] == shape[0]*bandwidth
+    assert N.array_equal(m.toarray(),dense)
+    assert m.sum() == dense.sum()
+    assert N.array_equal(m.sum(axis=0),dense.sum(axis=0))
+    assert N.array_equal(m.sum(axis=1),dense.sum(axis=1))
+
+    # cell [i,k] of the band is the cell (i,i+k)
+    band = m.getBand()
+    for i in range(shape[0]):
+        for k in range(bandwidth):
+            assert band[i,k] == (dense[i,i+k] if i+k < shape[1] else 0)
+
+    outside = dense.copy()
+    outside[-1,0] = 1
+    with pytest.raises(ValueError):
+        m.pack(outside)
+
+
+def test_banded_indexing_and_accumulate():
+    dense = makeDense((5,7),lambda i,j: (j-i >= 0) & (j-i < 3))
+    m = BandedMatrix.fromarray(dense,3)
+
+    assert m[1,3] == dense[1,3]
+    assert m[1,4] == 0.
+    assert m[3,1] == 0.
+    assert N.array_equal(m[2:,1:6],dense[2:,1:6])
+    assert N.array_equal(m[:,-1],dense[:,-1])
+
+    m.accumulate(N.array([0,0,4,1]),N.array([2,3,6,1]),2.)
+    dense[0,2] += 2
+    dense[4,6] += 2
+    dense[1,1] += 2
+    assert N.array_equal(m.toarray(),dense)
+
+
+def test_save_load_banded(tmpdir):
+    m = BandedMatrix.fromarray(makeDense((5,7),lambda i,j: (j-i >= 0) & (j-i < 3)),3)
+    fn = str(tmpdir.join('m.txt'))
+    saveMatrix(fn,m)
+    loaded = loadMatrix(fn)
+
+    assert isinstance(loaded,BandedMatrix)
+    assert loaded.bandwidth == 3
+    assert N.array_equal(loaded.toarray(),m.toarray())